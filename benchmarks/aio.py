@@ -0,0 +1,108 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+"""Measures the throughput of a slow asyncio consumer of blocks, awaiting
+some I/O for every block, when the blocks are read and decoded in the event
+loop and when they are streamed by aiter_unordered_blocks with different
+numbers of blocks read ahead. The largest delay of a ticker task sharing the
+event loop shows how long the loop is blocked.
+
+    python benchmarks/aio.py --blocks 500 --transactions 500 --delay 0.005
+"""
+
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blockchain_parser.blockchain import Blockchain, BITCOIN_CONSTANT  # noqa
+from blockchain_parser.utils import encode_compactsize  # noqa: E402
+
+
+def make_tx(i):
+    return struct.pack("<I", 1) + b"\x01" + struct.pack("<I", i) * 8 + \
+        struct.pack("<I", 0) + b"\x6b" + b"\x47" * 107 + b"\xff" * 4 + \
+        b"\x02" + (struct.pack("<q", 546) + b"\x19\x76\xa9\x14" +
+                   b"\x11" * 20 + b"\x88\xac") * 2 + b"\x00" * 4
+
+
+def write_blocks(path, n_blocks, n_transactions):
+    with open(os.path.join(path, "blk00000.dat"), "wb") as f:
+        for height in range(n_blocks):
+            header = struct.pack("<I", 0x20000000) + b"\x00" * 64 + \
+                struct.pack("<III", 1700000000 + height, 0x1703a30c, height)
+            raw_block = header + encode_compactsize(n_transactions) + \
+                b"".join(make_tx(i) for i in range(n_transactions))
+            f.write(BITCOIN_CONSTANT + struct.pack("<I", len(raw_block)) +
+                    raw_block)
+
+
+async def ticker(lags):
+    """Records by how much a 1ms sleep overshoots"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def consume(blocks, delay, is_async):
+    lags = []
+    task = asyncio.ensure_future(ticker(lags))
+    start = time.perf_counter()
+    n = 0
+    if is_async:
+        async for block in blocks:
+            n += len(block.transactions)
+            await asyncio.sleep(delay)
+    else:
+        for block in blocks:
+            n += len(block.transactions)
+            await asyncio.sleep(delay)
+    elapsed = time.perf_counter() - start
+    task.cancel()
+    return n, elapsed, max(lags) if lags else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--blocks", type=int, default=300)
+    parser.add_argument("--transactions", type=int, default=500)
+    parser.add_argument("--delay", type=float, default=0.005,
+                        help="seconds awaited by the consumer per block")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_blocks(tmpdir, args.blocks, args.transactions)
+        blockchain = Blockchain(tmpdir)
+
+        print("%-12s %10s %10s %14s" % ("reader", "seconds", "blocks/s",
+                                        "max lag (ms)"))
+        runs = [("sync", None)] + [("prefetch=%d" % n, n) for n in (1, 8, 32)]
+        for name, prefetch in runs:
+            if prefetch is None:
+                blocks = blockchain.get_unordered_blocks()
+            else:
+                blocks = blockchain.aiter_unordered_blocks(prefetch=prefetch)
+            n, elapsed, lag = asyncio.run(consume(blocks, args.delay,
+                                                  prefetch is not None))
+            assert n == args.blocks * args.transactions
+            print("%-12s %10.2f %10.0f %14.1f" % (name, elapsed,
+                                                  args.blocks / elapsed,
+                                                  lag * 1000))
+
+
+if __name__ == "__main__":
+    main()
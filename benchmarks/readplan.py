@@ -0,0 +1,120 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+"""Reads a synthetic chain whose blocks are saved out of order in the .blk
+files, as after the initial download, by height with one read per block
+and through a ReadPlanner. The files are likely in the page cache: the
+number of reads and their size matter most on disks and network file
+systems, or with the leveldb index of a real node:
+
+    python benchmarks/readplan.py --blocks 20000 --shuffle 1024
+    python benchmarks/readplan.py --index ~/.bitcoin/blocks/index \\
+        --blk-dir ~/.bitcoin/blocks --end 100000
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blockchain_parser.blockchain import Blockchain, BITCOIN_CONSTANT  # noqa
+from blockchain_parser.index import DBBlockIndex, BLOCK_HAVE_DATA  # noqa
+from blockchain_parser.readplan import ReadPlanner  # noqa: E402
+from blockchain_parser.utils import encode_varint, encode_compactsize  # noqa
+
+TRANSACTION = struct.pack("<I", 1) + b"\x01" + b"\x11" * 36 + b"\x00" + \
+    b"\xff" * 4 + b"\x01" + struct.pack("<q", 546) + b"\x00" + b"\x00" * 4
+
+
+def write_shuffled_chain(path, n_blocks, shuffle, n_transactions,
+                         blocks_per_file=5000):
+    """Writes blocks whose order is shuffled within runs of shuffle
+    heights, returns their index entries ordered by height"""
+    rnd = random.Random(0)
+    heights = []
+    for start in range(0, n_blocks, shuffle):
+        run = list(range(start, min(start + shuffle, n_blocks)))
+        rnd.shuffle(run)
+        heights += run
+
+    block_indexes = [None] * n_blocks
+    for i, height in enumerate(heights):
+        file_no = i // blocks_per_file
+        mode = "ab" if i % blocks_per_file else "wb"
+        with open(os.path.join(path, "blk%05d.dat" % file_no), mode) as f:
+            header = struct.pack("<I", 1) + b"\x00" * 64 + \
+                struct.pack("<III", 1231006505 + 600 * height, 0, height)
+            raw_block = header + encode_compactsize(n_transactions) + \
+                TRANSACTION * n_transactions
+            f.write(BITCOIN_CONSTANT + struct.pack("<I", len(raw_block)))
+            data_pos = f.tell()
+            f.write(raw_block)
+        entry = b"".join(encode_varint(x) for x in (
+            250000, height, BLOCK_HAVE_DATA, 1, file_no, data_pos)) + header
+        block_indexes[height] = DBBlockIndex(struct.pack("<I", height) * 8,
+                                             entry)
+    return block_indexes
+
+
+def bench(blockchain, block_indexes, planner):
+    start = time.perf_counter()
+    size = 0
+    for block in blockchain.get_ordered_blocks(block_indexes,
+                                               planner=planner):
+        size += block.size
+    return size, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--blocks", type=int, default=20000)
+    parser.add_argument("--shuffle", type=int, default=1024,
+                        help="size of the runs of heights shuffled")
+    parser.add_argument("--transactions", type=int, default=20)
+    parser.add_argument("--window", type=int, default=1024)
+    parser.add_argument("--max-bytes", type=int, default=1 << 27)
+    parser.add_argument("--index", help="leveldb index of a node")
+    parser.add_argument("--blk-dir", help=".blk files of the node")
+    parser.add_argument("--end", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.index:
+            blockchain = Blockchain(args.blk_dir)
+            block_indexes = blockchain.get_block_indexes(args.index)
+            block_indexes = block_indexes[:args.end]
+        else:
+            blockchain = Blockchain(tmpdir)
+            block_indexes = write_shuffled_chain(
+                tmpdir, args.blocks, args.shuffle, args.transactions)
+
+        print("%-8s %10s %10s %10s %14s" % ("reader", "seconds", "MB/s",
+                                            "reads", "bytes/read"))
+        size, elapsed = bench(blockchain, block_indexes, None)
+        # get_block reads the size of the block, then its data
+        print("%-8s %10.2f %10.1f %10d %14.0f"
+              % ("height", elapsed, size / elapsed / 1e6,
+                 2 * len(block_indexes), size / (2 * len(block_indexes))))
+        planner = ReadPlanner(blockchain.path, window=args.window,
+                              max_bytes=args.max_bytes)
+        size, elapsed = bench(blockchain, block_indexes, planner)
+        print("%-8s %10.2f %10.1f %10d %14.0f"
+              % ("planner", elapsed, size / elapsed / 1e6,
+                 planner.stats.reads, planner.stats.bytes_per_read))
+
+
+if __name__ == "__main__":
+    main()
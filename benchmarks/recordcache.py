@@ -0,0 +1,103 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+"""Compares deriving the txids, prevouts, output values, types and
+addresses of blocks by parsing them, to reading them from a RecordCache,
+filled by a first pass, in the columns of the records and converted to
+Python lists:
+
+    python benchmarks/recordcache.py --blocks 50 --transactions 500
+"""
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blockchain_parser.blockchain import Blockchain, BITCOIN_CONSTANT  # noqa
+from blockchain_parser.recordcache import RecordCache  # noqa: E402
+from blockchain_parser.utils import encode_compactsize  # noqa: E402
+
+
+def make_tx(i):
+    outputs = [b"\x19\x76\xa9\x14" + struct.pack("<I", i) * 5 + b"\x88\xac",
+               b"\x16\x00\x14" + struct.pack("<I", i + 1) * 5]
+    return struct.pack("<I", 1) + b"\x01" + struct.pack("<I", i) * 8 + \
+        struct.pack("<I", 0) + b"\x6b" + b"\x47" * 107 + b"\xff" * 4 + \
+        b"\x02" + b"".join(struct.pack("<q", 546 + i) + script
+                           for script in outputs) + b"\x00" * 4
+
+
+def write_blocks(path, n_blocks, n_transactions):
+    with open(os.path.join(path, "blk00000.dat"), "wb") as f:
+        for height in range(n_blocks):
+            header = struct.pack("<I", 0x20000000) + b"\x00" * 64 + \
+                struct.pack("<III", 1700000000 + height, 0x1703a30c, height)
+            raw_block = header + encode_compactsize(n_transactions) + \
+                b"".join(make_tx(height * n_transactions + i)
+                         for i in range(n_transactions))
+            f.write(BITCOIN_CONSTANT + struct.pack("<I", len(raw_block)) +
+                    raw_block)
+
+
+def parse(block):
+    fields = [[], [], [], [], []]
+    for tx in block.transactions:
+        fields[0].append(tx.txid)
+        for input_ in tx.inputs:
+            fields[1].append((input_.transaction_hash,
+                              input_.transaction_index))
+        for output in tx.outputs:
+            fields[2].append(output.value)
+            fields[3].append(output.type)
+            fields[4].append([a.address for a in output.addresses])
+    return fields
+
+
+def read(record):
+    return [record.txids, record.prevouts, list(record.values),
+            record.output_types, record.addresses]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--blocks", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_blocks(tmpdir, args.blocks, args.transactions)
+        blockchain = Blockchain(tmpdir)
+        cache = RecordCache(os.path.join(tmpdir, "records"))
+
+        print("%-10s %10s %10s" % ("pass", "seconds", "blocks/s"))
+        start = time.perf_counter()
+        parsed = [parse(block) for block in blockchain.get_unordered_blocks()]
+        elapsed = time.perf_counter() - start
+        print("%-10s %10.2f %10.0f" % ("parse", elapsed,
+                                       args.blocks / elapsed))
+
+        for name in ("miss", "hit"):
+            start = time.perf_counter()
+            records = [read(record) for record in cache.iter_records(
+                blockchain.get_unordered_blocks())]
+            elapsed = time.perf_counter() - start
+            print("%-10s %10.2f %10.0f" % (name, elapsed,
+                                           args.blocks / elapsed))
+        assert records == parsed
+
+
+if __name__ == "__main__":
+    main()
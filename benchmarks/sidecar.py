@@ -0,0 +1,96 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+"""Times unordered scans of a synthetic chain walking over the framing of
+the .blk files and reading the sidecars, with all the blocks and with a
+BlockFilter selecting a tenth of them by time, as well as lookups of
+blocks by hash through a SidecarIndex:
+
+    python benchmarks/sidecar.py --blocks 20000 --transactions 20
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blockchain_parser.blockchain import Blockchain, BITCOIN_CONSTANT  # noqa
+from blockchain_parser.filters import BlockFilter  # noqa: E402
+from blockchain_parser.sidecar import SidecarIndex  # noqa: E402
+from blockchain_parser.utils import encode_compactsize  # noqa: E402
+
+TRANSACTION = struct.pack("<I", 1) + b"\x01" + b"\x11" * 36 + b"\x00" + \
+    b"\xff" * 4 + b"\x01" + struct.pack("<q", 546) + b"\x00" + b"\x00" * 4
+
+
+def write_blocks(path, n_blocks, n_transactions, blocks_per_file=5000):
+    for height in range(n_blocks):
+        mode = "ab" if height % blocks_per_file else "wb"
+        blk_file = "blk%05d.dat" % (height // blocks_per_file)
+        with open(os.path.join(path, blk_file), mode) as f:
+            header = struct.pack("<I", 1) + b"\x00" * 64 + \
+                struct.pack("<III", 1231006505 + 600 * height, 0, height)
+            raw_block = header + encode_compactsize(n_transactions) + \
+                TRANSACTION * n_transactions
+            f.write(BITCOIN_CONSTANT + struct.pack("<I", len(raw_block)) +
+                    raw_block)
+
+
+def bench(blockchain, block_filter, sidecar):
+    start = time.perf_counter()
+    n = sum(1 for _ in blockchain.get_unordered_blocks(block_filter,
+                                                       sidecar=sidecar))
+    return n, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--blocks", type=int, default=20000)
+    parser.add_argument("--transactions", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_blocks(tmpdir, args.blocks, args.transactions)
+        blockchain = Blockchain(tmpdir)
+        hashes = [block.hash for block in blockchain.get_unordered_blocks()]
+        start_time = 1231006505 + 600 * args.blocks * 9 // 10
+        block_filter = BlockFilter(start_time=start_time)
+
+        print("%-20s %10s %10s" % ("scan", "blocks", "seconds"))
+        runs = [("framing", None, None), ("sidecar (first)", None, True),
+                ("sidecar", None, True), ("framing, filter", block_filter,
+                                          None),
+                ("sidecar, filter", block_filter, True)]
+        for name, scan_filter, sidecar in runs:
+            n, elapsed = bench(blockchain, scan_filter, sidecar)
+            print("%-20s %10d %10.3f" % (name, n, elapsed))
+
+        start = time.perf_counter()
+        index = SidecarIndex(tmpdir)
+        loaded = time.perf_counter() - start
+        rnd = random.Random(0)
+        lookups = [rnd.choice(hashes) for _ in range(args.lookups)]
+        start = time.perf_counter()
+        for block_hash in lookups:
+            index.get_block(block_hash)
+        elapsed = time.perf_counter() - start
+        print("index loaded in %.3fs, %.0f lookups/s"
+              % (loaded, args.lookups / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+"""Verifies a synthetic chain of headers mined at the lowest difficulty
+(bits 0x207fffff, as on regtest) with verify_header_chain, from the headers
+kept in the block index and from the .blk files, in this process and in a
+pool of worker processes.
+
+    python benchmarks/verify.py --headers 200000 --workers 4
+"""
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blockchain_parser.blockchain import Blockchain, BITCOIN_CONSTANT  # noqa
+from blockchain_parser.index import DBBlockIndex, BLOCK_HAVE_DATA  # noqa
+from blockchain_parser.utils import double_sha256, encode_varint  # noqa
+
+BITS = 0x207fffff
+TARGET = 0x7fffff << 232
+# a coinbase-like transaction, the blocks only need to be well framed
+TRANSACTION = b"\x01" + b"\x00" * 60
+
+
+def write_synthetic_chain(path, n_headers):
+    """Mines n_headers headers into blk00000.dat, returns their index
+    entries"""
+    block_indexes = []
+    prev_hash = b"\x00" * 32
+    with open(os.path.join(path, "blk00000.dat"), "wb") as f:
+        for height in range(n_headers):
+            nonce = 0
+            while True:
+                header = struct.pack("<I", 0x20000000) + prev_hash + \
+                    b"\x00" * 32 + struct.pack("<III", 1231006505 + 600 *
+                                               height, BITS, nonce)
+                hash_ = double_sha256(header)
+                if int.from_bytes(hash_, "little") <= TARGET:
+                    break
+                nonce += 1
+            raw_block = header + TRANSACTION
+            f.write(BITCOIN_CONSTANT + struct.pack("<I", len(raw_block)))
+            data_pos = f.tell()
+            f.write(raw_block)
+            entry = b"".join(encode_varint(x) for x in (
+                250000, height, BLOCK_HAVE_DATA, 1, 0, data_pos)) + header
+            block_indexes.append(DBBlockIndex(hash_, entry))
+            prev_hash = hash_
+    return block_indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--headers", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    from blockchain_parser.verify import verify_header_chain
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        start = time.perf_counter()
+        block_indexes = write_synthetic_chain(tmpdir, args.headers)
+        print("mined %d headers in %.2f s" % (args.headers,
+                                              time.perf_counter() - start))
+        blockchain = Blockchain(tmpdir)
+
+        print("%-6s %8s %10s %12s" % ("source", "workers", "seconds",
+                                      "headers/s"))
+        for from_blk in (False, True):
+            for workers in (1, args.workers):
+                start = time.perf_counter()
+                report = verify_header_chain(blockchain, block_indexes,
+                                             from_blk=from_blk,
+                                             workers=workers)
+                elapsed = time.perf_counter() - start
+                assert report.ok, str(report)
+                print("%-6s %8d %10.2f %12.0f"
+                      % ("blk" if from_blk else "index", workers, elapsed,
+                         report.n_headers / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+"""Compares copying every witness item into its own bytes object, as the
+parser used to do when building a transaction, splitting the witness
+stacks kept as views of the transactions, and reading their item counts
+and sizes from the offset tables, on witness-heavy blocks.
+
+Synthetic blocks are used by default: one filled with inscription-like
+transactions carrying a large script in their witness, one filled with
+taproot key path spends. Blocks from .blk files can be given instead:
+
+    python benchmarks/witness.py ~/.bitcoin/blocks/blk04000.dat
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blockchain_parser.block import Block  # noqa: E402
+from blockchain_parser.blockchain import get_blocks  # noqa: E402
+from blockchain_parser.input import Input  # noqa: E402
+from blockchain_parser.utils import encode_compactsize, \
+    decode_compactsize_from  # noqa: E402
+
+
+def make_segwit_tx(witness_stacks):
+    raw = [struct.pack("<I", 2), b"\x00\x01",
+           encode_compactsize(len(witness_stacks))]
+    for i in range(len(witness_stacks)):
+        raw.append(b"\x11" * 32 + struct.pack("<I", i) + b"\x00" +
+                   b"\xfd\xff\xff\xff")
+    raw.append(b"\x01" + struct.pack("<q", 546) + b"\x22\x51\x20" +
+               b"\x33" * 32)
+    for stack in witness_stacks:
+        raw.append(encode_compactsize(len(stack)))
+        for item in stack:
+            raw.append(encode_compactsize(len(item)) + item)
+    raw.append(struct.pack("<I", 0))
+    return b"".join(raw)
+
+
+def make_block(transactions):
+    header = struct.pack("<I", 0x20000000) + b"\x00" * 64 + \
+        struct.pack("<III", 1700000000, 0x1703a30c, 0)
+    return header + encode_compactsize(len(transactions)) + \
+        b"".join(transactions)
+
+
+def synthetic_blocks():
+    # ~4MB of inscriptions: signature, envelope script and control block
+    inscription = [b"\x44" * 64, b"\x55" * 40000, b"\x66" * 33]
+    yield "inscriptions", make_block([make_segwit_tx([inscription])
+                                      for _ in range(100)])
+    # taproot key path spends: one 64 bytes signature per input
+    yield "taproot", make_block([make_segwit_tx([[b"\x77" * 64]] * 2)
+                                 for _ in range(3000)])
+
+
+def copy_items(raw_block):
+    """Copies every witness item out of the transaction and adds it to its
+    input, as the parser used to do for all transactions"""
+    items = 0
+    for tx in Block(raw_block).iter_transactions():
+        offsets = tx._input_offsets
+        inputs = [Input.from_hex(tx.hex[offsets[i]:offsets[i + 1]])
+                  for i in range(tx.n_inputs)]
+        if not tx.is_segwit:
+            continue
+        offset = tx._offset_before_tx_witnesses
+        for inp in inputs:
+            n_items, varint_size = decode_compactsize_from(tx.hex, offset)
+            offset += varint_size
+            for j in range(n_items):
+                length, varint_size = decode_compactsize_from(tx.hex, offset)
+                offset += varint_size
+                inp.add_witness(tx.hex[offset:offset + length])
+                offset += length
+            items += n_items
+    return items
+
+
+def materialize(raw_block):
+    """Splits every witness stack into items"""
+    items = 0
+    for tx in Block(raw_block).transactions:
+        for inp in tx.inputs:
+            items += len(inp.witnesses)
+    return items
+
+
+def offset_tables(raw_block):
+    """Reads the item count and size of every witness stack"""
+    items = 0
+    size = 0
+    for tx in Block(raw_block).iter_transactions():
+        for inp in tx.inputs:
+            items += inp.witness_count
+            size += inp.witness_size
+    return items
+
+
+def bench(function, raw_block, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(raw_block)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("blk_file", nargs="?",
+                        help=".blk file to take the blocks from")
+    parser.add_argument("--blocks", type=int, default=5,
+                        help="number of blocks read from the .blk file")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.blk_file:
+        blocks = []
+        for raw_block in get_blocks(args.blk_file):
+            blocks.append((Block(raw_block).hash[-12:], raw_block))
+            if len(blocks) == args.blocks:
+                break
+    else:
+        blocks = list(synthetic_blocks())
+
+    print("%-14s %8s %8s %14s %14s %14s %8s"
+          % ("block", "MB", "items", "copy", "materialize", "offsets",
+             "speedup"))
+    for name, raw_block in blocks:
+        copied, items = bench(copy_items, raw_block, args.repeat)
+        eager, eager_items = bench(materialize, raw_block, args.repeat)
+        lazy, lazy_items = bench(offset_tables, raw_block, args.repeat)
+        assert items == eager_items == lazy_items
+        # the speedup is that of the offset tables over the copies
+        print("%-14s %8.2f %8d %11.2f ms %11.2f ms %11.2f ms %7.1fx"
+              % (name, len(raw_block) / 1e6, items, copied * 1000,
+                 eager * 1000, lazy * 1000, copied / lazy))
+
+
+if __name__ == "__main__":
+    main()
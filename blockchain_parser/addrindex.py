@@ -0,0 +1,330 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import heapq
+import json
+import mmap
+import os
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from .blockchain import Blockchain
+from .sortedfile import SortedRecordFile, write_sorted_records, \
+    sort_to_run, merge_runs
+from .utils import decode_varint, encode_varint, script_hash
+
+# Directions of a posting: the transaction either pays to the script in
+# one of its outputs or spends an output paying to it in one of its inputs
+OUTPUT = 0
+INPUT = 1
+
+# sha256 of the scriptPubKey, then big endian height and position of the
+# transaction in its block so that raw records sort in chain order
+_TUPLE = struct.Struct(">32sIIB")
+
+# sha256 of the scriptPubKey, position and size of its postings list in the
+# postings file of the segment, number of postings
+_KEY = struct.Struct("<32sQII")
+
+
+def _block_tuples(block):
+    """Yields the packed (script hash, height, tx index, direction) tuples
+    of a block, its undo data giving the scripts spent by its inputs"""
+    if block.undo is None and block.n_transactions > 1:
+        raise Exception("No undo data for block %s" % block.hash)
+    height = block.height
+    for i, tx in enumerate(block.transactions):
+        for output in tx.outputs:
+            yield _TUPLE.pack(script_hash(output.script.hex), height, i,
+                              OUTPUT)
+        if i == 0:
+            continue
+        for spent in block.undo.spends[i - 1].outputs:
+            yield _TUPLE.pack(script_hash(spent.script), height, i, INPUT)
+
+
+def _index_range(path, blockIndexes, rundir, max_records):
+    """Writes the sorted tuples of a range of blocks into a run file, run by
+    the workers of AddressIndex.update"""
+    blockchain = Blockchain(path)
+    blocks = blockchain.get_ordered_blocks(blockIndexes, undo=True)
+    tuples = (t for block in blocks for t in _block_tuples(block))
+
+    fd, run = tempfile.mkstemp(suffix=".run", dir=rundir)
+    os.close(fd)
+    sort_to_run(run, tuples, _TUPLE.size, max_records, rundir)
+    return run
+
+
+def _encode_postings(postings):
+    """Encodes a list of (height, tx index, direction) sorted in chain order,
+    heights are delta encoded"""
+    data = []
+    last_height = 0
+    for height, tx_index, direction in postings:
+        data.append(encode_varint(height - last_height))
+        data.append(encode_varint(tx_index * 2 + direction))
+        last_height = height
+    return b"".join(data)
+
+
+def _decode_postings(data, count):
+    postings = []
+    pos = 0
+    height = 0
+    for _ in range(count):
+        delta, i = decode_varint(data[pos:pos + 10])
+        pos += i
+        code, i = decode_varint(data[pos:pos + 10])
+        pos += i
+        height += delta
+        postings.append((height, code >> 1, code & 1))
+    return postings
+
+
+class _Segment(object):
+    """Key directory and postings written by one update of the index"""
+
+    def __init__(self, keys_path):
+        self.keys_path = keys_path
+        self.postings_path = keys_path[:-5] + ".postings"
+        self.keys = SortedRecordFile(keys_path)
+        self._postings_file = open(self.postings_path, "rb")
+        if os.path.getsize(self.postings_path) > 0:
+            self.postings = mmap.mmap(self._postings_file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+        else:
+            self.postings = b""
+
+    @property
+    def meta(self):
+        return json.loads(self.keys.meta.decode("ascii"))
+
+    @property
+    def name(self):
+        return os.path.basename(self.keys_path)
+
+    def remove(self):
+        self.close()
+        os.remove(self.keys_path)
+        os.remove(self.postings_path)
+
+    def close(self):
+        self.keys.close()
+        if isinstance(self.postings, mmap.mmap):
+            self.postings.close()
+        self._postings_file.close()
+
+    def get(self, key):
+        record = self.keys.find(key)
+        if record is None:
+            return []
+        _, pos, size, count = _KEY.unpack(record)
+        return _decode_postings(self.postings[pos:pos + size], count)
+
+    def __iter__(self):
+        """Yields the keys of the segment with their postings"""
+        for record in self.keys:
+            key, pos, size, count = _KEY.unpack(record)
+            yield key, _decode_postings(self.postings[pos:pos + size], count)
+
+
+class AddressIndex(object):
+    """An index of the transactions paying to or spending from each
+    scriptPubKey, built in one parallel pass over the blocks of the main
+    chain and their undo data.
+
+    For each script, identified by its sha256, the index holds a postings
+    list of (height, tx index, direction) tuples in chain order, which can
+    be resolved using Blockchain.get_block_by_height. Each update writes a
+    segment made of a mmap-ed key directory and a file of compressed
+    postings lists.
+    """
+
+    def __init__(self, path, max_segments=16):
+        self.path = path
+        self.max_segments = max_segments
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.segments = []
+        self.reload()
+
+    def __repr__(self):
+        return "AddressIndex(%s, height=%d)" % (self.path, self.height)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _segment_names(self):
+        return sorted(f for f in os.listdir(self.path)
+                      if f.startswith("segment-") and f.endswith(".keys"))
+
+    def reload(self):
+        """Opens the segments present on disk, removing those merged into a
+        compacted segment by an interrupted compaction"""
+        self.close()
+        segments = [_Segment(os.path.join(self.path, name))
+                    for name in self._segment_names()]
+        replaced = set(name for segment in segments
+                       for name in segment.meta.get("replaces", []))
+        for segment in segments:
+            if segment.name in replaced:
+                segment.remove()
+            else:
+                self.segments.append(segment)
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    @property
+    def height(self):
+        """Returns the height of the last indexed block, -1 if the index
+        is empty"""
+        if not self.segments:
+            return -1
+        return self.segments[-1].meta["height"]
+
+    def _write_segment(self, keyed_postings, height, replaces=()):
+        """Writes a segment from (key, postings) pairs sorted by key,
+        replaces listing the names of the segments merged into it"""
+        names = self._segment_names()
+        number = int(names[-1][8:-5]) + 1 if names else 0
+        base = os.path.join(self.path, "segment-%06d" % number)
+
+        def key_records(f):
+            pos = 0
+            for key, postings in keyed_postings:
+                data = _encode_postings(postings)
+                f.write(data)
+                yield _KEY.pack(key, pos, len(data), len(postings))
+                pos += len(data)
+
+        meta = {"height": height}
+        if replaces:
+            meta["replaces"] = list(replaces)
+        with open(base + ".postings", "wb") as f:
+            write_sorted_records(base + ".pending", key_records(f), _KEY.size,
+                                 32, json.dumps(meta).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        # the key directory is moved in place once the postings are on disk,
+        # it commits the segment
+        os.replace(base + ".pending", base + ".keys")
+        self.segments.append(_Segment(base + ".keys"))
+
+    def update(self, blockchain, index, cache=None, workers=None,
+               chunk_size=2016, max_records=1 << 20):
+        """Indexes the blocks of the main chain following the last indexed
+        one, ranges of chunk_size blocks being processed in parallel by a
+        pool of workers processes, each of them holding at most max_records
+        tuples in memory. Returns the height of the last indexed block."""
+        height = self.height
+        blockIndexes = blockchain._select_block_indexes(index, height + 1,
+                                                        cache=cache)
+        if not blockIndexes:
+            return height
+
+        chunks = [blockIndexes[i:i + chunk_size]
+                  for i in range(0, len(blockIndexes), chunk_size)]
+        with tempfile.TemporaryDirectory(dir=self.path) as rundir:
+            args = ([blockchain.path] * len(chunks), chunks,
+                    [rundir] * len(chunks), [max_records] * len(chunks))
+            if workers == 1:
+                runs = list(map(_index_range, *args))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    runs = list(executor.map(_index_range, *args))
+
+            self._write_segment(_group_tuples(merge_runs(runs, _TUPLE.size)),
+                                blockIndexes[-1].height)
+
+        if len(self.segments) > self.max_segments:
+            self.compact()
+        return self.height
+
+    def compact(self):
+        """Merges all the segments into a single one"""
+        if len(self.segments) < 2:
+            return
+        segments = list(self.segments)
+        height = self.height
+        merged = heapq.merge(*[iter(s) for s in segments],
+                             key=lambda item: item[0])
+        # the merged segment lists the segments it replaces, which are
+        # removed by reload if the compaction is interrupted before
+        self._write_segment(_concat_postings(merged), height,
+                            [segment.name for segment in segments])
+        for segment in segments:
+            segment.remove()
+        self.segments = self.segments[len(segments):]
+
+    def get(self, script):
+        """Returns the (height, tx index, direction) postings of a
+        scriptPubKey, in chain order"""
+        return self.get_by_hash(script_hash(script))
+
+    def get_by_hash(self, key):
+        """Returns the postings of the script with the given sha256"""
+        postings = []
+        # segments cover successive height ranges
+        for segment in self.segments:
+            postings.extend(segment.get(key))
+        return postings
+
+    def get_transactions(self, blockchain, index, script, cache=None):
+        """Yields the (height, direction, Transaction) of the transactions
+        paying to or spending from a scriptPubKey"""
+        for height, tx_index, direction in self.get(script):
+            block = blockchain.get_block_by_height(index, height, cache)
+            yield height, direction, block.transaction_at(tx_index)
+
+
+def _group_tuples(records):
+    """Groups sorted packed tuples into (key, postings) pairs, a transaction
+    paying twice to a script or spending two of its outputs is listed
+    once"""
+    key = None
+    postings = []
+    last = None
+    for record in records:
+        if record == last:
+            continue
+        last = record
+        k, height, tx_index, direction = _TUPLE.unpack(record)
+        if k != key:
+            if postings:
+                yield key, postings
+            key = k
+            postings = []
+        postings.append((height, tx_index, direction))
+    if postings:
+        yield key, postings
+
+
+def _concat_postings(items):
+    """Concatenates the postings of a key found in successive segments"""
+    key = None
+    postings = []
+    for k, p in items:
+        if k != key:
+            if postings:
+                yield key, postings
+            key = k
+            postings = []
+        postings.extend(p)
+    if postings:
+        yield key, postings
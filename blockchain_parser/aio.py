@@ -0,0 +1,72 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import asyncio
+import threading
+
+# Marks the end of the blocks in the queue
+_DONE = object()
+
+
+def _produce(loop, queue, blocks, stop, parse):
+    """Runs in the executor: iterates over blocks and puts them in the
+    queue, waiting while it is full"""
+    try:
+        for block in blocks:
+            if parse:
+                block.transactions
+            if stop.is_set():
+                return
+            asyncio.run_coroutine_threadsafe(
+                queue.put((block, None)), loop).result()
+            if stop.is_set():
+                return
+        item = (_DONE, None)
+    except Exception as e:
+        item = (_DONE, e)
+    finally:
+        # closes the files the blocks are read from
+        blocks.close()
+    if not stop.is_set():
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+
+async def aiter_blocks(blocks, prefetch=8, executor=None, parse=True):
+    """Asynchronously yields the blocks of a generator, such as the one
+    returned by Blockchain.get_ordered_blocks, reading them in executor
+    (the default executor of the event loop if it is None) and, if parse is
+    True, decoding their transactions there too.
+
+    Up to prefetch blocks are read ahead of the consumer, reading being
+    paused while they are not consumed. When iteration is stopped early or
+    cancelled, aclose (called by contextlib.aclosing) closes the generator,
+    and its files with it, before returning; otherwise this is done once
+    the iterator is garbage collected."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    producer = loop.run_in_executor(executor, _produce, loop, queue, blocks,
+                                    stop, parse)
+    try:
+        while True:
+            block, error = await queue.get()
+            if block is _DONE:
+                if error is not None:
+                    raise error
+                break
+            yield block
+    finally:
+        stop.set()
+        while not producer.done():
+            # unblocks the producer if it waits for room in the queue
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.wait([producer], timeout=0.01)
@@ -9,36 +9,31 @@
 # modified, propagated, or distributed except according to the terms contained
 # in the LICENSE file.
 
-from .transaction import Transaction
+from .transaction import Transaction, get_transaction_sections
 from .block_header import BlockHeader
-from .utils import format_hash, decode_compactsize, double_sha256
+from .utils import format_hash, decode_compactsize_from, double_sha256
 
 
-def get_block_transactions(raw_hex):
+def get_transaction_offsets(raw_hex):
+    """Given the raw hexadecimal representation of a block, returns the
+    offsets of its transactions followed by the offset where the last one
+    ends, walking over them without decoding them"""
+    n_transactions, offset = decode_compactsize_from(raw_hex, 80)
+    offset += 80
+    offsets = [offset]
+    for i in range(n_transactions):
+        offset += get_transaction_sections(raw_hex, offset)[3] + 4
+        offsets.append(offset)
+    return offsets
+
+
+def get_block_transactions(raw_hex, lazy=False):
     """Given the raw hexadecimal representation of a block,
     yields the block's transactions
     """
-    # Skipping the header
-    transaction_data = raw_hex[80:]
-
-    # Decoding the number of transactions, offset is the size of
-    # the varint (1 to 9 bytes)
-    n_transactions, offset = decode_compactsize(transaction_data)
-
-    for i in range(n_transactions):
-        # Try from 1024 (1KiB) -> 1073741824 (1GiB) slice widths
-        for j in range(0, 20):
-            try:
-                offset_e = offset + (1024 * 2 ** j)
-                transaction = Transaction.from_hex(
-                    transaction_data[offset:offset_e])
-                yield transaction
-                break
-            except:
-                continue
-
-        # Skipping to the next transaction
-        offset += transaction.size
+    offsets = get_transaction_offsets(raw_hex)
+    for i in range(len(offsets) - 1):
+        yield Transaction.from_hex(raw_hex[offsets[i]:offsets[i + 1]], lazy)
 
 
 class Block(object):
@@ -46,15 +41,21 @@ class Block(object):
     Represents a Bitcoin block, contains its header and its transactions.
     """
 
-    def __init__(self, raw_hex, height=None, blk_file=None):
+    def __init__(self, raw_hex, height=None, blk_file=None, undo=None,
+                 data_pos=None):
         self.hex = raw_hex
         self._hash = None
+        self._hash_bytes = None
         self._transactions = None
+        self._transaction_offsets = None
         self._header = None
         self._n_transactions = None
         self.size = len(raw_hex)
         self.height = height
         self.blk_file = blk_file
+        self.undo = undo
+        # position of the data of the block in its .blk file
+        self.data_pos = data_pos
 
     def __repr__(self):
         return "Block(%s)" % self.hash
@@ -68,9 +69,16 @@ class Block(object):
     def hash(self):
         """Returns the block's hash (double sha256 of its 80 bytes header"""
         if self._hash is None:
-            self._hash = format_hash(double_sha256(self.hex[:80]))
+            self._hash = format_hash(self.hash_bytes)
         return self._hash
 
+    @property
+    def hash_bytes(self):
+        """Returns the block's hash in internal byte order"""
+        if self._hash_bytes is None:
+            self._hash_bytes = double_sha256(self.hex[:80])
+        return self._hash_bytes
+
     @property
     def n_transactions(self):
         """Return the number of transactions contained in this block,
@@ -78,7 +86,7 @@ class Block(object):
         as there's no need to parse all transactions to get this information
         """
         if self._n_transactions is None:
-            self._n_transactions = decode_compactsize(self.hex[80:])[0]
+            self._n_transactions = decode_compactsize_from(self.hex, 80)[0]
 
         return self._n_transactions
 
@@ -87,10 +95,47 @@ class Block(object):
         """Returns a list of the block's transactions represented
         as Transaction objects"""
         if self._transactions is None:
-            self._transactions = list(get_block_transactions(self.hex))
+            self._transactions = list(self.iter_transactions(lazy=False))
 
         return self._transactions
 
+    @property
+    def transaction_offsets(self):
+        """Returns the offsets of the block's transactions in its raw data,
+        followed by the offset where the last one ends"""
+        if self._transaction_offsets is None:
+            self._transaction_offsets = get_transaction_offsets(self.hex)
+        return self._transaction_offsets
+
+    def transaction_at(self, i, lazy=True):
+        """Returns the i-th transaction of the block, only parsing this one.
+        Lazy transactions only build their inputs and outputs when they
+        are accessed."""
+        if self._transactions is not None:
+            return self._transactions[i]
+        offsets = self.transaction_offsets
+        n_transactions = len(offsets) - 1
+        if i < 0:
+            i += n_transactions
+        if not 0 <= i < n_transactions:
+            raise IndexError("Block has no transaction %d" % i)
+        return Transaction.from_hex(self.hex[offsets[i]:offsets[i + 1]], lazy)
+
+    def iter_transactions(self, lazy=True, output_filter=None):
+        """Yields the block's transactions, lazy by default. Given an
+        OutputFilter, only the transactions having a matching output are
+        yielded, the others being checked on their raw bytes without
+        being parsed."""
+        if output_filter is None:
+            for i in range(self.n_transactions):
+                yield self.transaction_at(i, lazy)
+            return
+
+        offsets = self.transaction_offsets
+        for i in range(len(offsets) - 1):
+            if output_filter.match_transaction(self.hex, offsets[i]):
+                yield self.transaction_at(i, lazy)
+
     @property
     def header(self):
         """Returns a BlockHeader object corresponding to this block"""
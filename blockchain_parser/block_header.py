@@ -9,16 +9,18 @@
 # modified, propagated, or distributed except according to the terms contained
 # in the LICENSE file.
 
-from datetime import datetime
+from datetime import datetime, timezone
 from bitcoin.core import CBlockHeader
 
-from .utils import decode_uint32, format_hash
+from .utils import decode_uint32, double_sha256, format_hash
 
 
 class BlockHeader(object):
     """Represents a block header"""
 
-    def __init__(self, raw_hex):
+    def __init__(self, raw_hex, height=None):
+        self._hash = None
+        self._hash_bytes = None
         self._version = None
         self._previous_block_hash = None
         self._merkle_root = None
@@ -28,6 +30,7 @@ class BlockHeader(object):
         self._difficulty = None
 
         self.hex = raw_hex[:80]
+        self.height = height
 
     def __repr__(self):
         return "BlockHeader(previous_block_hash=%s)" % self.previous_block_hash
@@ -37,6 +40,20 @@ class BlockHeader(object):
         """Builds a BlockHeader object from its bytes representation"""
         return cls(raw_hex)
 
+    @property
+    def hash(self):
+        """Returns the hash of the block (double sha256 of the header)"""
+        if self._hash is None:
+            self._hash = format_hash(self.hash_bytes)
+        return self._hash
+
+    @property
+    def hash_bytes(self):
+        """Returns the hash of the block, in internal byte order"""
+        if self._hash_bytes is None:
+            self._hash_bytes = double_sha256(self.hex)
+        return self._hash_bytes
+
     @property
     def version(self):
         """Return the block's version"""
@@ -48,23 +65,34 @@ class BlockHeader(object):
     def previous_block_hash(self):
         """Return the hash of the previous block"""
         if self._previous_block_hash is None:
-            self._previous_block_hash = format_hash(self.hex[4:36])
+            self._previous_block_hash = format_hash(
+                self.previous_block_hash_bytes)
         return self._previous_block_hash
 
+    @property
+    def previous_block_hash_bytes(self):
+        """Return the hash of the previous block, in internal byte order"""
+        return bytes(self.hex[4:36])
+
     @property
     def merkle_root(self):
         """Returns the block's merkle root"""
         if self._merkle_root is None:
-            self._merkle_root = format_hash(self.hex[36:68])
+            self._merkle_root = format_hash(self.merkle_root_bytes)
         return self._merkle_root
 
+    @property
+    def merkle_root_bytes(self):
+        """Returns the block's merkle root, in internal byte order"""
+        return bytes(self.hex[36:68])
+
     @property
     def timestamp(self):
         """Returns the timestamp of the block as a UTC datetime object"""
         if self._timestamp is None:
-            self._timestamp = datetime.utcfromtimestamp(
-                decode_uint32(self.hex[68:72])
-            )
+            self._timestamp = datetime.fromtimestamp(
+                decode_uint32(self.hex[68:72]), timezone.utc
+            ).replace(tzinfo=None)
         return self._timestamp
 
     @property
@@ -10,21 +10,25 @@
 # in the LICENSE file.
 
 import os
+import bisect
 import mmap
 import struct
 import pickle
 import stat
-import plyvel
+import time
 
 from blockchain_parser.transaction import Transaction
 from blockchain_parser.index import DBTransactionIndex
 from blockchain_parser import utils
-from binascii import unhexlify
-from binascii import hexlify
 from .block import Block
 from .index import DBBlockIndex
-from .utils import format_hash
+from .undo import BlockUndo
+from .reorder import ReorderBuffer, BIP34_HEIGHT, get_coinbase_height
+from .utils import double_sha256, parse_hash, to_timestamp
 from .block_header import BlockHeader
+from .leveldb import LevelDB
+from .follow import ChainTracker, is_complete_block
+from .aio import aiter_blocks
 
 
 # Constant separating blocks in the .blk files
@@ -56,12 +60,20 @@ def get_undo_files(path):
     return sorted(files)
 
 
-def get_blocks(blockfile):
+def get_block_positions(blockfile, offset=0, header_filter=None):
     """
-    Given the name of a .dat file, for every block contained in the file,
-    yields its raw hexadecimal value
+    Given the name of a .dat file, for every block contained in the file
+    from the given offset on, yields the position of its data in the file
+    and its raw hexadecimal value. A block only partially written at the
+    end of the file is not yielded.
+
+    If header_filter is given, it is called with the 80 bytes header of
+    each block and the blocks for which it returns False are skipped
+    without being read.
     """
     with open(blockfile, "rb") as f:
+        if os.path.getsize(f.name) == 0:
+            return
         if os.name == 'nt':
             size = os.path.getsize(f.name)
             raw_data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
@@ -69,20 +81,35 @@ def get_blocks(blockfile):
             # Unix-only call, will not work on Windows, see python doc.
             raw_data = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
         length = len(raw_data)
-        offset = 0
-        block_count = 0
-        while offset < (length - 4):
+        while offset < (length - 8):
             if raw_data[offset:offset+4] == BITCOIN_CONSTANT:
                 offset += 4
                 size = struct.unpack("<I", raw_data[offset:offset+4])[0]
-                offset += 4 + size
-                block_count += 1
-                yield raw_data[offset-size:offset]
+                offset += 4
+                if offset + size > length:
+                    break
+                if header_filter is None or \
+                        header_filter(raw_data[offset:offset+80]):
+                    yield offset, raw_data[offset:offset+size]
+                offset += size
             else:
-                offset += 1
+                # skip to the next block, bitcoind preallocates the .blk
+                # files with zeros
+                offset = raw_data.find(BITCOIN_CONSTANT, offset + 1)
+                if offset == -1:
+                    break
         raw_data.close()
 
 
+def get_blocks(blockfile):
+    """
+    Given the name of a .dat file, for every block contained in the file,
+    yields its raw hexadecimal value
+    """
+    for _, raw_block in get_block_positions(blockfile):
+        yield raw_block
+
+
 def get_block(blockfile, offset):
     """Extracts a single block from the blockfile at the given offset"""
     with open(blockfile, "rb") as f:
@@ -91,6 +118,80 @@ def get_block(blockfile, offset):
         return f.read(size)
 
 
+class _FrameScanner(object):
+    """Reads the blocks appended to a .blk file by a running bitcoind,
+    keeping the file mapped between polls and mapping it again when it
+    grows. The bytes following the last complete block are scanned again
+    at each poll, as bitcoind preallocates the files with zeros and writes
+    blocks over them."""
+
+    def __init__(self, blk_file):
+        self.blk_file = blk_file
+        self.pending = None
+        self._file = None
+        self._data = None
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._file.close()
+        self._data = None
+        self._file = None
+
+    def _map(self):
+        size = os.path.getsize(self.blk_file)
+        if self._data is None or len(self._data) != size:
+            self.close()
+            if size == 0:
+                return False
+            self._file = open(self.blk_file, "rb")
+            self._data = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        return True
+
+    def _next_block(self, offset):
+        """Returns the position of the first frame from offset on and the
+        data of its block, None if it is incomplete, or None if there is
+        no frame"""
+        data = self._data
+        frame = data.find(BITCOIN_CONSTANT, offset)
+        if frame == -1:
+            return None
+        if frame + 8 > len(data):
+            return frame, None
+        size = struct.unpack_from("<I", data, frame + 4)[0]
+        if frame + 8 + size > len(data):
+            return frame, None
+        raw_block = data[frame + 8:frame + 8 + size]
+        if not is_complete_block(raw_block):
+            return frame, None
+        return frame, raw_block
+
+    def read(self, offset):
+        """Yields the position and data of the complete blocks from offset
+        on, pending being set to the position of the frame of the first
+        incomplete one, or None"""
+        self.pending = None
+        if not self._map():
+            return
+        while True:
+            found = self._next_block(offset)
+            if found is None:
+                return
+            frame, raw_block = found
+            if raw_block is None:
+                self.pending = frame
+                return
+            offset = frame + 8 + len(raw_block)
+            yield frame + 8, raw_block
+
+    def has_block_after(self, frame):
+        """Returns whether a complete block follows the frame at the given
+        position"""
+        found = self._next_block(frame + 1)
+        return found is not None and found[1] is not None
+
+
 class Blockchain(object):
     """Represent the blockchain contained in the series of .blk files
     maintained by bitcoind.
@@ -98,14 +199,231 @@ class Blockchain(object):
 
     def __init__(self, path):
         self.path = path
-
-    def get_unordered_blocks(self):
+        self._block_indexes = {}
+        self._max_times = {}
+
+    def _get_position_after(self, start_after):
+        """Returns the (blk file number, offset) following the block whose
+        (blk file name or number, data position) is given, offset being 0
+        if the data position is -1"""
+        file_no, data_pos = start_after
+        if isinstance(file_no, str):
+            file_no = int(os.path.basename(file_no)[3:8])
+        if data_pos == -1:
+            return file_no, 0
+        blk_file = os.path.join(self.path, "blk%05d.dat" % file_no)
+        return file_no, data_pos + len(get_block(blk_file, data_pos))
+
+    def get_unordered_blocks(self, block_filter=None, start_after=None,
+                             sidecar=None):
         """Yields the blocks contained in the .blk files as is,
         without ordering them according to height.
+
+        If a BlockFilter is given, the blocks it does not select are
+        skipped after reading their header. Heights being unknown, it can
+        not select blocks by height.
+
+        If start_after is the (blk file, data position) of a block, such as
+        (block.blk_file, block.data_pos), only the blocks following it are
+        yielded.
+
+        If sidecar is True, or the directory where to keep them, the
+        positions and headers of the blocks of every .blk file are read from
+        its sidecar, see blockchain_parser.sidecar, which is written by the
+        first scan of the file.
+        """
+        header_filter = None
+        if block_filter is not None:
+            if block_filter.has_heights:
+                raise Exception("Unordered blocks can not be filtered "
+                                "by height")
+            header_filter = block_filter.match_header
+
+        if start_after is not None:
+            first_file, first_offset = self._get_position_after(start_after)
+
+        if sidecar:
+            from .sidecar import get_sidecar_positions
+            directory = None if sidecar is True else sidecar
+
+        for blk_file in get_files(self.path):
+            offset = 0
+            if start_after is not None:
+                file_no = int(os.path.basename(blk_file)[3:8])
+                if file_no < first_file:
+                    continue
+                if file_no == first_file:
+                    offset = first_offset
+            if sidecar:
+                positions = get_sidecar_positions(blk_file, offset,
+                                                  header_filter, directory)
+            else:
+                positions = get_block_positions(blk_file, offset,
+                                                header_filter)
+            for offset, raw_block in positions:
+                yield Block(raw_block, None, os.path.split(blk_file)[1],
+                            data_pos=offset)
+
+    def aiter_unordered_blocks(self, block_filter=None, start_after=None,
+                               prefetch=8, executor=None, parse=True,
+                               sidecar=None):
+        """Asynchronous iterator over the blocks of get_unordered_blocks,
+        which are read, and their transactions decoded if parse is True,
+        in executor with up to prefetch blocks read ahead, see
+        blockchain_parser.aio.aiter_blocks"""
+        return aiter_blocks(self.get_unordered_blocks(block_filter,
+                                                      start_after, sidecar),
+                            prefetch, executor, parse)
+
+    def get_linked_blocks(self, confirmations=6, max_blocks=1000,
+                          bip34_height=BIP34_HEIGHT):
+        """Yields the blocks of the longest chain found in the .blk files,
+        ordered by height, without the leveldb index: blocks are read
+        sequentially as by get_unordered_blocks and put back in order by a
+        ReorderBuffer linking them through their previous block hash,
+        holding up to max_blocks out of order blocks in memory and reading
+        the others again when they are released.
+
+        Blocks are released once confirmations blocks are built on top of
+        them, stale blocks being dropped. From bip34_height on, the height
+        pushed by the coinbase of each block is checked against the height
+        found by linking, an Exception being raised if they differ.
         """
+        reorder_buffer = ReorderBuffer(confirmations, max_blocks)
+
+        def release(final=False):
+            for hash_, height, raw_block, reference in \
+                    reorder_buffer.pop_ready(final):
+                blk_file, offset = reference
+                if raw_block is None:
+                    raw_block = get_block(blk_file, offset)
+                block = Block(raw_block, height, os.path.split(blk_file)[1],
+                              data_pos=offset)
+                if bip34_height is not None and height >= bip34_height:
+                    coinbase_height = get_coinbase_height(block)
+                    if coinbase_height != height:
+                        raise Exception("Block %s linked at height %d has "
+                                        "coinbase height %s"
+                                        % (block.hash, height,
+                                           coinbase_height))
+                yield block
+
         for blk_file in get_files(self.path):
-            for raw_block in get_blocks(blk_file):
-                yield Block(raw_block, None, os.path.split(blk_file)[1])
+            for offset, raw_block in get_block_positions(blk_file):
+                reorder_buffer.add(double_sha256(raw_block[:80]),
+                                   raw_block[4:36], raw_block,
+                                   (blk_file, offset))
+                for block in release():
+                    yield block
+        for block in release(final=True):
+            yield block
+
+    def follow(self, start_after=None, index=None, poll_interval=1.0,
+               idle_timeout=None, max_retries=None,
+               bip34_height=BIP34_HEIGHT):
+        """Yields the blocks appended to the .blk files by a running
+        bitcoind as they are written, polling the last .blk file every
+        poll_interval seconds and moving on to the next one once it is
+        created. Each block is read once, from the position following the
+        last one read.
+
+        start_after is the (blk file number, data position) of the last
+        block already processed, such as (block.blk_file, block.data_pos),
+        blocks being followed from the start of the file if the position is
+        -1. By default only the blocks written from now on are yielded.
+
+        A block whose data is not entirely written yet is read again at the
+        next poll, an Exception being raised if it is still incomplete
+        after max_retries polls, if it is given. It is skipped as corrupted
+        once the next file exists or a complete block follows it. Iteration
+        stops when no block is written for idle_timeout seconds, if it is
+        given.
+
+        Blocks are linked by a ChainTracker: they have their height, given
+        by the leveldb index present at path index or, from bip34_height
+        on, by their coinbase, and a Reorg is yielded before the block
+        making another branch the best chain.
+        """
+        if start_after is None:
+            files = get_files(self.path)
+            file_no = int(os.path.basename(files[-1])[3:8]) if files else 0
+            offset = 0
+            blk_file = os.path.join(self.path, "blk%05d.dat" % file_no)
+            if files:
+                for data_pos, raw_block in get_block_positions(blk_file):
+                    offset = data_pos + len(raw_block)
+        else:
+            file_no, offset = self._get_position_after(start_after)
+
+        tracker = ChainTracker(index, bip34_height=bip34_height)
+        try:
+            for item in self._follow(tracker, file_no, offset, poll_interval,
+                                     idle_timeout, max_retries):
+                yield item
+        finally:
+            tracker.close()
+
+    def _follow(self, tracker, file_no, offset, poll_interval, idle_timeout,
+                max_retries):
+        retries = 0
+        last_block_time = time.monotonic()
+        scanner = None
+        try:
+            while True:
+                blk_file = os.path.join(self.path, "blk%05d.dat" % file_no)
+                # checked first, as the file is complete once the next one
+                # exists
+                rollover = os.path.exists(
+                    os.path.join(self.path, "blk%05d.dat" % (file_no + 1)))
+
+                if os.path.exists(blk_file):
+                    if scanner is None:
+                        scanner = _FrameScanner(blk_file)
+                    for data_pos, raw_block in scanner.read(offset):
+                        offset = data_pos + len(raw_block)
+                        retries = 0
+                        last_block_time = time.monotonic()
+                        block = Block(raw_block, None,
+                                      os.path.split(blk_file)[1],
+                                      data_pos=data_pos)
+                        height, reorg = tracker.add(block.hash_bytes,
+                                                    raw_block[4:36], block)
+                        block.height = height
+                        if reorg is not None:
+                            yield reorg
+                        yield block
+
+                    pending = scanner.pending
+                    if pending is not None:
+                        # a block being written, unless the file is
+                        # complete or bitcoind wrote a block after it, in
+                        # which case it is corrupted and skipped
+                        if rollover or scanner.has_block_after(pending):
+                            offset = pending + 1
+                            retries = 0
+                            continue
+                        retries += 1
+                        if max_retries is not None and retries > max_retries:
+                            raise Exception(
+                                "Block at %s:%d still incomplete after %d "
+                                "polls" % (blk_file, pending, max_retries))
+                        time.sleep(poll_interval)
+                        continue
+
+                if rollover:
+                    if scanner is not None:
+                        scanner.close()
+                        scanner = None
+                    file_no += 1
+                    offset = 0
+                    continue
+                if idle_timeout is not None and \
+                        time.monotonic() - last_block_time >= idle_timeout:
+                    return
+                time.sleep(poll_interval)
+        finally:
+            if scanner is not None:
+                scanner.close()
 
     def _index_confirmed(self, chain_indexes, num_confirmations=6):
         """Check if the first block index in "chain_indexes" has at least
@@ -148,11 +466,16 @@ class Blockchain(object):
                 if len(chain) == num_confirmations:
                     return first_block.hash in chain
 
-    def get_ordered_blocks(self, index, start=0, end=None, cache=None):
-        """Yields the blocks contained in the .blk files as per
-        the heigt extract from the leveldb index present at path
-        index maintained by bitcoind.
+    def get_block_indexes(self, index, cache=None):
+        """Returns the list of DBBlockIndex of the blocks of the main chain,
+        ordered by height, as extracted from the leveldb index present at
+        path index maintained by bitcoind.
+
+        index can also be a list of DBBlockIndex previously returned by
+        this method, in which case it is returned as is.
         """
+        if isinstance(index, list):
+            return index
 
         blockIndexes = None
 
@@ -160,14 +483,20 @@ class Blockchain(object):
             # load the block index cache from a previous index
             with open(cache, 'rb') as f:
                 blockIndexes = pickle.load(f)
+            # caches written by older versions do not keep the headers,
+            # they are rebuilt
+            if blockIndexes and not hasattr(blockIndexes[0], "header"):
+                blockIndexes = None
 
         if blockIndexes is None:
-            with plyvel.DB(index, compression=None) as db:
-                # Block index entries are stored with keys prefixed by 'b'
-                with db.iterator(prefix=b'b') as iterator:
-                    blockIndexes = [DBBlockIndex(format_hash(k[1:]), v) for k, v in iterator]
+            with LevelDB(index) as db:
+                # Block index entries are stored with keys prefixed by 'b'
+                blockIndexes = [DBBlockIndex(k[1:], v)
+                                for k, v in db.iterator(prefix=b'b')]
+
+            blockIndexes.sort(key=lambda x: x.height)
 
-            if cache and not os.path.exists(cache):
+            if cache:
                 # cache the block index for re-use next time
                 with open(cache, 'wb') as f:
                     pickle.dump(blockIndexes, f)
@@ -205,34 +534,179 @@ class Blockchain(object):
         # filter out stale blocks, so we are left only with block indexes
         # that have been confirmed
         # (or are new enough that they haven't yet been confirmed)
-        blockIndexes = list(filter(lambda block: block.hash not in stale_blocks, blockIndexes))
-
+        return list(filter(lambda block: block.hash not in stale_blocks, blockIndexes))
+
+    def _get_cached_block_indexes(self, index, cache=None):
+        """Returns the block indexes as get_block_indexes, only reading the
+        index on the first call"""
+        key = (index, cache) if not isinstance(index, list) else id(index)
+        if key not in self._block_indexes:
+            self._block_indexes[key] = self.get_block_indexes(index, cache)
+        return key, self._block_indexes[key]
+
+    def get_block_by_height(self, index, height, cache=None, undo=False):
+        """Returns the block of the main chain at the given height, located
+        using the leveldb index present at path index. The index is only
+        read on the first call, use reset_block_indexes to reload it.
+        """
+        _, blockIndexes = self._get_cached_block_indexes(index, cache)
+
+        position = height - blockIndexes[0].height if blockIndexes else -1
+        if not 0 <= position < len(blockIndexes) or \
+                blockIndexes[position].height != height:
+            heights = [blkIdx.height for blkIdx in blockIndexes]
+            position = bisect.bisect_left(heights, height)
+            if position == len(heights) or heights[position] != height:
+                raise IndexError("No block at height %d" % height)
+
+        for block in self.get_ordered_blocks(blockIndexes, position,
+                                             position + 1, undo=undo):
+            return block
+        raise IndexError("Block at height %d was not saved" % height)
+
+    def reset_block_indexes(self):
+        """Forgets the block indexes read by get_block_by_height,
+        get_height_for_time and get_blocks_between"""
+        self._block_indexes = {}
+        self._max_times = {}
+
+    def get_ordered_headers(self, index, start=0, end=None, cache=None):
+        """Yields the headers of the blocks of the main chain as
+        BlockHeader objects, ordered by height, as kept in the leveldb
+        index present at path index (or in its cache) without reading the
+        .blk files. start and end are positions in the list of block
+        indexes, as taken by get_ordered_blocks."""
+        blockIndexes = self.get_block_indexes(index, cache)
         if end is None:
             end = len(blockIndexes)
+        elif end < start:
+            blockIndexes = list(reversed(blockIndexes))
+            start = len(blockIndexes) - start
+            end = len(blockIndexes) - end
+
+        for blkIdx in blockIndexes[start:end]:
+            yield BlockHeader(blkIdx.header, blkIdx.height)
+
+    def _get_max_times(self, index, cache=None):
+        """Returns the block indexes and the running maximum of their
+        timestamps, which unlike the timestamps are sorted"""
+        key, blockIndexes = self._get_cached_block_indexes(index, cache)
+        if key not in self._max_times:
+            max_times = []
+            max_time = 0
+            for blkIdx in blockIndexes:
+                max_time = max(max_time, blkIdx.time)
+                max_times.append(max_time)
+            self._max_times[key] = max_times
+        return blockIndexes, self._max_times[key]
+
+    def get_height_for_time(self, index, time, cache=None):
+        """Returns the height of the first block of the main chain whose
+        timestamp, or the timestamp of one of its ancestors, is at least
+        time (a UNIX timestamp or a UTC datetime). Returns None if there is
+        no such block. The index is only read on the first call."""
+        blockIndexes, max_times = self._get_max_times(index, cache)
+        position = bisect.bisect_left(max_times, to_timestamp(time))
+        if position == len(blockIndexes):
+            return None
+        return blockIndexes[position].height
+
+    def get_blocks_between(self, index, start_time, end_time, cache=None):
+        """Returns the DBBlockIndex of the blocks of the main chain mined
+        between start_time and end_time (inclusive, UNIX timestamps or UTC
+        datetimes), found by binary search without reading the .blk files.
+        As block timestamps are not monotonic, the blocks are those from
+        the first one at start_time or later to the last one before any
+        block later than end_time. The result can be given to
+        get_ordered_blocks to read the blocks."""
+        blockIndexes, max_times = self._get_max_times(index, cache)
+        first = bisect.bisect_left(max_times, to_timestamp(start_time))
+        last = bisect.bisect_right(max_times, to_timestamp(end_time))
+        return blockIndexes[first:last]
+
+    def _select_block_indexes(self, index, start=0, end=None, cache=None,
+                              block_filter=None):
+        """Returns the DBBlockIndex of the blocks get_ordered_blocks yields,
+        up to the first block whose data is missing"""
+        blockIndexes = self.get_block_indexes(index, cache)
 
-        if end < start:
+        if end is None:
+            end = len(blockIndexes)
+        elif end < start:
             blockIndexes = list(reversed(blockIndexes))
             start = len(blockIndexes) - start
             end = len(blockIndexes) - end
 
+        selected = []
         for blkIdx in blockIndexes[start:end]:
             if blkIdx.file == -1 or blkIdx.data_pos == -1:
                 break
-            blkFile = os.path.join(self.path, "blk%05d.dat" % blkIdx.file)
-            yield Block(get_block(blkFile, blkIdx.data_pos), blkIdx.height)
+            if block_filter is not None and \
+                    not block_filter.match_index(blkIdx):
+                continue
+            selected.append(blkIdx)
+        return selected
+
+    def get_ordered_blocks(self, index, start=0, end=None, cache=None,
+                           undo=False, block_filter=None, planner=None):
+        """Yields the blocks contained in the .blk files as per
+        the heigt extract from the leveldb index present at path
+        index maintained by bitcoind.
+
+        If undo is True, the undo data of each block is read from the
+        rev*.dat files and made available as block.undo.
+
+        If a BlockFilter is given, the blocks it does not select are
+        skipped without being read, their height and header being kept in
+        the block index.
+
+        If a ReadPlanner is given, blocks are read by windows, in the order
+        of their position in the .blk files rather than by height.
+        """
+        selected = self._select_block_indexes(index, start, end, cache,
+                                              block_filter)
+        if planner is not None:
+            raw_blocks = planner.iter_blocks(selected)
+        else:
+            raw_blocks = ((blkIdx, get_block(os.path.join(
+                self.path, "blk%05d.dat" % blkIdx.file), blkIdx.data_pos))
+                for blkIdx in selected)
+
+        for blkIdx, raw_block in raw_blocks:
+            block = Block(raw_block, blkIdx.height)
+            if undo and blkIdx.undo_pos != -1:
+                revFile = os.path.join(self.path, "rev%05d.dat" % blkIdx.file)
+                block.undo = BlockUndo(get_block(revFile, blkIdx.undo_pos))
+            yield block
+
+    def aiter_ordered_blocks(self, index, start=0, end=None, cache=None,
+                             undo=False, block_filter=None, planner=None,
+                             prefetch=8, executor=None, parse=True):
+        """Asynchronous iterator over the blocks of get_ordered_blocks,
+        which are read, and their transactions decoded if parse is True,
+        in executor with up to prefetch blocks read ahead, see
+        blockchain_parser.aio.aiter_blocks. The block index is read when
+        the iteration starts."""
+        return aiter_blocks(self.get_ordered_blocks(index, start, end, cache,
+                                                    undo, block_filter,
+                                                    planner),
+                            prefetch, executor, parse)
 
     def get_transaction(self, txid, db):
         """Yields the transaction contained in the .blk files as a python
          object, similar to
          https://developer.bitcoin.org/reference/rpc/getrawtransaction.html
+
+         db is either bitcoind's txindex leveldb, opened with
+         blockchain_parser.leveldb.LevelDB or plyvel, or a TxIndex built
+         from the .blk files by blockchain_parser.txindex
         """
+        from .txindex import TxIndex
 
-        byte_arr = bytearray.fromhex(txid)
-        byte_arr.reverse()
-        tx_hash = hexlify(b't').decode('utf-8') + \
-            hexlify(byte_arr).decode('utf-8')
+        if isinstance(db, TxIndex):
+            return self._get_indexed_transaction(txid, db)
 
-        tx_hash_fmtd = unhexlify(tx_hash)
+        tx_hash_fmtd = b't' + parse_hash(txid)
         raw_hex = db.get(tx_hash_fmtd)
 
         tx_idx = DBTransactionIndex(utils.format_hash(tx_hash_fmtd), raw_hex)
@@ -255,3 +729,18 @@ class Blockchain(object):
                 continue
 
         return None
+
+    def _get_indexed_transaction(self, txid, txindex):
+        """Reads the header of the block containing a transaction and the
+        transaction itself, as located by a TxIndex"""
+        tx_idx = txindex.get(txid)
+        if tx_idx is None:
+            return None
+
+        blk_file = os.path.join(self.path, "blk%05d.dat" % tx_idx.blockfile_no)
+        with open(blk_file, "rb") as f:
+            f.seek(tx_idx.file_offset)
+            block_header = BlockHeader.from_hex(f.read(80))
+            f.seek(tx_idx.file_offset + 80 + tx_idx.block_offset)
+            transaction = Transaction.from_hex(f.read(tx_idx.size))
+        return [block_header, transaction]
@@ -0,0 +1,389 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .interner import HashInterner
+
+# Number of ids whose root is looked for at once when writing assignments
+_ASSIGNMENT_CHUNK = 1 << 20
+
+
+def address_key(address):
+    """Returns the key under which an Address is interned, the pay to
+    public key and pay to public key hash forms of an address sharing the
+    same key"""
+    return hashlib.sha256(address.type.encode("ascii") + b":" +
+                          address.hash).digest()
+
+
+class UnionFind(object):
+    """Disjoint sets over the dense ids 0 to count - 1, stored as NumPy
+    arrays of parents and ranks, memory mapped in the directory path if it
+    is given.
+
+    Unions are made by batches: the roots of both ends of the pairs are
+    found with path halving, and in each round every root is hooked under
+    at most one other root of higher rank (or equal rank and lower id),
+    until all the pairs share the same root.
+
+    The files are mapped copy-on-write, so they keep the state of the last
+    flush: the entries changed since are only in memory, and flush writes
+    them to a journal, which is then applied to the files. A journal left
+    by an interrupted flush is applied when the files are opened again.
+    """
+
+    # Number of changed ids recorded before duplicates are dropped
+    _CHANGED_LIMIT = 1 << 22
+
+    def __init__(self, path=None, count=0, wide=False, capacity=1 << 16):
+        self.path = path
+        self.id_dtype = np.dtype(np.uint64 if wide else np.uint32)
+        self.meta = None
+        self._count = count
+        self._changed = []
+        self._n_changed = 0
+        if path is not None and os.path.exists(self._file("parent.dat")):
+            if os.path.exists(self._file("journal.npz")):
+                self._replay()
+            if os.path.exists(self._file("meta.json")):
+                with open(self._file("meta.json")) as f:
+                    state = json.load(f)
+                self._count = state["count"]
+                self.meta = state["meta"]
+            self._open_arrays(os.path.getsize(self._file("parent.dat"))
+                              // self.id_dtype.itemsize)
+            return
+
+        if path is not None and not os.path.exists(path):
+            os.makedirs(path)
+        self._capacity = max(capacity, count)
+        self._parent = self._create("parent.dat", self.id_dtype)
+        self._rank = self._create("rank.dat", np.uint8)
+        self._parent[:count] = np.arange(count, dtype=self.id_dtype)
+        self._record(np.arange(count))
+        self.flush()
+
+    def __repr__(self):
+        return "UnionFind(ids=%d)" % self._count
+
+    def __len__(self):
+        return self._count
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _create(self, name, dtype):
+        if self.path is None:
+            return np.zeros(self._capacity, dtype)
+        with open(self._file(name), "wb") as f:
+            f.truncate(self._capacity * np.dtype(dtype).itemsize)
+        return self._open(name, dtype)
+
+    def _open(self, name, dtype, mode="c"):
+        return np.memmap(self._file(name), dtype, mode,
+                         shape=(self._capacity,))
+
+    def _open_arrays(self, capacity):
+        self._capacity = capacity
+        self._parent = self._open("parent.dat", self.id_dtype)
+        self._rank = self._open("rank.dat", np.uint8)
+
+    def _extend(self, capacity):
+        """Extends the files to capacity ids, the new ones being unused"""
+        for name, dtype in (("parent.dat", self.id_dtype),
+                            ("rank.dat", np.dtype(np.uint8))):
+            with open(self._file(name), "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < capacity * dtype.itemsize:
+                    f.truncate(capacity * dtype.itemsize)
+
+    def _record(self, ids):
+        """Records ids whose entries changed since the last flush"""
+        if self.path is None or not len(ids):
+            return
+        self._changed.append(np.asarray(ids, np.int64))
+        self._n_changed += len(ids)
+        if self._n_changed > self._CHANGED_LIMIT:
+            self._changed = [self._changed_ids()]
+            self._n_changed = len(self._changed[0])
+
+    def _changed_ids(self):
+        if not self._changed:
+            return np.empty(0, np.int64)
+        return np.unique(np.concatenate(self._changed))
+
+    def _replay(self):
+        """Applies the journal written by flush to the files"""
+        with np.load(self._file("journal.npz")) as journal:
+            state = json.loads(str(journal["state"]))
+            ids = journal["ids"]
+            parent = journal["parent"]
+            rank = journal["rank"]
+        self._capacity = state.pop("capacity")
+        self._extend(self._capacity)
+        for name, dtype, values in (("parent.dat", self.id_dtype, parent),
+                                    ("rank.dat", np.uint8, rank)):
+            array = self._open(name, dtype, "r+")
+            array[ids] = values
+            array.flush()
+            del array
+
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file("meta.json"))
+        os.remove(self._file("journal.npz"))
+
+    def flush(self, meta=None):
+        """Writes the entries changed since the last flush to the files,
+        along with meta, a JSON serializable value read back as the meta
+        attribute when the files are opened again"""
+        self.meta = meta
+        if self.path is None:
+            return
+        ids = self._changed_ids()
+        state = {"count": self._count, "capacity": self._capacity,
+                 "meta": meta}
+        # the journal is complete once renamed, it commits the flush
+        tmp = self._file("journal.npz.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, state=np.array(json.dumps(state)), ids=ids,
+                     parent=self._parent[ids], rank=self._rank[ids])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file("journal.npz"))
+        self._replay()
+
+        # mapped again so that the changed pages are read from the files
+        self._changed = []
+        self._n_changed = 0
+        self._open_arrays(self._capacity)
+
+    def grow(self, count):
+        """Adds the ids up to count - 1, each in its own set"""
+        if count <= self._count:
+            return
+        if count > self._capacity:
+            capacity = self._capacity
+            while capacity < count:
+                capacity *= 2
+            if self.path is None:
+                parent = np.zeros(capacity, self.id_dtype)
+                parent[:self._count] = self._parent[:self._count]
+                rank = np.zeros(capacity, np.uint8)
+                rank[:self._count] = self._rank[:self._count]
+                self._capacity = capacity
+            else:
+                # the changes since the last flush are copied to the new
+                # mappings of the extended files
+                ids = self._changed_ids()
+                self._extend(capacity)
+                self._capacity = capacity
+                parent = self._open("parent.dat", self.id_dtype)
+                rank = self._open("rank.dat", np.uint8)
+                parent[ids] = self._parent[ids]
+                rank[ids] = self._rank[ids]
+            self._parent = parent
+            self._rank = rank
+        self._parent[self._count:count] = np.arange(self._count, count,
+                                                    dtype=self.id_dtype)
+        self._rank[self._count:count] = 0
+        self._record(np.arange(self._count, count))
+        self._count = count
+
+    def find_many(self, ids):
+        """Returns the roots of the sets of ids"""
+        parent = self._parent
+        x = np.asarray(ids).astype(self.id_dtype)
+        while True:
+            p = parent[x]
+            if np.array_equal(p, x):
+                return x
+            grandparent = parent[p]
+            parent[x] = grandparent
+            self._record(x[p != grandparent])
+            x = grandparent
+
+    def union_many(self, a, b):
+        """Merges the sets of a[i] and b[i] for every i, returns the number
+        of sets merged"""
+        parent = self._parent
+        rank = self._rank
+        a = np.asarray(a).astype(self.id_dtype)
+        b = np.asarray(b).astype(self.id_dtype)
+        merged = 0
+        while len(a):
+            ra = self.find_many(a)
+            rb = self.find_many(b)
+            distinct = ra != rb
+            a, b, ra, rb = a[distinct], b[distinct], ra[distinct], \
+                rb[distinct]
+            if not len(a):
+                break
+
+            rank_a = rank[ra]
+            rank_b = rank[rb]
+            a_lower = (rank_a < rank_b) | ((rank_a == rank_b) & (ra > rb))
+            child = np.where(a_lower, ra, rb)
+            new_parent = np.where(a_lower, rb, ra)
+
+            # a root gets a single parent per round, and roots getting one
+            # do not become parents in the same round
+            children, first = np.unique(child, return_index=True)
+            first = first[~np.isin(new_parent[first], children)]
+            child = child[first]
+            new_parent = new_parent[first]
+
+            parent[child] = new_parent
+            tie = rank[child] == rank[new_parent]
+            rank[new_parent[tie]] += 1
+            self._record(child)
+            self._record(new_parent[tie])
+            merged += len(child)
+        return merged
+
+    def find(self, i):
+        return int(self.find_many([i])[0])
+
+    def union(self, a, b):
+        return self.union_many([a], [b]) == 1
+
+
+class AddressClustering(object):
+    """Clusters addresses with the common-input-ownership heuristic: all
+    the addresses spent from by the inputs of a transaction are assumed to
+    belong to the same entity.
+
+    Blocks of the main chain are streamed with their undo data, the
+    addresses of the spent outputs (Output.addresses) are interned into
+    dense ids and the addresses of each transaction are merged in a
+    UnionFind. Both are memory mapped in the directory path, and flushed
+    every checkpoint_interval blocks, the union-find writing only the
+    entries changed since, so that an interrupted update resumes from the
+    last checkpoint.
+    """
+
+    def __init__(self, path, wide=False):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.addresses = HashInterner(self._file("addresses"), wide=wide)
+        self.union_find = UnionFind(self._file("sets"),
+                                    wide=self.addresses.id_dtype == np.uint64)
+        meta = self.union_find.meta or {"height": -1}
+        self.height = meta["height"]
+        if len(self.addresses) > len(self.union_find):
+            # addresses interned after the last checkpoint
+            self.addresses.truncate(len(self.union_find))
+            self.addresses.flush()
+
+    def __repr__(self):
+        return "AddressClustering(%s, height=%d, addresses=%d)" \
+               % (self.path, self.height, len(self.addresses))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def close(self):
+        """Closes the clustering, the unions made since the last checkpoint
+        being lost"""
+        self.addresses.close()
+
+    def checkpoint(self):
+        """Persists the state of the clustering as of the current height"""
+        self.addresses.flush()
+        self.union_find.flush({"height": self.height})
+
+    def _add_block(self, block):
+        if block.undo is None:
+            if block.n_transactions > 1:
+                raise Exception("No undo data for block %s" % block.hash)
+            return
+
+        keys = []
+        sizes = []
+        for spent_transaction in block.undo.spends:
+            size = len(keys)
+            for spent in spent_transaction.outputs:
+                for address in spent.output.addresses:
+                    keys.append(address_key(address))
+            sizes.append(len(keys) - size)
+        if not keys:
+            return
+
+        ids = self.addresses.intern_many(keys)
+        self.union_find.grow(len(self.addresses))
+        sizes = np.array(sizes)
+        starts = np.cumsum(sizes) - sizes
+        firsts = np.repeat(ids[starts[sizes > 0]], sizes[sizes > 0])
+        self.union_find.union_many(firsts, ids)
+
+    def update(self, blockchain, index, cache=None, end=None,
+               checkpoint_interval=10000):
+        """Processes the blocks of the main chain following the last
+        processed one, up to the given height. Returns the height of the
+        last processed block."""
+        if end is not None and end <= self.height:
+            return self.height
+        blockIndexes = blockchain._select_block_indexes(
+            index, self.height + 1, None if end is None else end + 1, cache)
+        if not blockIndexes:
+            return self.height
+
+        for i, block in enumerate(blockchain.get_ordered_blocks(
+                blockIndexes, undo=True)):
+            self._add_block(block)
+            self.height = block.height
+            if (i + 1) % checkpoint_interval == 0:
+                self.checkpoint()
+        self.checkpoint()
+        return self.height
+
+    def get_cluster(self, address):
+        """Returns the id of the cluster of an Address, which is the id of
+        one of its addresses, or None if it never was spent from"""
+        i = self.addresses.lookup(address_key(address))
+        if i is None:
+            return None
+        return self.union_find.find(i)
+
+    def assignments(self):
+        """Returns the array of the cluster ids of the addresses, indexed
+        by address id"""
+        return np.concatenate([
+            self.union_find.find_many(np.arange(
+                start, min(start + _ASSIGNMENT_CHUNK, len(self.union_find))))
+            for start in range(0, len(self.union_find), _ASSIGNMENT_CHUNK)
+        ] or [np.empty(0, self.union_find.id_dtype)])
+
+    def write_assignments(self, filename):
+        """Writes the cluster ids of the addresses into a .npy file"""
+        count = len(self.union_find)
+        out = np.lib.format.open_memmap(filename, "w+",
+                                        self.union_find.id_dtype, (count,))
+        for start in range(0, count, _ASSIGNMENT_CHUNK):
+            end = min(start + _ASSIGNMENT_CHUNK, count)
+            out[start:end] = self.union_find.find_many(np.arange(start, end))
+        out.flush()
+        del out
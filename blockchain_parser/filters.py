@@ -0,0 +1,172 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import struct
+
+from .block_header import BlockHeader
+from .output import Output
+from .script import get_script_tokens
+from .transaction import get_transaction_sections
+from .utils import decode_compactsize_from, encode_compactsize, \
+    to_timestamp
+
+# Top bits of the versions of blocks signalling with BIP9 version bits
+_VERSION_BITS_MASK = 0xe0000000
+_VERSION_BITS_TOP = 0x20000000
+
+
+def get_output_type(script):
+    """Returns the type of an output script given as bytes or memoryview,
+    as Output.type would, recognizing the standard templates from the
+    script bytes alone"""
+    length = len(script)
+    if length == 25 and script[0] == 0x76 and script[1] == 0xa9 \
+            and script[2] == 0x14 and script[23] == 0x88 \
+            and script[24] == 0xac:
+        return "pubkeyhash"
+    if length == 23 and script[0] == 0xa9 and script[1] == 0x14 \
+            and script[22] == 0x87:
+        return "p2sh"
+    if length == 22 and script[0] == 0 and script[1] == 0x14:
+        return "p2wpkh"
+    if length == 34 and script[1] == 0x20:
+        if script[0] == 0:
+            return "p2wsh"
+        if script[0] == 0x51:
+            return "p2tr"
+    if length > 0 and script[0] == 0x6a:
+        return "OP_RETURN" if get_script_tokens(script)[1] else "invalid"
+
+    # other scripts are rare enough to go through Output
+    return Output.from_hex(b"\x00" * 8 + encode_compactsize(length) +
+                           bytes(script)).type
+
+
+class BlockFilter(object):
+    """Selects the blocks of a scan from their height and header.
+
+    Heights are inclusive bounds, times are inclusive bounds given as UNIX
+    timestamps or UTC datetimes, version_bits is a list of BIP9 bits which
+    must all be signalled, and predicate is an optional function taking the
+    BlockHeader and returning whether the block is selected.
+
+    Blocks are checked against the block index, which keeps their height
+    and header, or against the 80 bytes of their header in unordered
+    scans, before the rest of the block is read.
+    """
+
+    def __init__(self, start_height=None, end_height=None, start_time=None,
+                 end_time=None, version_bits=None, predicate=None):
+        self.start_height = start_height
+        self.end_height = end_height
+        self.start_time = to_timestamp(start_time)
+        self.end_time = to_timestamp(end_time)
+        self.version_mask = 0
+        for bit in version_bits or []:
+            self.version_mask |= 1 << bit
+        self.predicate = predicate
+
+    def __repr__(self):
+        return "BlockFilter(height=%s-%s, time=%s-%s)" \
+               % (self.start_height, self.end_height,
+                  self.start_time, self.end_time)
+
+    @property
+    def has_heights(self):
+        return self.start_height is not None or self.end_height is not None
+
+    def match_height(self, height):
+        if self.start_height is not None and height < self.start_height:
+            return False
+        if self.end_height is not None and height > self.end_height:
+            return False
+        return True
+
+    def match_version(self, version):
+        if not self.version_mask:
+            return True
+        return version & _VERSION_BITS_MASK == _VERSION_BITS_TOP \
+            and version & self.version_mask == self.version_mask
+
+    def match_index(self, blkIdx):
+        """Returns whether the block of a DBBlockIndex is selected"""
+        return self.match_height(blkIdx.height) \
+            and self.match_header(blkIdx.header)
+
+    def match_header(self, raw_header):
+        """Returns whether the block with the given 80 bytes header is
+        selected, its height being checked separately"""
+        version = struct.unpack_from("<I", raw_header, 0)[0]
+        time = struct.unpack_from("<I", raw_header, 68)[0]
+        if self.start_time is not None and time < self.start_time:
+            return False
+        if self.end_time is not None and time > self.end_time:
+            return False
+        if not self.match_version(version):
+            return False
+        if self.predicate is not None:
+            return self.predicate(BlockHeader.from_hex(bytes(raw_header)))
+        return True
+
+
+class OutputFilter(object):
+    """Selects transactions having at least one output matching all the
+    given conditions: its type (as returned by Output.type) in types, its
+    value in satoshis between min_value and max_value (inclusive), and the
+    optional predicate, a function of the value and of the script bytes.
+
+    Outputs are checked on their raw bytes, without building Output
+    objects for the standard script types.
+    """
+
+    def __init__(self, types=None, min_value=None, max_value=None,
+                 predicate=None):
+        self.types = frozenset(types) if types is not None else None
+        self.min_value = min_value
+        self.max_value = max_value
+        self.predicate = predicate
+
+    def __repr__(self):
+        return "OutputFilter(types=%s, value=%s-%s)" \
+               % (sorted(self.types) if self.types is not None else None,
+                  self.min_value, self.max_value)
+
+    def match_output(self, raw_hex, offset=0):
+        """Returns whether the output starting at offset in raw_hex
+        matches"""
+        if self.min_value is not None or self.max_value is not None or \
+                self.predicate is not None:
+            value = struct.unpack_from("<q", raw_hex, offset)[0]
+            if self.min_value is not None and value < self.min_value:
+                return False
+            if self.max_value is not None and value > self.max_value:
+                return False
+
+        if self.types is not None or self.predicate is not None:
+            script_length, varint_size = decode_compactsize_from(raw_hex,
+                                                                 offset + 8)
+            start = offset + 8 + varint_size
+            script = memoryview(raw_hex)[start:start + script_length]
+            if self.types is not None and \
+                    get_output_type(script) not in self.types:
+                return False
+            if self.predicate is not None:
+                return self.predicate(value, script)
+        return True
+
+    def match_transaction(self, raw_hex, offset=0):
+        """Returns whether the transaction starting at offset in raw_hex
+        has a matching output"""
+        output_offsets = get_transaction_sections(raw_hex, offset)[1]
+        for output_offset in output_offsets[:-1]:
+            if self.match_output(raw_hex, offset + output_offset):
+                return True
+        return False
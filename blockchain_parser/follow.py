@@ -0,0 +1,189 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+from collections import OrderedDict
+
+from .block import get_transaction_offsets
+from .index import DBBlockIndex
+from .leveldb import LevelDB
+from .reorder import BIP34_HEIGHT, get_coinbase_height
+
+
+def is_complete_block(raw_block):
+    """Returns whether the transactions of a raw block span its whole data,
+    which is not the case of a block whose frame is written but whose data
+    is still being written"""
+    if len(raw_block) < 81:
+        return False
+    try:
+        return get_transaction_offsets(raw_block)[-1] == len(raw_block)
+    except Exception:
+        return False
+
+
+class Reorg(object):
+    """Switch of the best chain seen by Blockchain.follow: fork_height is
+    the height of the last block common to both chains, disconnected and
+    connected are the hashes of the blocks of the previous and of the new
+    best chain above it, ordered by height"""
+
+    def __init__(self, fork_height, disconnected, connected):
+        self.fork_height = fork_height
+        self.disconnected = disconnected
+        self.connected = connected
+
+    def __repr__(self):
+        return "Reorg(fork_height=%d, disconnected=%d, connected=%d)" % (
+            self.fork_height, len(self.disconnected), len(self.connected))
+
+
+class ChainTracker(object):
+    """Links the blocks seen by Blockchain.follow through their previous
+    block hash to give them a height and detect changes of the best chain,
+    remembering the last max_blocks blocks.
+
+    The height of a block whose parent is not tracked is looked up in the
+    leveldb index present at path index, if one is given, then taken from
+    its coinbase from bip34_height on, as bitcoind only writes its index
+    from time to time. Blocks whose height is unknown wait for their parent
+    to be tracked, as long as they are among the last max_blocks blocks.
+    """
+
+    def __init__(self, index=None, max_blocks=1000,
+                 bip34_height=BIP34_HEIGHT):
+        self.index = index
+        self.max_blocks = max_blocks
+        self.bip34_height = bip34_height
+        self.tip = None
+        self.height = -1
+        # hash -> [height, previous block hash]
+        self._blocks = OrderedDict()
+        # previous block hash -> hashes of the tracked blocks without height
+        self._orphans = {}
+        self._db = None
+
+    def __repr__(self):
+        return "ChainTracker(height=%d, blocks=%d)" % (self.height,
+                                                      len(self._blocks))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _get_index_height(self, hash_):
+        """Returns the height of a block in the leveldb index, None if the
+        index is not given or does not have it yet. The index is opened
+        again when a block is missing, to see the blocks written since."""
+        if self.index is None:
+            return None
+        for reopen in (False, True):
+            if self._db is None or reopen:
+                self.close()
+                self._db = LevelDB(self.index)
+            raw = self._db.get(b"b" + hash_)
+            if raw is not None:
+                return DBBlockIndex(hash_, raw).height
+        return None
+
+    def _get_coinbase_height(self, block):
+        """Returns the height of a Block given by its coinbase, None if it
+        is below bip34_height or can not be read"""
+        try:
+            height = get_coinbase_height(block)
+        except Exception:
+            return None
+        if height is None or height < self.bip34_height:
+            return None
+        return height
+
+    def _forget(self, hash_, height, prev_hash):
+        """Removes a block from the orphans once it is no longer tracked"""
+        if height is not None:
+            return
+        children = self._orphans.get(prev_hash)
+        if children is not None and hash_ in children:
+            children.remove(hash_)
+            if not children:
+                del self._orphans[prev_hash]
+
+    def add(self, hash_, prev_hash, block=None):
+        """Tracks a block given its hash and previous block hash, returns
+        its height (None if it is unknown) and the Reorg it causes, if
+        any. block is the Block whose coinbase gives its height when its
+        parent is not known."""
+        if hash_ in self._blocks:
+            return self._blocks[hash_][0], None
+
+        parent = self._blocks.get(prev_hash)
+        if parent is not None:
+            prev_height = parent[0]
+        else:
+            prev_height = self._get_index_height(prev_hash)
+        if prev_height is None and block is not None:
+            height = self._get_coinbase_height(block)
+            if height is not None:
+                prev_height = height - 1
+        self._blocks[hash_] = [None, prev_hash]
+        if prev_height is None:
+            self._orphans.setdefault(prev_hash, []).append(hash_)
+        while len(self._blocks) > self.max_blocks:
+            old_hash, (old_height, old_prev) = self._blocks.popitem(
+                last=False)
+            self._forget(old_hash, old_height, old_prev)
+        if prev_height is None or hash_ not in self._blocks:
+            return None, None
+
+        # descendants of the block seen before it get their heights
+        best_height, best = prev_height + 1, hash_
+        stack = [(hash_, prev_height + 1)]
+        while stack:
+            block_hash, height = stack.pop()
+            self._blocks[block_hash][0] = height
+            if height > best_height:
+                best_height, best = height, block_hash
+            for child in self._orphans.pop(block_hash, ()):
+                if child in self._blocks:
+                    stack.append((child, height + 1))
+        return prev_height + 1, self._set_tip(best, best_height)
+
+    def _set_tip(self, hash_, height):
+        """Makes a block the tip of the best chain if it is higher than the
+        current one, returns the Reorg it causes if the previous tip is not
+        one of its ancestors"""
+        if height <= self.height:
+            return None
+        old_tip, old_height = self.tip, self.height
+        self.tip, self.height = hash_, height
+        if old_tip is None:
+            return None
+
+        connected = []
+        while height > old_height:
+            connected.append(hash_)
+            if hash_ not in self._blocks:
+                return None
+            hash_ = self._blocks[hash_][1]
+            height -= 1
+        disconnected = []
+        old_hash = old_tip
+        while hash_ != old_hash:
+            if hash_ not in self._blocks or old_hash not in self._blocks:
+                # the fork is older than the blocks tracked
+                return None
+            connected.append(hash_)
+            disconnected.append(old_hash)
+            hash_ = self._blocks[hash_][1]
+            old_hash = self._blocks[old_hash][1]
+            height -= 1
+        if not disconnected:
+            return None
+        return Reorg(height, disconnected[::-1], connected[::-1])
@@ -0,0 +1,188 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .verify import MEDIAN_TIME_SPAN
+
+# Layout of the 80 bytes of a block header, hashes in internal byte order
+RAW_HEADER_DTYPE = np.dtype([
+    ("version", "<u4"),
+    ("prev_hash", "V32"),
+    ("merkle_root", "V32"),
+    ("time", "<u4"),
+    ("bits", "<u4"),
+    ("nonce", "<u4"),
+])
+
+HEADER_DTYPE = np.dtype([("height", np.int32)] + [
+    (name, RAW_HEADER_DTYPE.fields[name][0])
+    for name in RAW_HEADER_DTYPE.names])
+
+RETARGET_INTERVAL = 2016
+# Expected duration of a retarget window, two weeks in seconds
+TARGET_TIMESPAN = 14 * 24 * 60 * 60
+
+# Difficulty adjustment windows, the timespan being the difference between
+# the timestamps of the last and first blocks of the window as computed by
+# bitcoind, and adjustment the factor applied to the difficulty of the next
+# window (for complete windows)
+RETARGET_DTYPE = np.dtype([
+    ("start_height", np.int32),
+    ("end_height", np.int32),
+    ("start_time", np.uint32),
+    ("end_time", np.uint32),
+    ("bits", np.uint32),
+    ("difficulty", np.float64),
+    ("timespan", np.int64),
+    ("adjustment", np.float64),
+    ("hashrate", np.float64),
+])
+
+
+def headers_from_raw(raw_headers, heights=None):
+    """Decodes an iterable of 80 bytes headers into an array of
+    HEADER_DTYPE records, heights being -1 if they are not given"""
+    raw = np.frombuffer(b"".join(bytes(h[:80]) for h in raw_headers),
+                        RAW_HEADER_DTYPE)
+    headers = np.zeros(len(raw), HEADER_DTYPE)
+    headers["height"] = -1 if heights is None else heights
+    for name in RAW_HEADER_DTYPE.names:
+        headers[name] = raw[name]
+    return headers
+
+
+def headers_from_index(blockchain, index, cache=None):
+    """Returns the headers of the blocks of the main chain as an array of
+    HEADER_DTYPE records ordered by height, from the leveldb index present
+    at path index without reading the .blk files"""
+    blockIndexes = blockchain.get_block_indexes(index, cache)
+    return headers_from_raw([blkIdx.header for blkIdx in blockIndexes],
+                            [blkIdx.height for blkIdx in blockIndexes])
+
+
+def headers_from_blocks(blocks):
+    """Returns the headers of an iterable of Block objects, such as those
+    yielded by get_ordered_blocks or get_unordered_blocks, as an array of
+    HEADER_DTYPE records"""
+    raw_headers = []
+    heights = []
+    for block in blocks:
+        raw_headers.append(block.hex[:80])
+        heights.append(-1 if block.height is None else block.height)
+    return headers_from_raw(raw_headers, heights)
+
+
+def get_targets(bits):
+    """Returns the targets encoded by compact bits as floats"""
+    bits = np.asarray(bits, np.int64)
+    exponent = bits >> 24
+    mantissa = (bits & 0x007fffff).astype(np.float64)
+    return np.floor(mantissa * np.exp2(8.0 * (exponent - 3)))
+
+
+def get_difficulties(bits):
+    """Returns the difficulties of compact bits, as
+    BlockHeader.difficulty"""
+    bits = np.asarray(bits, np.int64)
+    shift = (bits >> 24) & 0xff
+    with np.errstate(divide="ignore"):
+        return 0xffff / (bits & 0x00ffffff).astype(np.float64) \
+            * np.exp2(8.0 * (29 - shift))
+
+
+def get_block_work(bits):
+    """Returns the expected number of hashes needed to mine blocks with the
+    given compact bits, 2**256 / (target + 1) as bitcoind computes it"""
+    return np.exp2(256.0) / (get_targets(bits) + 1)
+
+
+def get_chainwork(bits):
+    """Returns the cumulative work of a sequence of headers given their
+    compact bits ordered by height, as floats. It is the chainwork of
+    bitcoind if the sequence starts at the genesis block."""
+    return np.cumsum(get_block_work(bits))
+
+
+def get_median_time_past(times):
+    """Returns the median time past of each of a sequence of headers given
+    their timestamps ordered by height: the median of the timestamps of the
+    block and of its 10 predecessors (fewer at the start of the chain)"""
+    times = np.asarray(times, np.int64)
+    mtp = np.zeros(len(times), np.int64)
+    for i in range(min(len(times), MEDIAN_TIME_SPAN - 1)):
+        window = np.sort(times[:i + 1])
+        mtp[i] = window[len(window) // 2]
+    if len(times) >= MEDIAN_TIME_SPAN:
+        windows = sliding_window_view(times, MEDIAN_TIME_SPAN)
+        mtp[MEDIAN_TIME_SPAN - 1:] = np.partition(
+            windows, MEDIAN_TIME_SPAN // 2, axis=1)[:, MEDIAN_TIME_SPAN // 2]
+    return mtp
+
+
+def get_hashrates(headers, window=120):
+    """Returns an estimate of the network hash rate in hashes per second at
+    each of a sequence of headers ordered by height, as the getnetworkhashps
+    RPC call: the work of the last window blocks divided by the time
+    between the earliest and the latest timestamps of these blocks.
+    Estimates are NaN for the first window headers."""
+    n = len(headers)
+    hashrates = np.full(n, np.nan)
+    if n <= window:
+        return hashrates
+
+    chainwork = get_chainwork(headers["bits"])
+    times = sliding_window_view(headers["time"].astype(np.int64), window + 1)
+    timespan = times.max(axis=1) - times.min(axis=1)
+    work = chainwork[window:] - chainwork[:-window]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hashrates[window:] = np.where(timespan > 0, work / timespan, np.nan)
+    return hashrates
+
+
+def get_retarget_windows(headers):
+    """Splits a sequence of headers ordered by height into difficulty
+    adjustment windows of RETARGET_INTERVAL blocks, returned as an array of
+    RETARGET_DTYPE records. The first and last windows can be incomplete,
+    their adjustment is then NaN."""
+    heights = headers["height"]
+    if len(headers) == 0:
+        return np.zeros(0, RETARGET_DTYPE)
+
+    periods = heights // RETARGET_INTERVAL
+    starts = np.flatnonzero(np.diff(periods, prepend=periods[0] - 1))
+    ends = np.append(starts[1:], len(headers)) - 1
+
+    windows = np.zeros(len(starts), RETARGET_DTYPE)
+    windows["start_height"] = heights[starts]
+    windows["end_height"] = heights[ends]
+    windows["start_time"] = headers["time"][starts]
+    windows["end_time"] = headers["time"][ends]
+    windows["bits"] = headers["bits"][starts]
+    windows["difficulty"] = get_difficulties(windows["bits"])
+    timespan = windows["end_time"].astype(np.int64) - \
+        windows["start_time"].astype(np.int64)
+    windows["timespan"] = timespan
+
+    complete = (heights[starts] % RETARGET_INTERVAL == 0) & \
+        (heights[ends] % RETARGET_INTERVAL == RETARGET_INTERVAL - 1)
+    clamped = np.clip(timespan, TARGET_TIMESPAN // 4, TARGET_TIMESPAN * 4)
+    windows["adjustment"] = np.where(complete, TARGET_TIMESPAN / clamped,
+                                     np.nan)
+
+    # the work done during the timespan, after the first block was found
+    work = get_block_work(headers["bits"])
+    window_work = np.add.reduceat(work, starts) - work[starts]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        windows["hashrate"] = np.where(timespan > 0, window_work / timespan,
+                                       np.nan)
+    return windows
@@ -1,6 +1,6 @@
 from struct import unpack
 
-from .utils import format_hash
+from .utils import format_hash, parse_hash
 
 BLOCK_HAVE_DATA = 8
 BLOCK_HAVE_UNDO = 16
@@ -26,7 +26,14 @@ def _read_varint(raw_hex):
 
 class DBBlockIndex(object):
     def __init__(self, blk_hash, raw_hex):
-        self.hash = blk_hash
+        # the hash is given either in internal byte order, as in the keys
+        # of the leveldb index, or as a hex string
+        if isinstance(blk_hash, bytes):
+            self.hash_bytes = blk_hash
+            self.hash = format_hash(blk_hash)
+        else:
+            self.hash_bytes = parse_hash(blk_hash)
+            self.hash = blk_hash
         pos = 0
         n_version, i = _read_varint(raw_hex[pos:])
         pos += i
@@ -50,14 +57,16 @@ class DBBlockIndex(object):
         if self.status & BLOCK_HAVE_UNDO:
             self.undo_pos, i = _read_varint(raw_hex[pos:])
             pos += i
+        else:
+            self.undo_pos = -1
 
         assert (pos + 80 == len(raw_hex))
-        self.version, p, m, time, bits, self.nonce = unpack(
-            "<I32s32sIII",
-            raw_hex[-80:]
-        )
-        self.prev_hash = format_hash(p)
-        self.merkle_root = format_hash(m)
+        self.header = bytes(raw_hex[-80:])
+        self.version, self.prev_hash_bytes, self.merkle_root_bytes, \
+            self.time, self.bits, self.nonce = unpack("<I32s32sIII",
+                                                      self.header)
+        self.prev_hash = format_hash(self.prev_hash_bytes)
+        self.merkle_root = format_hash(self.merkle_root_bytes)
 
     def __repr__(self):
         return "DBBlockIndex(%s, height=%d, file_no=%d, file_pos=%d)" \
@@ -9,19 +9,23 @@
 # modified, propagated, or distributed except according to the terms contained
 # in the LICENSE file.
 
-from .utils import decode_compactsize, decode_uint32, format_hash
+from .utils import decode_compactsize, decode_compactsize_from, \
+    decode_uint32, format_hash
 from .script import Script
 
 
 class Input(object):
     """Represents a transaction input"""
 
-    def __init__(self, raw_hex):
+    def __init__(self, raw_hex, witness_data=None):
         self._transaction_hash = None
         self._transaction_index = None
         self._script = None
         self._sequence_number = None
-        self._witnesses = []
+        self._witnesses = None
+        # serialized witness stack of the input, as a view of the data of
+        # its transaction, split into items on first access
+        self._witness_data = witness_data
 
         self._script_length, varint_length = decode_compactsize(raw_hex[36:])
         self._script_start = 36 + varint_length
@@ -29,12 +33,19 @@ class Input(object):
         self.size = self._script_start + self._script_length + 4
         self.hex = raw_hex[:self.size]
 
+    def __getstate__(self):
+        # views cannot be pickled, the stack is only copied when pickling
+        state = self.__dict__.copy()
+        if isinstance(self._witness_data, memoryview):
+            state["_witness_data"] = bytes(self._witness_data)
+        return state
+
     def add_witness(self, witness):
-        self._witnesses.append(witness)
+        self.witnesses.append(witness)
 
     @classmethod
-    def from_hex(cls, hex_):
-        return cls(hex_)
+    def from_hex(cls, hex_, witness_data=None):
+        return cls(hex_, witness_data)
 
     def __repr__(self):
         return "Input(%s,%d)" % (self.transaction_hash, self.transaction_index)
@@ -44,9 +55,15 @@ class Input(object):
         """Returns the hash of the transaction containing the output
         redeemed by this input"""
         if self._transaction_hash is None:
-            self._transaction_hash = format_hash(self.hex[:32])
+            self._transaction_hash = format_hash(self.transaction_hash_bytes)
         return self._transaction_hash
 
+    @property
+    def transaction_hash_bytes(self):
+        """Returns the hash of the transaction containing the output
+        redeemed by this input, in internal byte order"""
+        return bytes(self.hex[:32])
+
     @property
     def transaction_index(self):
         """Returns the index of the output inside the transaction that is
@@ -75,4 +92,33 @@ class Input(object):
     @property
     def witnesses(self):
         """Return a list of witness data attached to this input, empty if non segwit"""
+        if self._witnesses is None:
+            self._witnesses = []
+            if self._witness_data is not None:
+                data = self._witness_data
+                n_items, offset = decode_compactsize_from(data, 0)
+                for i in range(n_items):
+                    length, varint_size = decode_compactsize_from(data,
+                                                                  offset)
+                    offset += varint_size
+                    self._witnesses.append(bytes(data[offset:offset + length]))
+                    offset += length
         return self._witnesses
+
+    @property
+    def witness_count(self):
+        """Returns the number of items of the witness stack, without
+        splitting it"""
+        if self._witnesses is not None:
+            return len(self._witnesses)
+        if self._witness_data is None:
+            return 0
+        return decode_compactsize_from(self._witness_data, 0)[0]
+
+    @property
+    def witness_size(self):
+        """Returns the size of the serialized witness stack of this input,
+        including the item count and lengths, 0 if it has none"""
+        if self._witness_data is None:
+            return 0
+        return len(self._witness_data)
@@ -0,0 +1,386 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from .utils import script_hash
+
+# Maximum fraction of the slots of the hash table in use before it is grown
+MAX_LOAD = 0.75
+
+# Multiplier mixing the bytes following a 32 bytes hash (such as the output
+# index of an outpoint) into the slot of a key
+_MIX = np.uint64(0x9e3779b97f4a7c15)
+
+# Number of keys rehashed at once when the hash table is grown
+_REHASH_CHUNK = 1 << 20
+
+
+def outpoint_key(txid, vout):
+    """Returns the key of an outpoint, its txid in internal byte order
+    followed by its output index as serialized in a transaction input"""
+    return txid + struct.pack("<I", vout)
+
+
+class HashInterner(object):
+    """Maps fixed-size binary keys, such as txids in internal byte order, to
+    dense integer ids allocated in order of first appearance.
+
+    Keys are stored contiguously, the id of a key being its position, and
+    located through an open addressing hash table with linear probing whose
+    slots hold id + 1, 0 marking a free slot. Keys are expected to start with
+    8 uniformly distributed bytes, which is the case of hashes. When a path
+    is given, both arrays are memory mapped files in that directory and
+    flush or close makes them persistent. Files reopened after an unclean
+    exit are brought back to the state of their last flush.
+
+    If read_only is True, existing files are opened without being written
+    to, the recovery of files left by an unclean exit being made in memory,
+    and keys cannot be added.
+    """
+
+    def __init__(self, path=None, key_size=32, wide=False,
+                 capacity=1 << 16, read_only=False):
+        self.path = path
+        self.read_only = read_only and path is not None
+        self._dirty = False
+        if self.read_only and not os.path.exists(self._file("meta.json")):
+            raise Exception("No interned keys in %s" % path)
+        if path is not None and os.path.exists(self._file("meta.json")):
+            with open(self._file("meta.json")) as f:
+                meta = json.load(f)
+            self.key_size = meta["key_size"]
+            self.id_dtype = np.dtype(meta["id_dtype"])
+            self._count = meta["count"]
+            self._capacity = meta["capacity"]
+            self._slots = meta["slots"]
+            self._table_name = meta.get("table", "table.dat")
+            self._keys = self._open("keys.dat", np.uint8,
+                                    (self._capacity, self.key_size))
+            self._recover(meta.get("clean", False))
+            return
+
+        if path is not None and not os.path.exists(path):
+            os.makedirs(path)
+        self.key_size = key_size
+        self.id_dtype = np.dtype(np.uint64 if wide else np.uint32)
+        self._count = 0
+        self._capacity = capacity
+        self._slots = 1
+        while self._slots * MAX_LOAD < capacity:
+            self._slots *= 2
+        self._table_name = "table.dat"
+        self._keys = self._create("keys.dat", np.uint8,
+                                  (self._capacity, self.key_size))
+        self._table = self._create(self._table_name, self.id_dtype,
+                                   (self._slots,))
+        self.flush()
+
+    def __repr__(self):
+        return "HashInterner(keys=%d, key_size=%d)" % (self._count,
+                                                       self.key_size)
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getitem__(self, i):
+        """Returns the key with the given id"""
+        if not 0 <= i < self._count:
+            raise IndexError("No key with id %d" % i)
+        return self._keys[i].tobytes()
+
+    @property
+    def keys(self):
+        """Returns the (count, key_size) array of the interned keys, the
+        row of a key being its id"""
+        return self._keys[:self._count]
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _create(self, name, dtype, shape):
+        if self.path is None:
+            return np.zeros(shape, dtype)
+        return np.memmap(self._file(name), dtype, "w+", shape=shape)
+
+    def _open(self, name, dtype, shape):
+        return np.memmap(self._file(name), dtype,
+                         "r" if self.read_only else "r+", shape=shape)
+
+    def _write_meta(self, clean):
+        """Atomically records the state of the files: the number of keys
+        written by the last flush, the hash table file in use and its
+        size, and whether the files were changed since that flush"""
+        meta = {"key_size": self.key_size, "id_dtype": self.id_dtype.name,
+                "count": self._flushed_count, "capacity": self._capacity,
+                "slots": self._slots, "table": self._table_name,
+                "clean": clean}
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file("meta.json"))
+
+    def _mark_dirty(self):
+        """Records that the files are about to change, so that the ids
+        allocated after the last flush are dropped if they are reopened
+        without being flushed again"""
+        if self.read_only:
+            raise Exception("Keys interned in %s are read only" % self.path)
+        if self.path is not None and not self._dirty:
+            self._write_meta(False)
+            self._dirty = True
+
+    def _recover(self, clean):
+        """Opens the hash table recorded in meta.json. If the files were
+        not flushed after their last change, the table may hold ids
+        allocated since, which are removed: keys are only added to free
+        slots, so the table is then as it was at the last flush. A table
+        of the wrong size is rebuilt from the keys."""
+        self._flushed_count = self._count
+        name = self._file(self._table_name)
+        size = self._slots * self.id_dtype.itemsize
+        if self.read_only:
+            if not os.path.exists(name) or os.path.getsize(name) != size:
+                raise Exception("The hash table of %s must be rebuilt, it "
+                                "cannot be opened read only" % self.path)
+            # ids allocated since the last flush are removed from a copy on
+            # write mapping of the table
+            self._table = np.memmap(name, self.id_dtype,
+                                    "r" if clean else "c",
+                                    shape=(self._slots,))
+            if not clean:
+                self._table[self._table > self._count] = 0
+            return
+        if not os.path.exists(name) or os.path.getsize(name) != size:
+            self._table = None
+            self._rebuild_table(self._slots)
+        else:
+            self._table = self._open(self._table_name, self.id_dtype,
+                                     (self._slots,))
+            if not clean:
+                self._table[self._table > self._count] = 0
+        self.flush()
+
+        for name in os.listdir(self.path):
+            if name.startswith("table.") and name != self._table_name:
+                os.remove(self._file(name))
+
+    def flush(self):
+        """Writes the keys, the hash table and the number of keys to disk"""
+        if self.path is None or self.read_only:
+            return
+        self._keys.flush()
+        self._table.flush()
+        self._flushed_count = self._count
+        self._write_meta(True)
+        self._dirty = False
+
+    def close(self):
+        self.flush()
+
+    def _as_keys(self, keys):
+        """Returns keys given as a list of bytes, concatenated bytes or an
+        array as a (n, key_size) uint8 array"""
+        if isinstance(keys, np.ndarray):
+            keys = keys.astype(np.uint8, copy=False)
+        else:
+            if not isinstance(keys, (bytes, bytearray, memoryview)):
+                keys = b"".join(keys)
+            keys = np.frombuffer(keys, np.uint8)
+        if keys.size % self.key_size:
+            raise Exception("Keys must be %d bytes long" % self.key_size)
+        return keys.reshape(-1, self.key_size)
+
+    def _hash(self, keys):
+        h = np.ascontiguousarray(keys[:, :8]).view("<u8")[:, 0]
+        if self.key_size > 32:
+            tail = np.zeros((len(keys), 8), np.uint8)
+            tail[:, :min(self.key_size - 32, 8)] = keys[:, 32:40]
+            h = h ^ (tail.view("<u8")[:, 0] * _MIX)
+        return h
+
+    def _find(self, keys):
+        """Returns the ids of keys, -1 for those not interned"""
+        ids = np.full(len(keys), -1, np.int64)
+        mask = np.uint64(self._slots - 1)
+        slots = self._hash(keys) & mask
+        pending = np.arange(len(keys))
+        while len(pending):
+            entries = self._table[slots]
+            occupied = entries != 0
+            candidates = entries[occupied].astype(np.int64) - 1
+            found = pending[occupied]
+            match = np.all(self._keys[candidates] == keys[found], axis=1)
+            ids[found[match]] = candidates[match]
+
+            # keep probing for the keys whose slot is used by another key
+            probing = occupied
+            probing[occupied] = ~match
+            pending = pending[probing]
+            slots = (slots[probing] + np.uint64(1)) & mask
+        return ids
+
+    def _insert(self, table, keys, ids):
+        """Stores the ids of keys known not to be in the table yet"""
+        mask = np.uint64(len(table) - 1)
+        slots = self._hash(keys) & mask
+        pending = np.arange(len(keys))
+        while len(pending):
+            free = np.flatnonzero(table[slots] == 0)
+            # several keys can probe the same free slot, the first one wins
+            _, first = np.unique(slots[free], return_index=True)
+            winners = free[first]
+            table[slots[winners]] = ids[pending[winners]] + 1
+
+            probing = np.ones(len(pending), bool)
+            probing[winners] = False
+            pending = pending[probing]
+            slots = (slots[probing] + np.uint64(1)) & mask
+
+    def _grow_keys(self, count):
+        capacity = self._capacity
+        while capacity < count:
+            capacity *= 2
+        if self.path is None:
+            keys = np.zeros((capacity, self.key_size), np.uint8)
+            keys[:self._count] = self._keys[:self._count]
+        else:
+            self._keys.flush()
+            del self._keys
+            with open(self._file("keys.dat"), "r+b") as f:
+                f.truncate(capacity * self.key_size)
+            keys = self._open("keys.dat", np.uint8, (capacity, self.key_size))
+        self._keys = keys
+        self._capacity = capacity
+
+    def _grow_table(self, count):
+        slots = self._slots
+        while slots * MAX_LOAD < count:
+            slots *= 2
+        self._rebuild_table(slots)
+
+    def _rebuild_table(self, slots):
+        """Replaces the hash table with one of the given number of slots
+        holding the keys interned so far. On disk, the new table is written
+        to a new file, which meta.json names once it is complete."""
+        if self.path is None:
+            table = np.zeros(slots, self.id_dtype)
+        else:
+            self._mark_dirty()
+            self._keys.flush()
+            old_name = self._table_name
+            generation = 0
+            if old_name != "table.dat":
+                generation = int(old_name.split(".")[1]) + 1
+            name = "table.%d.dat" % generation
+            table = np.memmap(self._file(name), self.id_dtype, "w+",
+                              shape=(slots,))
+        for start in range(0, self._count, _REHASH_CHUNK):
+            end = min(start + _REHASH_CHUNK, self._count)
+            self._insert(table, self._keys[start:end],
+                         np.arange(start, end, dtype=np.int64))
+        if self.path is not None:
+            table.flush()
+            self._table = None
+            self._table_name = name
+            self._slots = slots
+            # the new table holds the keys interned since the last flush,
+            # the files stay marked as changed
+            self._write_meta(False)
+            if os.path.exists(self._file(old_name)):
+                os.remove(self._file(old_name))
+        self._table = table
+        self._slots = slots
+
+    def truncate(self, count):
+        """Forgets the keys interned after the first count ones, used to
+        go back to the state of a previous flush"""
+        if count > self._count:
+            raise Exception("Cannot truncate %d keys to %d"
+                            % (self._count, count))
+        self._mark_dirty()
+        self._count = count
+        if self.path is not None:
+            self._flushed_count = min(self._flushed_count, count)
+        self._rebuild_table(self._slots)
+
+    def lookup_many(self, keys):
+        """Returns the ids of keys as an int64 array, -1 for the keys not
+        interned"""
+        keys = self._as_keys(keys)
+        if not self._count:
+            return np.full(len(keys), -1, np.int64)
+        return self._find(keys)
+
+    def intern_many(self, keys):
+        """Returns the ids of keys, allocating new ids to the keys not
+        interned yet in the order they appear"""
+        keys = self._as_keys(keys)
+        if not len(keys):
+            return np.empty(0, self.id_dtype)
+
+        rows = np.ascontiguousarray(keys).view(
+            np.dtype((np.void, self.key_size))).ravel()
+        _, first, inverse = np.unique(rows, return_index=True,
+                                      return_inverse=True)
+        unique = keys[first]
+        ids = self.lookup_many(unique)
+
+        new = np.flatnonzero(ids == -1)
+        new = new[np.argsort(first[new])]
+        if len(new):
+            self._mark_dirty()
+            count = self._count + len(new)
+            if count > np.iinfo(self.id_dtype).max:
+                raise Exception("Too many keys for %s ids" % self.id_dtype)
+            if count > self._capacity:
+                self._grow_keys(count)
+            if count > self._slots * MAX_LOAD:
+                self._grow_table(count)
+            ids[new] = np.arange(self._count, count)
+            self._keys[self._count:count] = unique[new]
+            self._insert(self._table, unique[new], ids[new])
+            self._count = count
+
+        return ids[inverse.ravel()].astype(self.id_dtype)
+
+    def lookup(self, key):
+        """Returns the id of a key, None if it is not interned"""
+        i = int(self.lookup_many([key])[0])
+        return None if i == -1 else i
+
+    def intern(self, key):
+        """Returns the id of a key, allocating it if needed"""
+        return int(self.intern_many([key])[0])
+
+
+class ScriptInterner(HashInterner):
+    """Interns scriptPubKeys, keyed by their sha256 as in the address index.
+    The keys of the interner are these hashes, not the scripts."""
+
+    def __init__(self, path=None, wide=False, capacity=1 << 16):
+        super(ScriptInterner, self).__init__(path, 32, wide, capacity)
+
+    def _as_keys(self, scripts):
+        keys = b"".join(script_hash(script) for script in scripts)
+        return super(ScriptInterner, self)._as_keys(keys)
@@ -0,0 +1,383 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import bisect
+import mmap
+import os
+import struct
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+# Size of the footer of a table and its magic number
+_FOOTER_SIZE = 48
+_TABLE_MAGIC = 0xdb4775248b80fb57
+
+# Compression types of the blocks of a table
+_NO_COMPRESSION = 0
+_SNAPPY_COMPRESSION = 1
+
+# Log files are made of blocks of 32KiB holding records of these types
+_LOG_BLOCK_SIZE = 32768
+_LOG_HEADER_SIZE = 7
+_FULL, _FIRST, _MIDDLE, _LAST = 1, 2, 3, 4
+
+# Types of the entries of tables and write batches
+_DELETION = 0
+_VALUE = 1
+
+# Tags of the fields of the version edits stored in the MANIFEST
+_LOG_NUMBER = 2
+_COMPARATOR = 1
+_NEXT_FILE_NUMBER = 3
+_LAST_SEQUENCE = 4
+_COMPACT_POINTER = 5
+_DELETED_FILE = 6
+_NEW_FILE = 7
+_PREV_LOG_NUMBER = 9
+
+
+def _read_varint(data, offset):
+    """Decodes the LevelDB varint (LEB128) at offset, returns its value and
+    the offset following it"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _read_slice(data, offset):
+    """Decodes a length prefixed byte string, returns it and the offset
+    following it"""
+    length, offset = _read_varint(data, offset)
+    return bytes(data[offset:offset + length]), offset + length
+
+
+def snappy_decompress(data):
+    """Decompresses raw snappy data, with python-snappy if it is installed
+    or in pure Python otherwise"""
+    if snappy is not None:
+        return snappy.uncompress(bytes(data))
+
+    length, pos = _read_varint(data, 0)
+    out = bytearray()
+    end = len(data)
+    while pos < end:
+        tag = data[pos]
+        pos += 1
+        kind = tag & 3
+        if kind == 0:
+            size = tag >> 2
+            if size >= 60:
+                extra = size - 59
+                size = int.from_bytes(data[pos:pos + extra], "little")
+                pos += extra
+            size += 1
+            out += data[pos:pos + size]
+            pos += size
+            continue
+
+        if kind == 1:
+            size = ((tag >> 2) & 7) + 4
+            offset = (tag >> 5) << 8 | data[pos]
+            pos += 1
+        elif kind == 2:
+            size = (tag >> 2) + 1
+            offset = data[pos] | data[pos + 1] << 8
+            pos += 2
+        else:
+            size = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + 4], "little")
+            pos += 4
+        if offset == 0 or offset > len(out):
+            raise Exception("Invalid snappy data")
+        start = len(out) - offset
+        if offset >= size:
+            out += out[start:start + size]
+        else:
+            # overlapping copy, repeating the last offset bytes
+            pattern = out[start:]
+            out += (pattern * (size // offset + 1))[:size]
+
+    if len(out) != length:
+        raise Exception("Invalid snappy data")
+    return bytes(out)
+
+
+def _read_log_records(data):
+    """Yields the records of a LevelDB log file (.log or MANIFEST), stopping
+    at the first incomplete one, as the file can be written to"""
+    pos = 0
+    end = len(data)
+    fragments = []
+    while pos + _LOG_HEADER_SIZE <= end:
+        block_left = _LOG_BLOCK_SIZE - pos % _LOG_BLOCK_SIZE
+        if block_left < _LOG_HEADER_SIZE:
+            # block trailer
+            pos += block_left
+            continue
+        length, record_type = struct.unpack_from("<HB", data, pos + 4)
+        pos += _LOG_HEADER_SIZE
+        if record_type == 0 or pos + length > end:
+            # preallocated space or record being written
+            if record_type == 0 and length == 0:
+                pos += block_left - _LOG_HEADER_SIZE
+                continue
+            return
+        fragment = data[pos:pos + length]
+        pos += length
+        if record_type == _FULL:
+            fragments = []
+            yield bytes(fragment)
+        elif record_type == _FIRST:
+            fragments = [fragment]
+        elif record_type == _MIDDLE:
+            fragments.append(fragment)
+        elif record_type == _LAST:
+            fragments.append(fragment)
+            yield b"".join(fragments)
+            fragments = []
+
+
+def _parse_block(block):
+    """Returns the (key, value) entries of a table block"""
+    n_restarts = struct.unpack_from("<I", block, len(block) - 4)[0]
+    end = len(block) - 4 - 4 * n_restarts
+    entries = []
+    key = b""
+    pos = 0
+    while pos < end:
+        shared, pos = _read_varint(block, pos)
+        non_shared, pos = _read_varint(block, pos)
+        value_length, pos = _read_varint(block, pos)
+        key = key[:shared] + bytes(block[pos:pos + non_shared])
+        pos += non_shared
+        entries.append((key, block[pos:pos + value_length]))
+        pos += value_length
+    return entries
+
+
+def _parse_internal_key(key):
+    """Splits an internal key into its user key, sequence number and
+    type"""
+    tag = int.from_bytes(key[-8:], "little")
+    return key[:-8], tag >> 8, tag & 0xff
+
+
+class _Table(object):
+    """A sorted table (.ldb file), memory mapped, whose data blocks are
+    only read when they are needed"""
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._data)
+        footer = self._data[size - _FOOTER_SIZE:]
+        if int.from_bytes(footer[-8:], "little") != _TABLE_MAGIC:
+            raise Exception("%s is not a LevelDB table" % filename)
+        _, pos = _read_varint(footer, 0)
+        _, pos = _read_varint(footer, pos)
+        index_offset, pos = _read_varint(footer, pos)
+        index_size, pos = _read_varint(footer, pos)
+
+        self._index_keys = []
+        self._handles = []
+        for key, value in _parse_block(self._read_block(index_offset,
+                                                        index_size)):
+            offset, pos = _read_varint(value, 0)
+            block_size, _ = _read_varint(value, pos)
+            self._index_keys.append(key[:-8])
+            self._handles.append((offset, block_size))
+
+    def close(self):
+        self._data.close()
+
+    def _read_block(self, offset, size):
+        block = memoryview(self._data)[offset:offset + size]
+        compression = self._data[offset + size]
+        if compression == _SNAPPY_COMPRESSION:
+            return snappy_decompress(block)
+        if compression != _NO_COMPRESSION:
+            raise Exception("Unknown LevelDB block compression %d"
+                            % compression)
+        return block
+
+    def seek(self, user_key):
+        """Yields the (user key, sequence, type, value) entries of the table
+        from the first one whose user key is at least user_key"""
+        first = bisect.bisect_left(self._index_keys, user_key)
+        for offset, size in self._handles[first:]:
+            for key, value in _parse_block(self._read_block(offset, size)):
+                entry_key, sequence, kind = _parse_internal_key(key)
+                if entry_key >= user_key:
+                    yield entry_key, sequence, kind, value
+
+    def get(self, user_key):
+        """Returns the most recent (sequence, type, value) of user_key in
+        the table, None if it is absent"""
+        for entry_key, sequence, kind, value in self.seek(user_key):
+            if entry_key != user_key:
+                return None
+            return sequence, kind, value
+        return None
+
+
+class LevelDB(object):
+    """Read-only view of a LevelDB database directory, such as bitcoind's
+    blocks/index or indexes/txindex, which does not need the lock of the
+    database and can be used while bitcoind is running.
+
+    The tables listed by the MANIFEST are memory mapped when the database
+    is opened and only the blocks needed by get and iterator are read,
+    while the .log files are read into memory. Changes made after the
+    database is opened are not seen.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tables = []
+        self._memtable = {}
+        for attempt in range(3):
+            try:
+                self._open()
+                return
+            except FileNotFoundError:
+                # a compaction replaced files while they were opened
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def __repr__(self):
+        return "LevelDB(%s, tables=%d)" % (self.path, len(self._tables))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for _, _, table in self._tables:
+            table.close()
+        self._tables = []
+        self._memtable = {}
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        # the logs are read before the MANIFEST, as a log is only deleted
+        # once the MANIFEST lists the table its content was written to
+        logs = []
+        for name in os.listdir(self.path):
+            if name.endswith(".log") and name[:-4].isdigit():
+                with open(self._file(name), "rb") as f:
+                    logs.append((int(name[:-4]), f.read()))
+
+        with open(self._file("CURRENT")) as f:
+            manifest = f.read().strip()
+        with open(self._file(manifest), "rb") as f:
+            data = f.read()
+
+        files = {}
+        log_number = 0
+        prev_log_number = 0
+        for edit in _read_log_records(data):
+            pos = 0
+            while pos < len(edit):
+                tag, pos = _read_varint(edit, pos)
+                if tag == _COMPARATOR:
+                    _, pos = _read_slice(edit, pos)
+                elif tag == _LOG_NUMBER:
+                    log_number, pos = _read_varint(edit, pos)
+                elif tag == _PREV_LOG_NUMBER:
+                    prev_log_number, pos = _read_varint(edit, pos)
+                elif tag in (_NEXT_FILE_NUMBER, _LAST_SEQUENCE):
+                    _, pos = _read_varint(edit, pos)
+                elif tag == _COMPACT_POINTER:
+                    _, pos = _read_varint(edit, pos)
+                    _, pos = _read_slice(edit, pos)
+                elif tag == _DELETED_FILE:
+                    level, pos = _read_varint(edit, pos)
+                    number, pos = _read_varint(edit, pos)
+                    files.pop((level, number), None)
+                elif tag == _NEW_FILE:
+                    level, pos = _read_varint(edit, pos)
+                    number, pos = _read_varint(edit, pos)
+                    _, pos = _read_varint(edit, pos)
+                    smallest, pos = _read_slice(edit, pos)
+                    largest, pos = _read_slice(edit, pos)
+                    files[(level, number)] = (smallest[:-8], largest[:-8])
+                else:
+                    raise Exception("Unknown MANIFEST field %d" % tag)
+
+        for (level, number), (smallest, largest) in sorted(files.items()):
+            filename = self._file("%06d.ldb" % number)
+            if not os.path.exists(filename):
+                filename = self._file("%06d.sst" % number)
+            self._tables.append((smallest, largest, _Table(filename)))
+
+        for number, data in sorted(logs):
+            if number >= log_number or number == prev_log_number:
+                self._replay_log(data)
+
+    def _replay_log(self, data):
+        """Applies the write batches of a .log file to the memtable"""
+        for batch in _read_log_records(data):
+            sequence, count = struct.unpack_from("<QI", batch, 0)
+            pos = 12
+            for _ in range(count):
+                kind = batch[pos]
+                key, pos = _read_slice(batch, pos + 1)
+                value = None
+                if kind == _VALUE:
+                    value, pos = _read_slice(batch, pos)
+                current = self._memtable.get(key)
+                if current is None or current[0] < sequence:
+                    self._memtable[key] = (sequence, kind, value)
+                sequence += 1
+
+    def get(self, key, default=None):
+        """Returns the value of key, or default if it is absent"""
+        best = self._memtable.get(key)
+        for smallest, largest, table in self._tables:
+            if smallest <= key <= largest:
+                entry = table.get(key)
+                if entry is not None and (best is None or
+                                          entry[0] > best[0]):
+                    best = entry
+        if best is None or best[1] != _VALUE:
+            return default
+        return bytes(best[2])
+
+    def iterator(self, prefix=b""):
+        """Returns the list of the (key, value) pairs whose keys start with
+        prefix, sorted by key"""
+        entries = dict((key, entry) for key, entry in self._memtable.items()
+                       if key.startswith(prefix))
+        for smallest, largest, table in self._tables:
+            if largest < prefix or not smallest[:len(prefix)] <= prefix:
+                continue
+            for key, sequence, kind, value in table.seek(prefix):
+                if not key.startswith(prefix):
+                    break
+                current = entries.get(key)
+                if current is None or current[0] < sequence:
+                    entries[key] = (sequence, kind, value)
+        return [(key, bytes(entries[key][2])) for key in sorted(entries)
+                if entries[key][1] == _VALUE]
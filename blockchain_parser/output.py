@@ -113,7 +113,7 @@ class Output(object):
     def type(self):
         """Returns the output's script type as a string"""
         # Fix for issue 11
-        if not self.script.script.is_valid():
+        if not self.script.is_valid():
             return "invalid"
 
         if self.is_pubkeyhash():
@@ -0,0 +1,210 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import struct
+import time
+
+# Largest serialized size of a block, bounding the reads of blocks whose
+# end is not known
+MAX_BLOCK_SIZE = 4000000
+
+# Size of the magic number and size preceding the data of a block
+FRAME_SIZE = 8
+
+
+class ReadStats(object):
+    """Counts the reads made by a ReadPlanner, the bytes they returned and
+    the time spent in them"""
+
+    def __init__(self):
+        self.reads = 0
+        self.bytes = 0
+        self.blocks = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return "ReadStats(reads=%d, blocks=%d, bytes_per_read=%.0f, " \
+               "reads_per_second=%.0f)" % (self.reads, self.blocks,
+                                           self.bytes_per_read,
+                                           self.reads_per_second)
+
+    @property
+    def bytes_per_read(self):
+        return self.bytes / self.reads if self.reads else 0.0
+
+    @property
+    def reads_per_second(self):
+        return self.reads / self.seconds if self.seconds else 0.0
+
+
+def _pread(f, size, offset):
+    if hasattr(os, "pread"):
+        return os.pread(f.fileno(), size, offset)
+    f.seek(offset)
+    return f.read(size)
+
+
+class ReadPlanner(object):
+    """Reads the blocks of a sequence of DBBlockIndex by windows of at most
+    window blocks and max_bytes bytes: the blocks of a window are sorted by
+    (file, data position) and those less than max_gap bytes apart are read
+    together, in reads of up to max_read bytes, before being given back in
+    the order of the sequence. If advise is True and the platform supports
+    it, the kernel is told to read ahead the data of the next window while
+    the current one is consumed. stats holds the ReadStats of the reads
+    made.
+
+    The raw blocks of a window are held in memory until it is consumed, so
+    about max_bytes plus max_read bytes. The size of a block is taken as
+    the distance to the next block of the sequence in its file, or
+    MAX_BLOCK_SIZE for the last one, which overestimates it.
+    """
+
+    def __init__(self, path, window=1024, max_bytes=1 << 27,
+                 max_gap=1 << 20, max_read=1 << 24, advise=True):
+        self.path = path
+        self.window = window
+        self.max_bytes = max_bytes
+        self.max_gap = max_gap
+        self.max_read = max_read
+        self.advise = advise and hasattr(os, "posix_fadvise")
+        self.stats = ReadStats()
+        self._files = {}
+
+    def __repr__(self):
+        return "ReadPlanner(%s, window=%d, max_bytes=%d)" \
+               % (self.path, self.window, self.max_bytes)
+
+    def _file(self, file_no):
+        if file_no not in self._files:
+            self._files[file_no] = open(
+                os.path.join(self.path, "blk%05d.dat" % file_no), "rb")
+        return self._files[file_no]
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    @staticmethod
+    def get_bounds(blockIndexes):
+        """Returns, for the (file, data position) of each block, the
+        position of the frame of the next block of the sequence in the same
+        file, which bounds its end"""
+        positions = sorted((blkIdx.file, blkIdx.data_pos)
+                           for blkIdx in blockIndexes)
+        bounds = {}
+        for current, following in zip(positions, positions[1:]):
+            if current[0] == following[0]:
+                bounds[current] = following[1] - FRAME_SIZE
+        return bounds
+
+    def get_windows(self, blockIndexes, bounds):
+        """Splits a sequence of block indexes into windows of at most window
+        blocks, whose sizes bounded by bounds add up to at most max_bytes,
+        a window holding at least one block"""
+        windows = []
+        window = []
+        size = 0
+        for blkIdx in blockIndexes:
+            position = (blkIdx.file, blkIdx.data_pos)
+            end = bounds.get(position)
+            block_size = MAX_BLOCK_SIZE if end is None else \
+                min(end - blkIdx.data_pos, MAX_BLOCK_SIZE)
+            if window and (len(window) == self.window or
+                           size + block_size > self.max_bytes):
+                windows.append(window)
+                window = []
+                size = 0
+            window.append(blkIdx)
+            size += block_size
+        if window:
+            windows.append(window)
+        return windows
+
+    def plan(self, blockIndexes, bounds):
+        """Returns the reads of the blocks of a window as [file, start, end,
+        positions] lists, end being None if the end of the last block is not
+        bounded"""
+        reads = []
+        for position in sorted(set((blkIdx.file, blkIdx.data_pos)
+                                   for blkIdx in blockIndexes)):
+            file_no, data_pos = position
+            start = data_pos - FRAME_SIZE
+            end = bounds.get(position)
+            if end is not None:
+                end = min(end, data_pos + MAX_BLOCK_SIZE)
+            if reads:
+                last = reads[-1]
+                last_end = last[2] if last[2] is not None else \
+                    last[3][-1][1]
+                if last[0] == file_no and start - last_end <= self.max_gap \
+                        and (end or data_pos) - last[1] <= self.max_read:
+                    last[2] = end
+                    last[3].append(position)
+                    continue
+            reads.append([file_no, start, end, [position]])
+        return reads
+
+    def _advise(self, reads):
+        for file_no, start, end, positions in reads:
+            if end is None:
+                end = positions[-1][1] + MAX_BLOCK_SIZE
+            os.posix_fadvise(self._file(file_no).fileno(), start, end - start,
+                             os.POSIX_FADV_WILLNEED)
+
+    def _read(self, f, size, offset):
+        started = time.perf_counter()
+        data = _pread(f, size, offset)
+        self.stats.seconds += time.perf_counter() - started
+        self.stats.reads += 1
+        self.stats.bytes += len(data)
+        return data
+
+    def read(self, reads):
+        """Makes the planned reads, returns the raw blocks by (file, data
+        position)"""
+        raw_blocks = {}
+        for file_no, start, end, positions in reads:
+            f = self._file(file_no)
+            last_pos = positions[-1][1]
+            data = self._read(f, (end or last_pos) - start, start)
+            for position in positions:
+                offset = position[1] - start
+                size = struct.unpack_from("<I", data, offset - 4)[0]
+                if offset + size > len(data):
+                    # the end of the last block was not read
+                    data += self._read(f, offset + size - len(data),
+                                       start + len(data))
+                raw_blocks[position] = data[offset:offset + size]
+            self.stats.blocks += len(positions)
+        return raw_blocks
+
+    def iter_blocks(self, blockIndexes):
+        """Yields the (DBBlockIndex, raw block) of a sequence of block
+        indexes in the same order, reading them window by window"""
+        bounds = self.get_bounds(blockIndexes)
+        windows = self.get_windows(blockIndexes, bounds)
+        try:
+            reads = self.plan(windows[0], bounds) if windows else []
+            for i, window in enumerate(windows):
+                next_reads = None
+                if i + 1 < len(windows):
+                    next_reads = self.plan(windows[i + 1], bounds)
+                    if self.advise:
+                        self._advise(next_reads)
+                raw_blocks = self.read(reads)
+                for blkIdx in window:
+                    yield blkIdx, raw_blocks[(blkIdx.file, blkIdx.data_pos)]
+                reads = next_reads
+        finally:
+            self.close()
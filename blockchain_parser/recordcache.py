@@ -0,0 +1,343 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from .block import Block
+from .blockchain import get_block
+from .utils import format_hash
+
+MAGIC = b"BPRECORD"
+VERSION = 1
+
+# Types of outputs as given by Output.type, stored as their position
+OUTPUT_TYPES = ["invalid", "pubkeyhash", "pubkey", "p2sh", "multisig",
+                "OP_RETURN", "p2wpkh", "p2wsh", "p2tr", "unknown"]
+_TYPE_CODES = dict((type_, i) for i, type_ in enumerate(OUTPUT_TYPES))
+
+# Fraction of max_size the cache is brought down to when it is evicted
+LOW_WATERMARK = 0.9
+
+# magic, version, block hash (internal byte order), number of transactions,
+# inputs and outputs, size of the addresses
+_HEADER = struct.Struct("<8sI32sIIII")
+
+
+def _array(typecode, data):
+    """Returns an array of little-endian values read from data"""
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _array_bytes(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class BlockRecord(object):
+    """The fields of a block derived by decoding its transactions, kept by
+    column: txids, the number of inputs and outputs of each transaction,
+    the (txid, output index) each input spends, and the value, type and
+    addresses of each output. Inputs and outputs are numbered across the
+    block, output_range(i) gives those of the i-th transaction.
+    """
+
+    def __init__(self, hash_bytes, txid_bytes, input_counts, output_counts,
+                 prevout_bytes, values, type_codes, address_counts,
+                 address_data, height=None):
+        self.hash_bytes = hash_bytes
+        self.txid_bytes = txid_bytes
+        self.input_counts = input_counts
+        self.output_counts = output_counts
+        self.prevout_bytes = prevout_bytes
+        self.values = values
+        self.type_codes = type_codes
+        self.address_counts = address_counts
+        self.address_data = address_data
+        self.height = height
+        self._input_offsets = None
+        self._output_offsets = None
+        self._addresses = None
+
+    def __repr__(self):
+        return "BlockRecord(%s)" % self.hash
+
+    @classmethod
+    def from_block(cls, block):
+        """Decodes the transactions of a Block into a BlockRecord"""
+        txids = []
+        input_counts = array("I")
+        output_counts = array("I")
+        prevouts = []
+        values = array("q")
+        type_codes = bytearray()
+        address_counts = bytearray()
+        addresses = []
+        for tx in block.transactions:
+            txids.append(tx.txid_bytes)
+            input_counts.append(len(tx.inputs))
+            output_counts.append(len(tx.outputs))
+            for input_ in tx.inputs:
+                prevouts.append(input_.transaction_hash_bytes +
+                                struct.pack("<I", input_.transaction_index))
+            for output in tx.outputs:
+                values.append(output.value)
+                type_codes.append(_TYPE_CODES[output.type])
+                address_counts.append(len(output.addresses))
+                addresses += [address.address for address in output.addresses]
+        return cls(block.hash_bytes, b"".join(txids), input_counts,
+                   output_counts, b"".join(prevouts), values,
+                   bytes(type_codes), bytes(address_counts),
+                   "\n".join(addresses).encode("ascii"), block.height)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Reads a BlockRecord serialized by to_bytes, returns None if data
+        is not a complete record of this version"""
+        if len(data) < _HEADER.size:
+            return None
+        magic, version, hash_bytes, n_transactions, n_inputs, n_outputs, \
+            address_size = _HEADER.unpack_from(data, 0)
+        sizes = [32 * n_transactions, 4 * n_transactions, 4 * n_transactions,
+                 36 * n_inputs, 8 * n_outputs, n_outputs, n_outputs,
+                 address_size]
+        if magic != MAGIC or version != VERSION or \
+                len(data) != _HEADER.size + sum(sizes):
+            return None
+        columns = []
+        offset = _HEADER.size
+        for size in sizes:
+            columns.append(data[offset:offset + size])
+            offset += size
+        return cls(hash_bytes, columns[0], _array("I", columns[1]),
+                   _array("I", columns[2]), columns[3],
+                   _array("q", columns[4]), *columns[5:])
+
+    def to_bytes(self):
+        return b"".join([
+            _HEADER.pack(MAGIC, VERSION, self.hash_bytes, self.n_transactions,
+                         len(self.prevout_bytes) // 36, len(self.values),
+                         len(self.address_data)),
+            self.txid_bytes, _array_bytes(self.input_counts),
+            _array_bytes(self.output_counts), self.prevout_bytes,
+            _array_bytes(self.values), self.type_codes, self.address_counts,
+            self.address_data])
+
+    @property
+    def hash(self):
+        return format_hash(self.hash_bytes)
+
+    @property
+    def n_transactions(self):
+        return len(self.input_counts)
+
+    @property
+    def txids(self):
+        """Returns the txids of the transactions of the block"""
+        return [format_hash(self.txid_bytes[i:i + 32])
+                for i in range(0, len(self.txid_bytes), 32)]
+
+    @property
+    def input_offsets(self):
+        """Returns the number of the first input of every transaction,
+        followed by the number of inputs of the block"""
+        if self._input_offsets is None:
+            self._input_offsets = list(accumulate(self.input_counts,
+                                                  initial=0))
+        return self._input_offsets
+
+    @property
+    def output_offsets(self):
+        """Returns the number of the first output of every transaction,
+        followed by the number of outputs of the block"""
+        if self._output_offsets is None:
+            self._output_offsets = list(accumulate(self.output_counts,
+                                                   initial=0))
+        return self._output_offsets
+
+    def input_range(self, i):
+        """Returns the numbers of the inputs of the i-th transaction"""
+        return range(self.input_offsets[i], self.input_offsets[i + 1])
+
+    def output_range(self, i):
+        """Returns the numbers of the outputs of the i-th transaction"""
+        return range(self.output_offsets[i], self.output_offsets[i + 1])
+
+    @property
+    def prevouts(self):
+        """Returns the (txid, output index) spent by every input, the
+        inputs of coinbase transactions spending a null txid"""
+        data = self.prevout_bytes
+        return [(format_hash(data[i:i + 32]),
+                 struct.unpack_from("<I", data, i + 32)[0])
+                for i in range(0, len(data), 36)]
+
+    @property
+    def output_types(self):
+        """Returns the type of every output, as Output.type"""
+        return [OUTPUT_TYPES[code] for code in self.type_codes]
+
+    @property
+    def addresses(self):
+        """Returns the list of the addresses of every output, as the
+        address of the Address objects of Output.addresses"""
+        if self._addresses is None:
+            data = self.address_data.decode("ascii")
+            flat = data.split("\n") if data else []
+            self._addresses = []
+            i = 0
+            for count in self.address_counts:
+                self._addresses.append(flat[i:i + count])
+                i += count
+        return self._addresses
+
+
+class RecordCache(object):
+    """A directory of BlockRecord files named after the hash of their
+    block, shared by scans of the same blocks, and processes. A hit reads
+    one file instead of decoding the block.
+
+    The total size of the records is bounded by max_size: when it is
+    exceeded, the least recently used records are removed until it is
+    below LOW_WATERMARK * max_size. A hit updates the modification time of
+    its file, which tells how recently it was used.
+    """
+
+    def __init__(self, path, max_size=1 << 30):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.size = sum(size for _, size, _ in self._list())
+
+    def __repr__(self):
+        return "RecordCache(%s, size=%d)" % (self.path, self.size)
+
+    def __len__(self):
+        return len(self._list())
+
+    def _file(self, block_hash):
+        # the last digits of block hashes are random, unlike the first
+        return os.path.join(self.path, block_hash[-2:], block_hash + ".rec")
+
+    def _list(self):
+        """Returns the (modification time, size, path) of the records"""
+        records = []
+        for directory in os.scandir(self.path):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if not entry.name.endswith(".rec"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                records.append((st.st_mtime_ns, st.st_size, entry.path))
+        return records
+
+    def get(self, block_hash):
+        """Returns the BlockRecord of the block with the given hash, or None
+        if it is not in the cache"""
+        path = self._file(block_hash)
+        try:
+            with open(path, "rb") as f:
+                record = BlockRecord.from_bytes(f.read())
+            os.utime(path)
+        except FileNotFoundError:
+            record = None
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+
+    def put(self, record):
+        """Adds a BlockRecord to the cache, evicting the least recently used
+        records if it grows over max_size"""
+        path = self._file(record.hash)
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        data = record.to_bytes()
+        # a torn record is detected when it is read, and decoded again,
+        # so records are not synced
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "wb") as f:
+            f.write(data)
+        try:
+            # a record written again replaces the one counted in size,
+            # evict recounts the records other processes wrote
+            self.size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+        self.size += len(data)
+        if self.size > self.max_size:
+            self.evict()
+        return record
+
+    def evict(self, max_size=None):
+        """Removes the least recently used records until the cache is below
+        LOW_WATERMARK * max_size, by default the max_size of the cache"""
+        if max_size is None:
+            max_size = self.max_size
+        records = sorted(self._list())
+        self.size = sum(size for _, size, _ in records)
+        for _, size, path in records:
+            if self.size <= max_size * LOW_WATERMARK:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    def get_record(self, block):
+        """Returns the BlockRecord of a Block, decoding it on a miss"""
+        record = self.get(block.hash)
+        if record is None:
+            record = self.put(BlockRecord.from_block(block))
+        record.height = block.height
+        return record
+
+    def iter_records(self, blocks):
+        """Yields the BlockRecord of every block of an iterable of Block,
+        such as those returned by the methods of Blockchain"""
+        for block in blocks:
+            yield self.get_record(block)
+
+    def ordered_records(self, blockchain, index, start=0, end=None,
+                        cache=None, block_filter=None):
+        """Yields the BlockRecord of the blocks get_ordered_blocks would
+        yield, with their height. Blocks whose record is cached are not
+        read from the .blk files."""
+        for blkIdx in blockchain._select_block_indexes(index, start, end,
+                                                       cache, block_filter):
+            record = self.get(blkIdx.hash)
+            if record is None:
+                raw_block = get_block(os.path.join(
+                    blockchain.path, "blk%05d.dat" % blkIdx.file),
+                    blkIdx.data_pos)
+                record = self.put(BlockRecord.from_block(Block(raw_block)))
+            record.height = blkIdx.height
+            yield record
@@ -0,0 +1,135 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+# Previous block hash of the genesis block
+GENESIS_PREV_HASH = b"\x00" * 32
+
+# Height from which coinbases start with the height of their block (BIP34)
+BIP34_HEIGHT = 227931
+
+
+def get_coinbase_height(block):
+    """Returns the height pushed first by the coinbase of a Block, as
+    required by BIP34, or None if its coinbase does not start with a
+    number"""
+    operations = block.transaction_at(0).inputs[0].script.operations
+    if not operations:
+        return None
+    height = operations[0]
+    if isinstance(height, bytes):
+        if not 0 < len(height) <= 8:
+            return None
+        return int.from_bytes(height, "little", signed=True)
+    # OP_0 and OP_1 to OP_16, other opcodes being CScriptOp
+    if type(height) is int:
+        return height
+    return None
+
+
+class ReorderBuffer(object):
+    """Puts blocks found in any order back in chain order by linking them
+    through their previous block hash, starting from the genesis block.
+
+    Blocks are added with add and the ones which can be released in order
+    are given by pop_ready along with their height. A block is released
+    once one of its descendants is confirmations blocks deep and it leads
+    the deepest known branch, so that stale blocks are dropped.
+
+    The data of up to max_blocks pending blocks is kept in memory, the
+    others are kept as references to be read again when released.
+    """
+
+    def __init__(self, confirmations=6, max_blocks=1000):
+        self.confirmations = confirmations
+        self.max_blocks = max_blocks
+        self.tip = GENESIS_PREV_HASH
+        self.height = -1
+        self._children = {}
+        self._pending = {}
+        self._buffered = 0
+
+    def __repr__(self):
+        return "ReorderBuffer(height=%d, pending=%d)" % (self.height,
+                                                        len(self._pending))
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, hash_, prev_hash, raw_block, reference):
+        """Adds a block given its hash, previous block hash, raw data and
+        a reference to read it again (such as its file and position). The
+        raw data is dropped if max_blocks blocks are already held."""
+        if hash_ in self._pending:
+            return
+        if self._buffered >= self.max_blocks:
+            raw_block = None
+        else:
+            self._buffered += 1
+        self._pending[hash_] = (prev_hash, raw_block, reference)
+        self._children.setdefault(prev_hash, []).append(hash_)
+
+    def _depth(self, hash_, limit=None):
+        """Returns the length of the longest known chain starting at the
+        pending block hash_, stopping at limit"""
+        depth = 0
+        stack = [(hash_, 1)]
+        while stack:
+            block_hash, block_depth = stack.pop()
+            depth = max(depth, block_depth)
+            if limit is not None and depth >= limit:
+                return depth
+            for child in self._children.get(block_hash, ()):
+                stack.append((child, block_depth + 1))
+        return depth
+
+    def _drop(self, hash_):
+        """Drops a pending block and its descendants"""
+        stack = [hash_]
+        while stack:
+            block_hash = stack.pop()
+            _, raw_block, _ = self._pending.pop(block_hash)
+            if raw_block is not None:
+                self._buffered -= 1
+            stack.extend(self._children.pop(block_hash, ()))
+
+    def pop_ready(self, final=False):
+        """Yields the (hash, height, raw data or None, reference) of the
+        blocks following the last released one which are confirmed. If
+        final is True, no more blocks are to be added and the deepest
+        branch is released entirely."""
+        while True:
+            children = self._children.get(self.tip)
+            if not children:
+                return
+
+            if len(children) == 1 and not final:
+                best = children[0]
+                if self._depth(best, self.confirmations) < \
+                        self.confirmations:
+                    return
+            else:
+                depths = [self._depth(child) for child in children]
+                best_depth = max(depths)
+                best = children[depths.index(best_depth)]
+                if not final and (best_depth < self.confirmations or
+                                  depths.count(best_depth) > 1):
+                    return
+                for child in children:
+                    if child != best:
+                        self._drop(child)
+
+            del self._children[self.tip]
+            _, raw_block, reference = self._pending.pop(best)
+            if raw_block is not None:
+                self._buffered -= 1
+            self.tip = best
+            self.height += 1
+            yield best, self.height, raw_block, reference
@@ -0,0 +1,137 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import bisect
+import copy
+import os
+import pickle
+import struct
+
+from .block import get_transaction_offsets
+from .blockchain import BITCOIN_CONSTANT, get_files
+from .index import BLOCK_HAVE_DATA
+from .readplan import ReadPlanner
+from .transaction import get_transaction_sections
+from .utils import encode_compactsize
+
+# Largest size of the .blk files written, as bitcoind's
+MAX_BLOCKFILE_SIZE = 0x8000000
+
+# Name of the index of a repacked directory, in the format of the caches
+# of Blockchain.get_block_indexes
+REPACKED_INDEX = "index.pickle"
+
+
+def strip_witnesses(raw_block):
+    """Returns a raw block whose transactions are serialized without their
+    witnesses, leaving their txids and the merkle root unchanged"""
+    offsets = get_transaction_offsets(raw_block)
+    parts = [raw_block[:80], encode_compactsize(len(offsets) - 1)]
+    for start, end in zip(offsets, offsets[1:]):
+        _, _, witness_offsets, locktime_offset = \
+            get_transaction_sections(raw_block, start)
+        if witness_offsets is None:
+            parts.append(raw_block[start:end])
+        else:
+            parts.append(raw_block[start:start + 4])
+            parts.append(raw_block[start + 6:start + witness_offsets[0]])
+            parts.append(raw_block[start + locktime_offset:end])
+    return b"".join(parts)
+
+
+def load_repacked_index(path):
+    """Returns the DBBlockIndex of the blocks of a repacked directory,
+    which can be given as index to the methods of Blockchain"""
+    with open(os.path.join(path, REPACKED_INDEX), "rb") as f:
+        return pickle.load(f)
+
+
+def _write_index(path, blockIndexes):
+    tmp = os.path.join(path, REPACKED_INDEX + ".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(blockIndexes, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path, REPACKED_INDEX))
+
+
+def _prepare_directory(blockchain, path):
+    """Creates the directory of a repack, or empties the .blk files of an
+    earlier repack, refusing any other directory which is not empty"""
+    if not os.path.exists(path):
+        os.makedirs(path)
+    elif os.path.samefile(path, blockchain.path):
+        raise Exception("Cannot repack %s into itself" % path)
+    elif os.path.exists(os.path.join(path, REPACKED_INDEX)):
+        # the index is replaced last, an interrupted removal leaves the
+        # directory recognizable as a repack
+        for blk_file in get_files(path):
+            os.remove(blk_file)
+    elif os.listdir(path):
+        raise Exception("%s is not empty and holds no repacked blocks"
+                        % path)
+    # an empty index marks the directory as a repack while it is written
+    _write_index(path, [])
+
+
+def repack(blockchain, index, path, start=0, end=None, cache=None,
+           block_filter=None, strip_witness=False,
+           max_file_size=MAX_BLOCKFILE_SIZE, window=1024,
+           max_bytes=1 << 27):
+    """Writes the blocks of the main chain from height start to end
+    (inclusive), as listed by the leveldb index present at path index, into
+    new .blk files in the directory path, in height order. Stale blocks are
+    left out, as well as the blocks a BlockFilter does not select, and
+    witnesses if strip_witness is True.
+
+    Blocks are read by position with a ReadPlanner holding windows of at
+    most window blocks and max_bytes bytes. The index of the written blocks
+    is saved last, as REPACKED_INDEX, and returned: it can be given to
+    get_ordered_blocks, and get_unordered_blocks yields the repacked blocks
+    in height order. path must be empty or hold an earlier repack, whose
+    .blk files are removed first.
+    """
+    blockIndexes = blockchain.get_block_indexes(index, cache)
+    heights = [blkIdx.height for blkIdx in blockIndexes]
+    first = bisect.bisect_left(heights, start)
+    last = len(heights) if end is None else bisect.bisect_right(heights, end)
+
+    _prepare_directory(blockchain, path)
+    planner = ReadPlanner(blockchain.path, window, max_bytes)
+    repacked = []
+    file_no = 0
+    f = open(os.path.join(path, "blk%05d.dat" % file_no), "wb")
+    try:
+        for block in blockchain.get_ordered_blocks(
+                blockIndexes[first:last], block_filter=block_filter,
+                planner=planner):
+            raw_block = block.hex
+            if strip_witness:
+                raw_block = strip_witnesses(raw_block)
+            if f.tell() and f.tell() + 8 + len(raw_block) > max_file_size:
+                f.close()
+                file_no += 1
+                f = open(os.path.join(path, "blk%05d.dat" % file_no), "wb")
+            f.write(BITCOIN_CONSTANT + struct.pack("<I", len(raw_block)))
+
+            blkIdx = copy.copy(blockIndexes[bisect.bisect_left(
+                heights, block.height, first, last)])
+            blkIdx.status = BLOCK_HAVE_DATA
+            blkIdx.file = file_no
+            blkIdx.data_pos = f.tell()
+            blkIdx.undo_pos = -1
+            repacked.append(blkIdx)
+            f.write(raw_block)
+    finally:
+        f.close()
+
+    _write_index(path, repacked)
+    return repacked
@@ -13,6 +13,13 @@ from bitcoin.core.script import *
 from binascii import b2a_hex
 from .utils_taproot import from_taproot
 
+# String representation of each opcode in Script.value, small integers
+# being shown as numbers as they are in Script.operations
+_OPCODE_STRINGS = [str(CScriptOp(opcode)) for opcode in range(256)]
+_OPCODE_STRINGS[0] = "0"
+for _n in range(1, 17):
+    _OPCODE_STRINGS[OP_1 + _n - 1] = str(_n)
+
 
 def is_public_key(hex_data):
     """Given a bytes string, returns whether its is probably a bitcoin
@@ -33,12 +40,58 @@ def is_public_key(hex_data):
     return False
 
 
+def get_script_tokens(data):
+    """Splits a script given as bytes or memoryview into a list of
+    (opcode, start, end) tuples, data[start:end] being the data pushed by
+    the operation (start == end for operations pushing nothing). Returns the
+    tokens along with whether the script is valid, which it is not when its
+    last push is truncated, in which case the tokens preceding it are
+    returned.
+    """
+    tokens = []
+    length = len(data)
+    i = 0
+    while i < length:
+        opcode = data[i]
+        i += 1
+        if opcode > OP_PUSHDATA4:
+            tokens.append((opcode, i, i))
+            continue
+
+        if opcode < OP_PUSHDATA1:
+            size = opcode
+        elif opcode == OP_PUSHDATA1:
+            if i >= length:
+                return tokens, False
+            size = data[i]
+            i += 1
+        elif opcode == OP_PUSHDATA2:
+            if i + 1 >= length:
+                return tokens, False
+            size = data[i] | data[i + 1] << 8
+            i += 2
+        else:
+            if i + 3 >= length:
+                return tokens, False
+            size = data[i] | data[i + 1] << 8 | data[i + 2] << 16 | \
+                data[i + 3] << 24
+            i += 4
+
+        if i + size > length:
+            return tokens, False
+        tokens.append((opcode, i, i + size))
+        i += size
+    return tokens, True
+
+
 class Script(object):
     """Represents a bitcoin script contained in an input or output"""
 
     def __init__(self, raw_hex):
         self.hex = raw_hex
         self._script = None
+        self._tokens = None
+        self._valid = None
         self._type = None
         self._value = None
         self._operations = None
@@ -59,6 +112,21 @@ class Script(object):
 
         return self._script
 
+    @property
+    def tokens(self):
+        """Returns the (opcode, start, end) tuples of the script's
+        operations, as split by get_script_tokens"""
+        if self._tokens is None:
+            self._tokens, self._valid = get_script_tokens(self.hex)
+        return self._tokens
+
+    def is_valid(self):
+        """Returns whether all the pushes of the script are complete, as
+        CScript.is_valid does"""
+        if self._valid is None:
+            self._tokens, self._valid = get_script_tokens(self.hex)
+        return self._valid
+
     @property
     def operations(self):
         """Returns the list of operations done by this script,
@@ -66,15 +134,26 @@ class Script(object):
            - a CScriptOP
            - bytes data pushed to the stack
            - an int pushed to the stack
-        If the script is invalid (some coinbase scripts are), an exception is
-        thrown
+        If the script is invalid (some coinbase scripts are), the list is
+        empty
         """
         if self._operations is None:
             # Some coinbase scripts are garbage, they could not be valid
-            try:
-                self._operations = list(self.script)
-            except CScriptInvalidError:
+            if not self.is_valid():
                 self._operations = []
+                return self._operations
+
+            operations = []
+            for opcode, start, end in self.tokens:
+                if opcode == 0:
+                    operations.append(0)
+                elif opcode <= OP_PUSHDATA4:
+                    operations.append(bytes(self.hex[start:end]))
+                elif OP_1 <= opcode <= OP_16:
+                    operations.append(opcode - OP_1 + 1)
+                else:
+                    operations.append(CScriptOp(opcode))
+            self._operations = operations
 
         return self._operations
 
@@ -82,31 +161,34 @@ class Script(object):
     def value(self):
         """Returns a string representation of the script"""
         if self._value is None:
-            parts = []
-            try:
-                for operation in list(self.script):
-                    if isinstance(operation, bytes):
-                        parts.append(b2a_hex(operation).decode("ascii"))
-                    else:
-                        parts.append(str(operation))
-
-                self._value = " ".join(parts)
-            except CScriptInvalidError:
+            if not self.is_valid():
                 self._value = "INVALID_SCRIPT"
+                return self._value
+
+            parts = []
+            for opcode, start, end in self.tokens:
+                if opcode == 0 or opcode > OP_PUSHDATA4:
+                    parts.append(_OPCODE_STRINGS[opcode])
+                else:
+                    parts.append(self.hex[start:end].hex())
+            self._value = " ".join(parts)
 
         return self._value
 
     def is_return(self):
-        return self.script.is_unspendable()
+        return len(self.hex) > 0 and self.hex[0] == OP_RETURN
 
     def is_p2sh(self):
-        return self.script.is_p2sh()
+        return len(self.hex) == 23 and self.hex[0] == OP_HASH160 \
+            and self.hex[1] == 0x14 and self.hex[22] == OP_EQUAL
 
     def is_p2wsh(self):
-        return self.script.is_witness_v0_scripthash()
+        return len(self.hex) == 34 and self.hex[0] == 0 \
+            and self.hex[1] == 0x20
 
     def is_p2wpkh(self):
-        return self.script.is_witness_v0_keyhash()
+        return len(self.hex) == 22 and self.hex[0] == 0 \
+            and self.hex[1] == 0x14
 
     def is_p2tr(self):
         if len(self.operations) > 1 and type(self.operations[1]) == bytes:
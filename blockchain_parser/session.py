@@ -0,0 +1,128 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import bisect
+import json
+import os
+
+
+class ScanSession(object):
+    """A scan of the blocks of a Blockchain which can be resumed after it
+    is interrupted, from checkpoints committed to the JSON file at path.
+
+    unordered_blocks checkpoints the (blk file, data position) of the last
+    block processed and ordered_blocks its height and hash. A block is
+    processed once the next one is requested: with auto_ack, a checkpoint
+    is committed every interval processed blocks and when the scan ends,
+    so that an interrupted scan yields again at most interval blocks
+    (at-least-once). Without auto_ack, checkpoints are only committed by
+    ack, which can also save a state along with the position in the same
+    atomic write: results accumulated in that state are then counted
+    exactly once.
+    """
+
+    def __init__(self, blockchain, path, interval=1000, auto_ack=True):
+        self.blockchain = blockchain
+        self.path = path
+        self.interval = interval
+        self.auto_ack = auto_ack
+        self.mode = None
+        # committed position, and position of the last block yielded
+        self.checkpoint = None
+        self.position = None
+        self.state = None
+        self._processed = None
+        self._n_processed = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                meta = json.load(f)
+            self.mode = meta["mode"]
+            self.checkpoint = self.position = meta["position"]
+            self.state = meta["state"]
+
+    def __repr__(self):
+        return "ScanSession(%s, checkpoint=%s)" % (self.path, self.checkpoint)
+
+    def _commit(self, position):
+        meta = {"mode": self.mode, "position": position, "state": self.state}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.checkpoint = position
+        self._n_processed = 0
+
+    def ack(self, state=None):
+        """Commits the position of the last block yielded, meaning all the
+        blocks yielded so far are processed, and state if it is given (any
+        JSON serializable object, restored as session.state)"""
+        if state is not None:
+            self.state = state
+        if self.position is not None:
+            self._commit(self.position)
+
+    def _start(self, mode):
+        if self.mode is not None and self.mode != mode:
+            raise Exception("%s holds the checkpoint of a scan of %s blocks"
+                            % (self.path, self.mode))
+        self.mode = mode
+
+    def _scan(self, blocks, get_position):
+        for block in blocks:
+            self.position = get_position(block)
+            yield block
+            self._processed = self.position
+            self._n_processed += 1
+            if self.auto_ack and self._n_processed >= self.interval:
+                self._commit(self._processed)
+        if self.auto_ack and self._processed is not None:
+            self._commit(self._processed)
+
+    def unordered_blocks(self, block_filter=None):
+        """Yields the blocks of the .blk files as
+        Blockchain.get_unordered_blocks, from the one following the last
+        checkpoint"""
+        self._start("unordered")
+        start_after = None
+        if self.checkpoint is not None:
+            start_after = (self.checkpoint["blk_file"],
+                           self.checkpoint["data_pos"])
+        blocks = self.blockchain.get_unordered_blocks(block_filter,
+                                                      start_after)
+        return self._scan(blocks, lambda block: {
+            "blk_file": block.blk_file, "data_pos": block.data_pos})
+
+    def ordered_blocks(self, index, end=None, cache=None, undo=False,
+                       block_filter=None):
+        """Yields the blocks of the main chain as
+        Blockchain.get_ordered_blocks, from the height following the last
+        checkpoint to end (exclusive). An Exception is raised if the last
+        block checkpointed left the main chain."""
+        self._start("ordered")
+        blockIndexes = self.blockchain.get_block_indexes(index, cache)
+        heights = [blkIdx.height for blkIdx in blockIndexes]
+        first = 0
+        if self.checkpoint is not None:
+            height = self.checkpoint["height"]
+            first = bisect.bisect_left(heights, height)
+            if first == len(heights) or \
+                    blockIndexes[first].hash != self.checkpoint["hash"]:
+                raise Exception("Block %s at height %d is not in the main "
+                                "chain" % (self.checkpoint["hash"], height))
+            first += 1
+        last = len(heights) if end is None else \
+            bisect.bisect_left(heights, end)
+        blocks = self.blockchain.get_ordered_blocks(
+            blockIndexes[first:last], undo=undo, block_filter=block_filter)
+        return self._scan(blocks, lambda block: {
+            "height": block.height, "hash": block.hash})
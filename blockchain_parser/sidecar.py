@@ -0,0 +1,274 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import mmap
+import os
+import struct
+
+from .block_header import BlockHeader
+from .blockchain import get_files, get_block, get_block_positions
+from .block import Block
+from .utils import decode_compactsize_from, double_sha256, format_hash, \
+    parse_hash
+
+MAGIC = b"BPSIDECR"
+VERSION = 1
+
+# magic, version, size and modification time (in nanoseconds) of the .blk
+# file when the sidecar was written, number of blocks
+_HEADER = struct.Struct("<8sIQqI")
+
+# position of the data of the block in the .blk file, size, number of
+# transactions, hash (internal byte order), 80 bytes header
+_RECORD = struct.Struct("<III32s80s")
+
+
+class SidecarEntry(object):
+    """A block listed in the sidecar of a .blk file"""
+
+    def __init__(self, blk_file, data_pos, size, n_transactions, hash_bytes,
+                 raw_header):
+        self.blk_file = blk_file
+        self.data_pos = data_pos
+        self.size = size
+        self.n_transactions = n_transactions
+        self.hash_bytes = hash_bytes
+        self.raw_header = raw_header
+        self._header = None
+
+    def __repr__(self):
+        return "SidecarEntry(%s, blk_file=%s, data_pos=%d, size=%d)" \
+               % (self.hash, self.blk_file, self.data_pos, self.size)
+
+    @property
+    def hash(self):
+        return format_hash(self.hash_bytes)
+
+    @property
+    def header(self):
+        """Returns the BlockHeader of the block"""
+        if self._header is None:
+            self._header = BlockHeader.from_hex(self.raw_header)
+        return self._header
+
+    @property
+    def previous_block_hash(self):
+        return format_hash(self.raw_header[4:36])
+
+    @property
+    def timestamp(self):
+        """Returns the UNIX timestamp of the block"""
+        return struct.unpack_from("<I", self.raw_header, 68)[0]
+
+
+def get_sidecar_path(blk_file, directory=None):
+    """Returns the path of the sidecar of a .blk file, blkNNNNN.idx in
+    directory or next to the .blk file"""
+    if directory is None:
+        directory = os.path.dirname(blk_file)
+    name = os.path.splitext(os.path.basename(blk_file))[0]
+    return os.path.join(directory, name + ".idx")
+
+
+def _read_sidecar(path):
+    """Returns the size and modification time of the .blk file recorded in
+    a sidecar and its records, as (data position, size, number of
+    transactions, hash, header) tuples, or None if it is missing or
+    unreadable"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, version, size, mtime, count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or \
+            len(data) != _HEADER.size + count * _RECORD.size:
+        return None
+    return size, mtime, list(_RECORD.iter_unpack(
+        memoryview(data)[_HEADER.size:]))
+
+
+def _write_sidecar(path, records, st):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, st.st_size, st.st_mtime_ns,
+                             len(records)))
+        f.write(b"".join(_RECORD.pack(*record) for record in records))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _has_frame(blk_file, data_pos, size):
+    """Returns whether a block of the given size is still framed at its
+    position"""
+    with open(blk_file, "rb") as f:
+        f.seek(data_pos - 8)
+        frame = f.read(8)
+    return len(frame) == 8 and frame[4:] == struct.pack("<I", size)
+
+
+def _get_records(blk_file, path, st):
+    """Returns the records of the sidecar of a .blk file which are still
+    valid, and None if the sidecar is up to date or the offset from which
+    the .blk file must be scanned. A .blk file which only grew, as bitcoind
+    appends to it, is scanned from the end of its last known block."""
+    sidecar = _read_sidecar(path)
+    if sidecar is None:
+        return [], 0
+    size, mtime, records = sidecar
+    if size == st.st_size and mtime == st.st_mtime_ns:
+        return records, None
+    if records and size <= st.st_size:
+        data_pos, block_size = records[-1][:2]
+        if _has_frame(blk_file, data_pos, block_size):
+            return records, data_pos + block_size
+    return [], 0
+
+
+def _scan(blk_file, offset):
+    """Yields the record and raw data of the blocks of a .blk file from
+    offset on"""
+    for data_pos, raw_block in get_block_positions(blk_file, offset):
+        raw_header = bytes(raw_block[:80])
+        record = (data_pos, len(raw_block),
+                  decode_compactsize_from(raw_block, 80)[0],
+                  double_sha256(raw_header), raw_header)
+        yield record, raw_block
+
+
+def load_sidecar(blk_file, directory=None, write=True):
+    """Returns the SidecarEntry of the blocks of a .blk file. They are read
+    from its sidecar when it matches the size and modification time of the
+    file, otherwise the file is scanned and, if write is True, the sidecar
+    is written."""
+    st = os.stat(blk_file)
+    path = get_sidecar_path(blk_file, directory)
+    records, offset = _get_records(blk_file, path, st)
+    if offset is not None:
+        records += [record for record, _ in _scan(blk_file, offset)]
+        if write:
+            _write_sidecar(path, records, st)
+    blk_name = os.path.basename(blk_file)
+    return [SidecarEntry(blk_name, *record) for record in records]
+
+
+def get_sidecar_positions(blk_file, offset=0, header_filter=None,
+                          directory=None, write=True):
+    """Yields the position and raw data of the blocks of a .blk file from
+    offset on, as get_block_positions does, their positions and headers
+    being read from the sidecar of the file instead of walking over the
+    framing of the blocks. The blocks header_filter rejects are not read.
+
+    When the sidecar is missing or out of date, the part of the file it
+    does not cover is scanned and, if write is True and all the blocks are
+    consumed, the sidecar is written.
+    """
+    st = os.stat(blk_file)
+    path = get_sidecar_path(blk_file, directory)
+    records, scan_offset = _get_records(blk_file, path, st)
+
+    if records:
+        with open(blk_file, "rb") as f:
+            raw_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for data_pos, size, _, _, raw_header in records:
+                if data_pos < offset:
+                    continue
+                if header_filter is None or header_filter(raw_header):
+                    yield data_pos, raw_data[data_pos:data_pos + size]
+        finally:
+            raw_data.close()
+
+    if scan_offset is None:
+        return
+    for record, raw_block in _scan(blk_file, scan_offset):
+        records.append(record)
+        if record[0] < offset:
+            continue
+        if header_filter is None or header_filter(record[4]):
+            yield record[0], raw_block
+    if write:
+        _write_sidecar(path, records, st)
+
+
+class SidecarIndex(object):
+    """Finds blocks by hash in the .blk files of a directory without
+    bitcoind's index, from the sidecars of the files, which are written
+    in directory, or next to the .blk files, when missing or out of date
+    and write is True. update reads the sidecars of files which changed.
+    """
+
+    def __init__(self, path, directory=None, write=True):
+        self.path = path
+        self.directory = directory
+        self.write = write
+        self._entries = {}
+        self._files = {}
+        self._file_hashes = {}
+        self.update()
+
+    def __repr__(self):
+        return "SidecarIndex(%s, blocks=%d)" % (self.path, len(self))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, block_hash):
+        return self.get(block_hash) is not None
+
+    def _forget(self, blk_file):
+        """Removes the entries of the blocks read from a .blk file"""
+        blk_name = os.path.basename(blk_file)
+        for hash_bytes in self._file_hashes.pop(blk_file, ()):
+            entry = self._entries.get(hash_bytes)
+            if entry is not None and entry.blk_file == blk_name:
+                del self._entries[hash_bytes]
+        self._files.pop(blk_file, None)
+
+    def update(self):
+        """Reads the sidecars of the .blk files which were added or
+        changed since the last update, forgetting the blocks of the files
+        which were rewritten or removed"""
+        blk_files = get_files(self.path)
+        for blk_file in set(self._files) - set(blk_files):
+            self._forget(blk_file)
+        for blk_file in blk_files:
+            st = os.stat(blk_file)
+            if self._files.get(blk_file) == (st.st_size, st.st_mtime_ns):
+                continue
+            self._forget(blk_file)
+            entries = load_sidecar(blk_file, self.directory, self.write)
+            for entry in entries:
+                self._entries[entry.hash_bytes] = entry
+            self._file_hashes[blk_file] = [entry.hash_bytes
+                                           for entry in entries]
+            self._files[blk_file] = (st.st_size, st.st_mtime_ns)
+
+    def get(self, block_hash):
+        """Returns the SidecarEntry of the block with the given hash, or
+        None if it is not in the .blk files"""
+        return self._entries.get(parse_hash(block_hash))
+
+    def get_block(self, block_hash):
+        """Returns the Block with the given hash, or None if it is not in
+        the .blk files"""
+        entry = self.get(block_hash)
+        if entry is None:
+            return None
+        raw_block = get_block(os.path.join(self.path, entry.blk_file),
+                              entry.data_pos)
+        return Block(raw_block, None, entry.blk_file, data_pos=entry.data_pos)
@@ -0,0 +1,326 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+MAGIC = b"BPSORTED"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sIIIQI")
+_FANOUT_SIZE = 1 << 16
+_FANOUT = struct.Struct("<%dQ" % _FANOUT_SIZE)
+
+
+def _prefix(record):
+    return (record[0] << 8) | record[1]
+
+
+def write_sorted_records(path, records, record_size, key_size, meta=b""):
+    """Writes already sorted records into a sorted file at path. The file is
+    first written next to its destination then moved in place, so readers
+    never see a partially written file. Returns the number of records.
+    """
+    counts = [0] * _FANOUT_SIZE
+    count = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, record_size, key_size, 0,
+                             len(meta)))
+        f.write(meta)
+        fanout_pos = f.tell()
+        f.write(b"\x00" * _FANOUT.size)
+
+        buffer = []
+        for record in records:
+            assert len(record) == record_size
+            counts[_prefix(record)] += 1
+            buffer.append(record)
+            if len(buffer) >= 65536:
+                f.write(b"".join(buffer))
+                count += len(buffer)
+                buffer = []
+        f.write(b"".join(buffer))
+        count += len(buffer)
+
+        total = 0
+        for i in range(_FANOUT_SIZE):
+            total += counts[i]
+            counts[i] = total
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, record_size, key_size, count,
+                             len(meta)))
+        f.seek(fanout_pos)
+        f.write(_FANOUT.pack(*counts))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def write_run(path, records):
+    """Sorts a list of records and writes them as is at path, to be merged
+    later with merge_runs"""
+    records.sort()
+    with open(path, "wb") as f:
+        f.write(b"".join(records))
+
+
+def iter_run(path, record_size, chunk_records=65536):
+    """Yields the records of a file written by write_run"""
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(record_size * chunk_records)
+            if not data:
+                return
+            for i in range(0, len(data), record_size):
+                yield data[i:i + record_size]
+
+
+def merge_runs(paths, record_size):
+    """Yields the records of several sorted runs, in order"""
+    return heapq.merge(*[iter_run(p, record_size) for p in paths])
+
+
+def sort_records(records, record_size, max_records=1 << 20, tmpdir=None):
+    """Sorts an iterable of records with bounded memory use: at most
+    max_records records are held in memory, sorted runs are spilled to
+    temporary files and merged. Yields the sorted records.
+    """
+    with tempfile.TemporaryDirectory(dir=tmpdir) as rundir:
+        runs = []
+        buffer = []
+        for record in records:
+            buffer.append(record)
+            if len(buffer) >= max_records:
+                runs.append(os.path.join(rundir, "%06d.run" % len(runs)))
+                write_run(runs[-1], buffer)
+                buffer = []
+
+        buffer.sort()
+        if not runs:
+            for record in buffer:
+                yield record
+            return
+
+        iterables = [iter_run(p, record_size) for p in runs]
+        for record in heapq.merge(buffer, *iterables):
+            yield record
+
+
+def sort_to_run(path, records, record_size, max_records=1 << 20,
+                tmpdir=None):
+    """Sorts an iterable of records with bounded memory use, as sort_records
+    does, and writes them at path as a run to be merged with merge_runs"""
+    with open(path, "wb") as f:
+        buffer = []
+        for record in sort_records(records, record_size, max_records,
+                                   tmpdir):
+            buffer.append(record)
+            if len(buffer) >= 65536:
+                f.write(b"".join(buffer))
+                buffer = []
+        f.write(b"".join(buffer))
+
+
+class SortedRecordFile(object):
+    """Read-only access to a sorted file written by write_sorted_records.
+
+    A sorted file starts with a header, an opaque metadata blob and a fan-out
+    table giving, for every 2 bytes prefix, the number of records whose key
+    starts with a prefix lower or equal to it. The fixed-width records
+    follow, sorted by their raw bytes, so finding a key is a binary search
+    over the records sharing its prefix, done on a read-only mmap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.record_size, self.key_size, self.count, \
+            meta_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise Exception("%s is not a sorted records file" % path)
+        self.meta = self._mmap[_HEADER.size:_HEADER.size + meta_size]
+        self._fanout_pos = _HEADER.size + meta_size
+        self._records_pos = self._fanout_pos + _FANOUT.size
+
+    def __repr__(self):
+        return "SortedRecordFile(%s, records=%d)" % (self.path, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def __getitem__(self, i):
+        start = self._records_pos + i * self.record_size
+        return self._mmap[start:start + self.record_size]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def _bucket(self, key):
+        """Returns the range of positions of the records sharing the 2 bytes
+        prefix of key"""
+        prefix = _prefix(key)
+        end, = struct.unpack_from("<Q", self._mmap,
+                                  self._fanout_pos + 8 * prefix)
+        if prefix == 0:
+            return 0, end
+        start, = struct.unpack_from("<Q", self._mmap,
+                                    self._fanout_pos + 8 * (prefix - 1))
+        return start, end
+
+    def _lower_bound(self, key):
+        lo, hi = self._bucket(key)
+        n = len(key)
+        mm = self._mmap
+        record_size = self.record_size
+        base = self._records_pos
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = base + mid * record_size
+            if mm[pos:pos + n] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, key):
+        """Returns the first record starting with key, or None"""
+        i = self._lower_bound(key)
+        if i < self.count:
+            record = self[i]
+            if record.startswith(key):
+                return record
+        return None
+
+    def find_all(self, key):
+        """Returns the list of the records starting with key"""
+        records = []
+        i = self._lower_bound(key)
+        while i < self.count:
+            record = self[i]
+            if not record.startswith(key):
+                break
+            records.append(record)
+            i += 1
+        return records
+
+
+class SortedRecordIndex(object):
+    """A directory of sorted files, the segments of an index that grows
+    by appending new segments. Each segment carries the metadata of the
+    index at the time it was written, lookups go through every segment,
+    newest first. compact merges all segments into one.
+    """
+
+    def __init__(self, path, record_size, key_size, max_segments=16):
+        self.path = path
+        self.record_size = record_size
+        self.key_size = key_size
+        self.max_segments = max_segments
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.segments = []
+        self.reload()
+
+    def __repr__(self):
+        return "SortedRecordIndex(%s, segments=%d)" % (self.path,
+                                                       len(self.segments))
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _segment_names(self):
+        return sorted(f for f in os.listdir(self.path)
+                      if f.startswith("segment-") and f.endswith(".dat"))
+
+    def reload(self):
+        """Opens the segments present on disk"""
+        self.close()
+        self.segments = [SortedRecordFile(os.path.join(self.path, name))
+                         for name in self._segment_names()]
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    @property
+    def meta(self):
+        """Returns the metadata of the newest segment"""
+        if not self.segments:
+            return None
+        return self.segments[-1].meta
+
+    def _next_segment_path(self):
+        names = self._segment_names()
+        number = int(names[-1][8:-4]) + 1 if names else 0
+        return os.path.join(self.path, "segment-%06d.dat" % number)
+
+    def append(self, records, meta=b""):
+        """Writes already sorted records as a new segment, compacting the
+        index once it holds more than max_segments segments"""
+        path = self._next_segment_path()
+        write_sorted_records(path, records, self.record_size, self.key_size,
+                             meta)
+        self.segments.append(SortedRecordFile(path))
+        if len(self.segments) > self.max_segments:
+            self.compact()
+
+    def compact(self):
+        """Merges all the segments into a single one"""
+        if len(self.segments) < 2:
+            return
+        old_paths = [segment.path for segment in self.segments]
+        path = self._next_segment_path()
+        write_sorted_records(path, heapq.merge(*self.segments),
+                             self.record_size, self.key_size, self.meta)
+        self.close()
+        for old_path in old_paths:
+            os.remove(old_path)
+        self.reload()
+
+    def find(self, key):
+        """Returns the first record starting with key in the newest segment
+        containing one, or None"""
+        for segment in reversed(self.segments):
+            record = segment.find(key)
+            if record is not None:
+                return record
+        return None
+
+    def find_all(self, key):
+        """Returns the list of the records starting with key, oldest
+        segment first"""
+        records = []
+        for segment in self.segments:
+            records.extend(segment.find_all(key))
+        return records
@@ -0,0 +1,159 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import json
+import os
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from .blockchain import Blockchain
+from .sortedfile import SortedRecordIndex, sort_to_run, merge_runs
+from .utils import format_hash, parse_hash
+
+# Spent outpoint (txid in internal byte order, big endian output index so
+# that the outputs of a transaction sort in order), then the spending txid,
+# the index of the spending input and the height of the spending block
+_RECORD = struct.Struct(">32sI32sII")
+_KEY_SIZE = 36
+
+
+class Spend(object):
+    """Represents the input spending a transaction output"""
+
+    def __init__(self, txid, vout, spending_txid, vin, height):
+        self.txid = txid
+        self.vout = vout
+        self.spending_txid = spending_txid
+        self.vin = vin
+        self.height = height
+
+    def __repr__(self):
+        return "Spend(%s:%d, by=%s:%d, height=%d)" \
+               % (self.txid, self.vout, self.spending_txid, self.vin,
+                  self.height)
+
+    @classmethod
+    def from_record(cls, record):
+        txid, vout, spending_txid, vin, height = _RECORD.unpack(record)
+        return cls(format_hash(txid), vout, format_hash(spending_txid), vin,
+                   height)
+
+
+def _block_records(block):
+    """Yields the packed records of the inputs of a block"""
+    for tx in block.transactions[1:]:
+        spending_txid = tx.txid_bytes
+        for vin, inp in enumerate(tx.inputs):
+            yield _RECORD.pack(inp.transaction_hash_bytes,
+                               inp.transaction_index, spending_txid, vin,
+                               block.height)
+
+
+def _index_range(path, blockIndexes, rundir, max_records):
+    """Writes the sorted records of a range of blocks into a run file, run
+    by the workers of SpentIndex.update"""
+    blockchain = Blockchain(path)
+    blocks = blockchain.get_ordered_blocks(blockIndexes)
+    records = (r for block in blocks for r in _block_records(block))
+
+    fd, run = tempfile.mkstemp(suffix=".run", dir=rundir)
+    os.close(fd)
+    sort_to_run(run, records, _RECORD.size, max_records, rundir)
+    return run
+
+
+class SpentIndex(object):
+    """An index of the input spending each transaction output, which
+    bitcoind does not keep, built in one parallel pass over the blocks of
+    the main chain.
+
+    Records are fixed width and sorted by outpoint in mmap-ed files, found
+    by binary search narrowed by a 2 bytes prefix fan-out table. Each update
+    appends a file holding the spends of the new blocks.
+    """
+
+    def __init__(self, path, max_segments=16):
+        self.path = path
+        self._index = SortedRecordIndex(path, _RECORD.size, _KEY_SIZE,
+                                        max_segments)
+
+    def __repr__(self):
+        return "SpentIndex(%s, height=%d)" % (self.path, self.height)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._index.close()
+
+    @property
+    def height(self):
+        """Returns the height of the last indexed block, -1 if the index
+        is empty"""
+        meta = self._index.meta
+        if not meta:
+            return -1
+        return json.loads(meta.decode("ascii"))["height"]
+
+    def update(self, blockchain, index, cache=None, workers=None,
+               chunk_size=2016, max_records=1 << 20):
+        """Indexes the blocks of the main chain following the last indexed
+        one, ranges of chunk_size blocks being processed in parallel by a
+        pool of workers processes, each of them holding at most max_records
+        records in memory. Returns the height of the last indexed block."""
+        height = self.height
+        blockIndexes = blockchain._select_block_indexes(index, height + 1,
+                                                        cache=cache)
+        if not blockIndexes:
+            return height
+
+        chunks = [blockIndexes[i:i + chunk_size]
+                  for i in range(0, len(blockIndexes), chunk_size)]
+        with tempfile.TemporaryDirectory(dir=self.path) as rundir:
+            args = ([blockchain.path] * len(chunks), chunks,
+                    [rundir] * len(chunks), [max_records] * len(chunks))
+            if workers == 1:
+                runs = list(map(_index_range, *args))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    runs = list(executor.map(_index_range, *args))
+
+            meta = json.dumps({"height": blockIndexes[-1].height})
+            self._index.append(merge_runs(runs, _RECORD.size),
+                               meta.encode("ascii"))
+        return self.height
+
+    def compact(self):
+        """Merges the files written by successive updates into one"""
+        self._index.compact()
+
+    def get(self, txid, vout):
+        """Returns the Spend of an output, or None if it is unspent as of
+        the last indexed block"""
+        key = parse_hash(txid) + struct.pack(">I", vout)
+        record = self._index.find(key)
+        if record is None:
+            return None
+        return Spend.from_record(record)
+
+    def get_spends(self, txid):
+        """Returns the Spends of the spent outputs of a transaction,
+        ordered by output index"""
+        records = self._index.find_all(parse_hash(txid))
+        return sorted((Spend.from_record(r) for r in records),
+                      key=lambda spend: spend.vout)
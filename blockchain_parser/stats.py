@@ -0,0 +1,215 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
+
+import numpy as np
+
+from .blockchain import Blockchain
+from .utils import decode_compactsize, decode_uint32
+
+# Percentiles of the fee rates, weighted by transaction weight, as in the
+# getblockstats RPC call
+FEERATE_PERCENTILES = (10, 25, 50, 75, 90)
+
+COIN = 100000000
+HALVING_INTERVAL = 210000
+
+# Per block statistics, named after the fields of bitcoind's getblockstats.
+# Like getblockstats, transaction counts, sizes, fees and fee rates exclude
+# the coinbase transaction, fee rates are expressed in sat/vbyte.
+BLOCK_STATS_DTYPE = np.dtype([
+    ("height", np.int32),
+    ("time", np.uint32),
+    ("size", np.uint32),
+    ("weight", np.uint32),
+    ("vsize", np.uint32),
+    ("txs", np.uint32),
+    ("ins", np.uint32),
+    ("outs", np.uint32),
+    ("utxo_increase", np.int32),
+    ("total_size", np.uint32),
+    ("total_weight", np.uint32),
+    ("swtxs", np.uint32),
+    ("swtotal_size", np.uint32),
+    ("swtotal_weight", np.uint32),
+    ("mintxsize", np.uint32),
+    ("maxtxsize", np.uint32),
+    ("avgtxsize", np.uint32),
+    ("total_in", np.int64),
+    ("total_out", np.int64),
+    ("subsidy", np.int64),
+    ("totalfee", np.int64),
+    ("minfee", np.int64),
+    ("maxfee", np.int64),
+    ("avgfee", np.int64),
+    ("medianfee", np.int64),
+    ("minfeerate", np.int64),
+    ("maxfeerate", np.int64),
+    ("avgfeerate", np.int64),
+    ("feerate_percentiles", np.int64, (len(FEERATE_PERCENTILES),)),
+])
+
+
+def block_subsidy(height):
+    """Returns the amount of new coins created by the block at the given
+    height, in satoshis"""
+    halvings = height // HALVING_INTERVAL
+    if halvings >= 64:
+        return 0
+    return (50 * COIN) >> halvings
+
+
+def _truncated_median(values):
+    """Median as computed by bitcoind, truncated towards zero"""
+    n = len(values)
+    if n == 0:
+        return 0
+    values = np.sort(values)
+    if n % 2 == 0:
+        return int(values[n // 2 - 1] + values[n // 2]) // 2
+    return int(values[n // 2])
+
+
+def _percentiles_by_weight(feerates, weights, total_weight):
+    """Fee rate percentiles weighted by transaction weight, as computed
+    by bitcoind"""
+    result = np.zeros(len(FEERATE_PERCENTILES), dtype=np.int64)
+    if len(feerates) == 0:
+        return result
+    order = np.lexsort((weights, feerates))
+    feerates = feerates[order]
+    cumulative_weight = np.cumsum(weights[order])
+    thresholds = np.array(FEERATE_PERCENTILES, dtype=np.float64) \
+        * total_weight / 100
+    positions = np.searchsorted(cumulative_weight, thresholds, side="left")
+    positions = np.minimum(positions, len(feerates) - 1)
+    return feerates[positions]
+
+
+def block_stats(block, undo=None):
+    """Computes the statistics of a Block, using its BlockUndo to find the
+    values of the spent outputs. undo defaults to block.undo.
+    Returns a record of BLOCK_STATS_DTYPE.
+    """
+    if undo is None:
+        undo = block.undo
+    transactions = block.transactions
+    if len(transactions) > 1 and \
+            (undo is None or len(undo.spends) != len(transactions) - 1):
+        raise Exception("Missing undo data for block %s" % block.hash)
+
+    stats = np.zeros((), dtype=BLOCK_STATS_DTYPE)
+    stats["height"] = -1 if block.height is None else block.height
+    stats["time"] = decode_uint32(block.hex[68:72])
+    stats["size"] = block.size
+    stats["txs"] = len(transactions)
+
+    n = len(transactions) - 1
+    sizes = np.zeros(n, dtype=np.int64)
+    weights = np.zeros(n, dtype=np.int64)
+    fees = np.zeros(n, dtype=np.int64)
+    is_segwit = np.zeros(n, dtype=bool)
+    block_weight = 0
+    ins = outs = 0
+    total_in = total_out = 0
+
+    for i, tx in enumerate(transactions):
+        block_weight += tx.weight
+        outs += tx.n_outputs
+        if i == 0:
+            continue
+
+        tx_out = sum(output.value for output in tx.outputs)
+        tx_in = sum(spent.amt for spent in undo.spends[i - 1].outputs)
+        ins += tx.n_inputs
+        total_in += tx_in
+        total_out += tx_out
+
+        sizes[i - 1] = tx.size
+        weights[i - 1] = tx.weight
+        fees[i - 1] = tx_in - tx_out
+        is_segwit[i - 1] = tx.is_segwit
+
+    # The header and the transaction count are not witness data
+    block_weight += 4 * (80 + decode_compactsize(block.hex[80:89])[1])
+    stats["weight"] = block_weight
+    stats["vsize"] = ceil(block_weight / 4)
+    stats["ins"] = ins
+    stats["outs"] = outs
+    stats["utxo_increase"] = outs - ins
+    stats["total_in"] = total_in
+    stats["total_out"] = total_out
+    stats["subsidy"] = block_subsidy(max(block.height or 0, 0))
+
+    if n == 0:
+        return stats
+
+    total_weight = int(weights.sum())
+    totalfee = int(fees.sum())
+    feerates = np.where(weights > 0, fees * 4 // np.maximum(weights, 1), 0)
+
+    stats["total_size"] = sizes.sum()
+    stats["total_weight"] = total_weight
+    stats["swtxs"] = is_segwit.sum()
+    stats["swtotal_size"] = sizes[is_segwit].sum()
+    stats["swtotal_weight"] = weights[is_segwit].sum()
+    stats["mintxsize"] = sizes.min()
+    stats["maxtxsize"] = sizes.max()
+    stats["avgtxsize"] = int(sizes.sum()) // n
+    stats["totalfee"] = totalfee
+    stats["minfee"] = fees.min()
+    stats["maxfee"] = fees.max()
+    stats["avgfee"] = totalfee // n
+    stats["medianfee"] = _truncated_median(fees)
+    stats["minfeerate"] = feerates.min()
+    stats["maxfeerate"] = feerates.max()
+    stats["avgfeerate"] = totalfee * 4 // total_weight if total_weight else 0
+    stats["feerate_percentiles"] = _percentiles_by_weight(feerates, weights,
+                                                          total_weight)
+    return stats
+
+
+def _block_stats_range(path, blockIndexes):
+    """Computes the statistics of a range of blocks, run by the workers of
+    get_block_stats"""
+    blockchain = Blockchain(path)
+    blocks = blockchain.get_ordered_blocks(blockIndexes, undo=True)
+    return np.array([block_stats(block) for block in blocks],
+                    dtype=BLOCK_STATS_DTYPE)
+
+
+def get_block_stats(blockchain, index, start=0, end=None, cache=None,
+                    workers=None, chunk_size=2016):
+    """Computes the statistics of the blocks of the main chain from height
+    start to end, using the .blk and rev*.dat files of the blockchain and
+    the leveldb index present at path index.
+
+    Ranges of chunk_size blocks are processed in parallel by a pool of
+    workers processes, the statistics are returned as a NumPy array
+    of BLOCK_STATS_DTYPE records ordered by height.
+    """
+    blockIndexes = blockchain.get_block_indexes(index, cache)[start:end]
+    chunks = [blockIndexes[i:i + chunk_size]
+              for i in range(0, len(blockIndexes), chunk_size)]
+
+    if workers == 1:
+        results = [_block_stats_range(blockchain.path, c) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_block_stats_range,
+                                        [blockchain.path] * len(chunks),
+                                        chunks))
+
+    if not results:
+        return np.zeros(0, dtype=BLOCK_STATS_DTYPE)
+    return np.concatenate(results)
@@ -0,0 +1,111 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import heapq
+import os
+import tempfile
+import unittest
+from binascii import a2b_hex
+
+from blockchain_parser.addrindex import AddressIndex, INPUT, OUTPUT, \
+    _concat_postings
+from blockchain_parser.blockchain import Blockchain
+from .utils import read_test_data, write_chain, COINBASE, COINBASE_SCRIPT
+
+P2SH = a2b_hex("a914169e3bb06b5f0355e5085a8a1a5e430a3f6b392587")
+
+
+class TestAddressIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([COINBASE], []),
+            ([COINBASE, read_test_data("size_non_segwit.txt")],
+             [[(0, True, 5000000000, COINBASE_SCRIPT)]]),
+            ([COINBASE, read_test_data("size_segwit.txt")],
+             [[(1, False, 16526810, P2SH)]]),
+        ])
+        self.path = os.path.join(self.tmpdir.name, "addrindex")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_update(self):
+        with AddressIndex(self.path) as index:
+            self.assertEqual(-1, index.height)
+            self.assertEqual(1, index.update(self.blockchain,
+                                             self.block_indexes[:2],
+                                             workers=1))
+            self.assertEqual([(0, 0, OUTPUT), (1, 0, OUTPUT), (1, 1, INPUT)],
+                             index.get(COINBASE_SCRIPT))
+
+            self.assertEqual(2, index.update(self.blockchain,
+                                             self.block_indexes, workers=1))
+            self.assertEqual(2, len(index.segments))
+
+        with AddressIndex(self.path) as index:
+            self.assertEqual(2, index.height)
+            expected = [(0, 0, OUTPUT), (1, 0, OUTPUT), (1, 1, INPUT),
+                        (2, 0, OUTPUT)]
+            self.assertEqual(expected, index.get(COINBASE_SCRIPT))
+            self.assertEqual([(1, 1, OUTPUT), (2, 1, INPUT)], index.get(P2SH))
+            self.assertEqual([], index.get(b"\x6a"))
+
+            index.compact()
+            self.assertEqual(1, len(index.segments))
+            self.assertEqual(2, index.height)
+            self.assertEqual(expected, index.get(COINBASE_SCRIPT))
+
+            txs = list(index.get_transactions(self.blockchain,
+                                              self.block_indexes, P2SH))
+            self.assertEqual([1, 2], [height for height, _, _ in txs])
+            self.assertEqual([OUTPUT, INPUT], [d for _, d, _ in txs])
+            self.assertEqual(P2SH, txs[0][2].outputs[0].script.hex)
+
+    def test_parallel(self):
+        with AddressIndex(self.path) as index:
+            index.update(self.blockchain, self.block_indexes, workers=2,
+                         chunk_size=1, max_records=2)
+            self.assertEqual(4, len(index.get(COINBASE_SCRIPT)))
+
+    def test_missing_undo(self):
+        self.block_indexes[2].undo_pos = -1
+        with AddressIndex(self.path) as index:
+            self.assertEqual(1, index.update(self.blockchain,
+                                             self.block_indexes[:2],
+                                             workers=1))
+            with self.assertRaises(Exception):
+                index.update(self.blockchain, self.block_indexes, workers=1)
+            self.assertEqual(1, index.height)
+
+    def test_interrupted_compaction(self):
+        with AddressIndex(self.path) as index:
+            for end in (1, 2, 3):
+                index.update(self.blockchain, self.block_indexes[:end],
+                             workers=1)
+            expected = index.get(COINBASE_SCRIPT)
+
+            # the merged segment is committed, its sources are not removed
+            segments = list(index.segments)
+            index._write_segment(
+                _concat_postings(heapq.merge(*[iter(s) for s in segments],
+                                             key=lambda item: item[0])),
+                index.height, [segment.name for segment in segments])
+            self.assertEqual(4, len(os.listdir(self.path)) // 2)
+
+        with AddressIndex(self.path) as index:
+            self.assertEqual(1, len(index.segments))
+            self.assertEqual(2, index.height)
+            self.assertEqual(expected, index.get(COINBASE_SCRIPT))
+            self.assertEqual(["segment-000003.keys",
+                              "segment-000003.postings"],
+                             sorted(os.listdir(self.path)))
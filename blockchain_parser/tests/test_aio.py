@@ -0,0 +1,117 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import asyncio
+import tempfile
+import unittest
+
+from blockchain_parser.aio import aiter_blocks
+from blockchain_parser.blockchain import Blockchain
+from .utils import write_chain, make_coinbase
+
+
+class TestAsyncBlocks(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([make_coinbase(i)], []) for i in range(20)])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_blocks(self):
+        async def collect(blocks):
+            return [block async for block in blocks]
+
+        blocks = asyncio.run(collect(self.blockchain.aiter_ordered_blocks(
+            self.block_indexes, start=5, end=10)))
+        self.assertEqual([blkIdx.hash for blkIdx in self.block_indexes[5:10]],
+                         [block.hash for block in blocks])
+        self.assertEqual(list(range(5, 10)),
+                         [block.height for block in blocks])
+        self.assertIsNotNone(blocks[0]._transactions)
+
+        blocks = asyncio.run(collect(self.blockchain.aiter_unordered_blocks(
+            parse=False)))
+        self.assertEqual([blkIdx.hash for blkIdx in self.block_indexes],
+                         [block.hash for block in blocks])
+        self.assertIsNone(blocks[0]._transactions)
+
+    def test_backpressure(self):
+        read = []
+
+        def blocks():
+            for block in self.blockchain.get_unordered_blocks():
+                read.append(block)
+                yield block
+
+        async def consume():
+            ahead = []
+            async for block in aiter_blocks(blocks(), prefetch=3,
+                                            parse=False):
+                await asyncio.sleep(0.01)
+                ahead.append(len(read) - read.index(block) - 1)
+            return ahead
+
+        ahead = asyncio.run(consume())
+        self.assertEqual(20, len(ahead))
+        # the prefetched blocks and the one waiting for room in the queue
+        self.assertLessEqual(max(ahead), 4)
+        self.assertGreaterEqual(max(ahead), 3)
+
+    def test_cancellation(self):
+        closed = []
+
+        def blocks():
+            try:
+                for block in self.blockchain.get_unordered_blocks():
+                    yield block
+            finally:
+                closed.append(True)
+
+        async def stop_early():
+            iterator = aiter_blocks(blocks(), prefetch=2)
+            async for block in iterator:
+                break
+            await iterator.aclose()
+            return list(closed)
+
+        async def cancel():
+            async def consume():
+                iterator = aiter_blocks(blocks(), prefetch=2)
+                try:
+                    async for block in iterator:
+                        await asyncio.sleep(1)
+                finally:
+                    await iterator.aclose()
+
+            task = asyncio.ensure_future(consume())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return list(closed)
+
+        self.assertEqual([True], asyncio.run(stop_early()))
+        closed.clear()
+        self.assertEqual([True], asyncio.run(cancel()))
+
+    def test_error(self):
+        def blocks():
+            yield from self.blockchain.get_unordered_blocks()
+            raise ValueError("corrupted")
+
+        async def consume():
+            return [block async for block in aiter_blocks(blocks())]
+
+        with self.assertRaises(ValueError):
+            asyncio.run(consume())
@@ -10,10 +10,12 @@
 # in the LICENSE file.
 
 import unittest
+from binascii import a2b_hex
 from datetime import datetime
 
-from .utils import read_test_data
+from .utils import read_test_data, make_header, make_block, COINBASE
 from blockchain_parser.block import Block
+from blockchain_parser.transaction import Transaction
 
 
 class TestBlock(unittest.TestCase):
@@ -24,17 +26,22 @@ class TestBlock(unittest.TestCase):
         block_hash = "000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1" \
                      "b60a8ce26f"
         self.assertEqual(block_hash, block.hash)
+        self.assertEqual(a2b_hex(block_hash)[::-1], block.hash_bytes)
         self.assertEqual(486604799, block.header.bits)
         merkle_root = "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127" \
                       "b7afdeda33b"
         self.assertEqual(merkle_root, block.header.merkle_root)
+        self.assertEqual(a2b_hex(merkle_root)[::-1],
+                         block.header.merkle_root_bytes)
         self.assertEqual(2083236893, block.header.nonce)
         self.assertEqual(1, block.header.version)
         self.assertEqual(1, block.header.difficulty)
         self.assertEqual(285, block.size)
-        self.assertEqual(datetime.utcfromtimestamp(1231006505),
+        self.assertEqual(datetime(2009, 1, 3, 18, 15, 5),
                          block.header.timestamp)
         self.assertEqual("0" * 64, block.header.previous_block_hash)
+        self.assertEqual(b"\x00" * 32,
+                         block.header.previous_block_hash_bytes)
 
         for tx in block.transactions:
             self.assertEqual(1, tx.version)
@@ -47,4 +54,31 @@ class TestBlock(unittest.TestCase):
             self.assertEqual(0xffffffff, tx.inputs[0].sequence_number)
             self.assertTrue("ffff001d" in tx.inputs[0].script.value)
             self.assertEqual("0" * 64, tx.inputs[0].transaction_hash)
+            self.assertEqual(b"\x00" * 32,
+                             tx.inputs[0].transaction_hash_bytes)
+            self.assertTrue(tx.is_coinbase())
             self.assertEqual(50 * 100000000, tx.outputs[0].value)
+
+    def test_transaction_at(self):
+        header = make_header()
+        raw_txs = [COINBASE, read_test_data("size_non_segwit.txt"),
+                   read_test_data("segwit.txt")]
+        block = Block(make_block(header, raw_txs))
+
+        offsets = block.transaction_offsets
+        self.assertEqual(4, len(offsets))
+        self.assertEqual(81, offsets[0])
+        self.assertEqual(block.size, offsets[-1])
+
+        tx = block.transaction_at(2)
+        self.assertEqual(Transaction(raw_txs[2]).txid, tx.txid)
+        self.assertIsNone(tx._inputs)
+        self.assertEqual(Transaction(raw_txs[1]).txid,
+                         block.transaction_at(-2).txid)
+        with self.assertRaises(IndexError):
+            block.transaction_at(3)
+
+        self.assertEqual([Transaction(raw).txid for raw in raw_txs],
+                         [tx.txid for tx in block.iter_transactions()])
+        self.assertEqual([tx.txid for tx in block.transactions],
+                         [tx.txid for tx in block.iter_transactions()])
@@ -0,0 +1,100 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import pickle
+import tempfile
+import unittest
+from datetime import datetime
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.index import DBBlockIndex
+from blockchain_parser.utils import double_sha256, format_hash
+from .utils import make_header, encode_block_index
+
+# timestamps of the blocks, which are not monotonic
+TIMES = [1000, 1600, 1500, 2200, 2800, 2700, 2750, 3400]
+
+
+def header_chain(times):
+    """Returns the DBBlockIndex of a chain of headers whose blocks were not
+    saved"""
+    block_indexes = []
+    prev_hash = b"\x00" * 32
+    for height, time in enumerate(times):
+        header = make_header(prev_hash, time, nonce=height)
+        prev_hash = double_sha256(header)
+        block_indexes.append(DBBlockIndex(
+            format_hash(prev_hash), encode_block_index(height, header, 1)))
+    return block_indexes
+
+
+class TestHeaders(unittest.TestCase):
+    def setUp(self):
+        # the directory of .blk files does not exist, headers are read
+        # from the index only
+        self.blockchain = Blockchain("/nonexistent")
+        self.block_indexes = header_chain(TIMES)
+
+    def test_get_ordered_headers(self):
+        headers = list(self.blockchain.get_ordered_headers(
+            self.block_indexes))
+        self.assertEqual(list(range(len(TIMES))),
+                         [header.height for header in headers])
+        self.assertEqual([blkIdx.hash for blkIdx in self.block_indexes],
+                         [header.hash for header in headers])
+        self.assertEqual(self.block_indexes[2].hash,
+                         headers[3].previous_block_hash)
+        self.assertEqual(0x207fffff, headers[0].bits)
+
+        headers = list(self.blockchain.get_ordered_headers(
+            self.block_indexes, start=7, end=5))
+        self.assertEqual([6, 5], [header.height for header in headers])
+
+    def test_get_height_for_time(self):
+        def height(time):
+            return self.blockchain.get_height_for_time(self.block_indexes,
+                                                       time)
+
+        self.assertEqual(0, height(0))
+        self.assertEqual(0, height(1000))
+        self.assertEqual(1, height(1001))
+        # block 2 is older than block 1
+        self.assertEqual(3, height(1601))
+        self.assertEqual(4, height(2750))
+        self.assertEqual(7, height(3400))
+        self.assertIsNone(height(3401))
+        self.assertEqual(0, height(datetime(1970, 1, 1, 0, 16, 40)))
+
+    def test_get_blocks_between(self):
+        def heights(start_time, end_time):
+            return [blkIdx.height for blkIdx in self.blockchain.
+                    get_blocks_between(self.block_indexes, start_time,
+                                       end_time)]
+
+        self.assertEqual([1, 2, 3], heights(1100, 2200))
+        self.assertEqual([4, 5, 6], heights(2700, 3000))
+        self.assertEqual([], heights(3500, 4000))
+        self.assertEqual(list(range(len(TIMES))), heights(0, 4000))
+
+    def test_old_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = os.path.join(tmpdir, "cache.pickle")
+            block_indexes = header_chain(TIMES)
+            for blkIdx in block_indexes:
+                del blkIdx.header
+            with open(cache, "wb") as f:
+                pickle.dump(block_indexes, f)
+
+            # the index is read again as the cache lacks the headers
+            with self.assertRaises(Exception):
+                self.blockchain.get_block_indexes(
+                    os.path.join(tmpdir, "index"), cache)
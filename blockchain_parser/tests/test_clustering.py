@@ -0,0 +1,170 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.clustering import AddressClustering, UnionFind
+from blockchain_parser.output import Output
+from .utils import write_chain, make_tx, make_coinbase
+
+
+def p2pkh(i):
+    return b"\x76\xa9\x14" + bytes([i]) * 20 + b"\x88\xac"
+
+
+def address(i):
+    raw = b"\x00" * 8 + bytes([len(p2pkh(i))]) + p2pkh(i)
+    return Output(raw).addresses[0]
+
+
+def spending_tx(n_inputs):
+    return make_tx([(b"\x42" * 32, vout) for vout in range(n_inputs)],
+                   [(1000, p2pkh(99))])
+
+
+class TestUnionFind(unittest.TestCase):
+    def test_union_many(self):
+        rng = random.Random(1)
+        n = 500
+        pairs = [(rng.randrange(n), rng.randrange(n)) for _ in range(300)]
+
+        # reference components
+        labels = list(range(n))
+        for a, b in pairs:
+            la, lb = labels[a], labels[b]
+            if la != lb:
+                labels = [la if label == lb else label for label in labels]
+
+        union_find = UnionFind(capacity=16)
+        union_find.grow(n)
+        a, b = zip(*pairs)
+        for start in range(0, len(pairs), 64):
+            union_find.union_many(a[start:start + 64], b[start:start + 64])
+        roots = union_find.find_many(np.arange(n))
+        for i in range(n):
+            for j in (0, rng.randrange(n)):
+                self.assertEqual(labels[i] == labels[j], roots[i] == roots[j])
+
+    def test_union(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            union_find = UnionFind(tmpdir, capacity=2)
+            union_find.grow(5)
+            self.assertTrue(union_find.union(0, 1))
+            self.assertTrue(union_find.union(3, 1))
+            self.assertFalse(union_find.union(0, 3))
+            union_find.flush()
+
+            union_find = UnionFind(tmpdir, count=5)
+            self.assertEqual(union_find.find(0), union_find.find(3))
+            self.assertNotEqual(union_find.find(0), union_find.find(4))
+
+    def test_flush(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            union_find = UnionFind(tmpdir, capacity=2)
+            union_find.grow(4)
+            union_find.union(0, 1)
+            union_find.flush({"height": 7})
+
+            # changes which are not flushed do not reach the files
+            union_find.grow(6)
+            union_find.union(2, 5)
+            union_find.union(1, 3)
+            union_find = UnionFind(tmpdir)
+            self.assertEqual(4, len(union_find))
+            self.assertEqual({"height": 7}, union_find.meta)
+            self.assertEqual(union_find.find(0), union_find.find(1))
+            self.assertNotEqual(union_find.find(0), union_find.find(3))
+
+            # a flush interrupted after its journal was written is applied
+            union_find.union(0, 2)
+            union_find._replay = lambda: None
+            union_find.flush({"height": 8})
+            self.assertEqual(["journal.npz", "meta.json", "parent.dat",
+                              "rank.dat"], sorted(os.listdir(tmpdir)))
+            union_find = UnionFind(tmpdir)
+            self.assertEqual({"height": 8}, union_find.meta)
+            self.assertEqual(union_find.find(0), union_find.find(2))
+            self.assertNotIn("journal.npz", os.listdir(tmpdir))
+
+
+class TestAddressClustering(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([make_coinbase(0)], []),
+            # addresses 1 and 2 spent together, 3 alone
+            ([make_coinbase(1), spending_tx(2), spending_tx(1)],
+             [[(0, False, 1000, p2pkh(1)), (0, False, 1000, p2pkh(2))],
+              [(0, False, 1000, p2pkh(3))]]),
+            ([make_coinbase(2)], []),
+            # addresses 2 and 4 spent together, then 5 and 6
+            ([make_coinbase(3), spending_tx(2), spending_tx(2)],
+             [[(0, False, 1000, p2pkh(4)), (0, False, 1000, p2pkh(2))],
+              [(0, False, 1000, p2pkh(5)), (0, False, 1000, p2pkh(6))]]),
+        ])
+        self.path = os.path.join(self.tmpdir.name, "clusters")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def assertClusters(self, clustering, clusters):
+        for cluster in clusters:
+            ids = set(clustering.get_cluster(address(i)) for i in cluster)
+            self.assertEqual(1, len(ids))
+            self.assertIsNotNone(ids.pop())
+        roots = set(clustering.get_cluster(address(c[0])) for c in clusters)
+        self.assertEqual(len(clusters), len(roots))
+
+    def test_update(self):
+        with AddressClustering(self.path) as clustering:
+            self.assertEqual(1, clustering.update(
+                self.blockchain, self.block_indexes, end=1))
+            self.assertClusters(clustering, [[1, 2], [3]])
+            self.assertIsNone(clustering.get_cluster(address(4)))
+
+        with AddressClustering(self.path) as clustering:
+            self.assertEqual(3, clustering.update(
+                self.blockchain, self.block_indexes, checkpoint_interval=1))
+            self.assertClusters(clustering, [[1, 2, 4], [3], [5, 6]])
+
+            assignments = clustering.assignments()
+            self.assertEqual(6, len(assignments))
+            self.assertEqual(3, len(set(assignments)))
+            filename = os.path.join(self.tmpdir.name, "assignments.npy")
+            clustering.write_assignments(filename)
+            self.assertEqual(list(assignments), list(np.load(filename)))
+
+    def test_restore(self):
+        with AddressClustering(self.path) as clustering:
+            clustering.update(self.blockchain, self.block_indexes, end=1)
+
+        # an update interrupted after processing the last block
+        clustering = AddressClustering(self.path)
+        for block in self.blockchain.get_ordered_blocks(self.block_indexes,
+                                                        start=2, undo=True):
+            clustering._add_block(block)
+        clustering.close()
+
+        with AddressClustering(self.path) as clustering:
+            self.assertEqual(1, clustering.height)
+            self.assertEqual(3, len(clustering.addresses))
+            self.assertIsNone(clustering.get_cluster(address(4)))
+            self.assertClusters(clustering, [[1, 2], [3]])
+
+            clustering.update(self.blockchain, self.block_indexes)
+            self.assertClusters(clustering, [[1, 2, 4], [3], [5, 6]])
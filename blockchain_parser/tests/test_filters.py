@@ -0,0 +1,125 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+from binascii import a2b_hex
+from datetime import datetime
+
+from blockchain_parser.block import Block
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.filters import BlockFilter, OutputFilter, \
+    get_output_type
+from blockchain_parser.output import Output
+from blockchain_parser.transaction import Transaction
+from blockchain_parser.utils import encode_compactsize
+from .utils import write_chain, make_tx, make_coinbase, make_header, \
+    read_test_data
+
+P2TR = a2b_hex("5120" + "33" * 32)
+OP_RETURN = a2b_hex("6a0548656c6c6f")
+P2PKH = a2b_hex("76a914" + "11" * 20 + "88ac")
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestFilters(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.txs = [make_tx([(b"\x42" * 32, i)], outputs) for i, outputs in
+                    enumerate([[(1000, P2PKH)],
+                               [(1000, P2PKH), (0, OP_RETURN)],
+                               [(50000, P2TR)]])]
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([make_coinbase(i)] + self.txs, []) for i in range(5)])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_output_types(self):
+        scripts = [P2TR, OP_RETURN, P2PKH, a2b_hex("6a4c"), b"",
+                   a2b_hex("0014" + "22" * 20), a2b_hex("0020" + "22" * 32),
+                   a2b_hex("a914" + "22" * 20 + "87")]
+        for filename in os.listdir(os.path.join(dir_path, "data")):
+            raw = read_test_data(filename)
+            if filename == "genesis_block.txt":
+                transactions = Block(raw).transactions
+            elif filename == "invalid_tx.txt":
+                continue
+            else:
+                transactions = [Transaction(raw)]
+            for tx in transactions:
+                scripts += [output.script.hex for output in tx.outputs]
+
+        for script in scripts:
+            output = Output.from_hex(b"\x00" * 8 +
+                                     encode_compactsize(len(script)) + script)
+            self.assertEqual(output.type, get_output_type(memoryview(script)))
+
+    def test_output_filter(self):
+        raw_block = self.blockchain.get_ordered_blocks(self.block_indexes,
+                                                       end=1)
+        block = next(raw_block)
+
+        def txids(output_filter, lazy=True):
+            return [tx.txid for tx in block.iter_transactions(
+                lazy, output_filter=output_filter)]
+
+        tx_ids = [Transaction(tx).txid for tx in self.txs]
+        self.assertEqual([tx_ids[1]], txids(OutputFilter(["OP_RETURN"])))
+        self.assertEqual(tx_ids[1:], txids(OutputFilter(["OP_RETURN",
+                                                         "p2tr"])))
+        self.assertEqual([tx_ids[2]], txids(OutputFilter(min_value=10000,
+                                                          max_value=100000)))
+        self.assertEqual([tx_ids[1]], txids(OutputFilter(
+            ["pubkeyhash", "OP_RETURN"], max_value=0)))
+        self.assertEqual(tx_ids[:2], txids(OutputFilter(
+            predicate=lambda value, script: bytes(script) == P2PKH)))
+        self.assertEqual([], txids(OutputFilter(["multisig"])))
+
+        transactions = list(block.iter_transactions(
+            False, OutputFilter(["p2tr"])))
+        self.assertEqual(P2TR, transactions[0].outputs[0].script.hex)
+
+    def test_ordered_blocks(self):
+        def heights(block_filter, **kwargs):
+            return [block.height for block in self.blockchain.
+                    get_ordered_blocks(self.block_indexes,
+                                       block_filter=block_filter, **kwargs)]
+
+        self.assertEqual([1, 2, 3], heights(BlockFilter(1, 3)))
+        self.assertEqual([3, 2], heights(BlockFilter(2, 3), start=4, end=0))
+        self.assertEqual([2, 3, 4], heights(BlockFilter(
+            start_time=1231006505 + 1200)))
+        self.assertEqual([0, 1], heights(BlockFilter(
+            end_time=datetime(2009, 1, 3, 18, 25, 5))))
+        self.assertEqual([0, 2, 4], heights(BlockFilter(
+            predicate=lambda header: header.nonce % 2 == 0)))
+        self.assertEqual([], heights(BlockFilter(version_bits=[1])))
+
+    def test_unordered_blocks(self):
+        blocks = list(self.blockchain.get_unordered_blocks(BlockFilter(
+            start_time=1231006505 + 1800)))
+        self.assertEqual([3, 4], [block.header.nonce for block in blocks])
+        self.assertEqual(1 + len(self.txs), blocks[0].n_transactions)
+        with self.assertRaises(Exception):
+            next(self.blockchain.get_unordered_blocks(BlockFilter(1)))
+
+    def test_version_bits(self):
+        block_filter = BlockFilter(version_bits=[1, 4])
+        self.assertTrue(block_filter.match_header(
+            make_header(version=0x20000012)))
+        self.assertFalse(block_filter.match_header(
+            make_header(version=0x20000002)))
+        self.assertFalse(block_filter.match_header(
+            make_header(version=0x00000012)))
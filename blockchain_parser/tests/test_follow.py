@@ -0,0 +1,267 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import multiprocessing
+import os
+import struct
+import tempfile
+import time
+import unittest
+
+from blockchain_parser.block import Block
+from blockchain_parser.blockchain import Blockchain, BITCOIN_CONSTANT, \
+    _FrameScanner
+from blockchain_parser.follow import ChainTracker, Reorg, is_complete_block
+from blockchain_parser.utils import double_sha256
+from .utils import make_header, make_block, make_coinbase, write_blk_file, \
+    encode_block_index, write_leveldb
+
+
+def make_chain(n, prev_hash=b"\x00" * 32, first_height=0, nonce=0):
+    blocks = []
+    for height in range(first_height, first_height + n):
+        header = make_header(prev_hash, 1231006505 + 600 * height,
+                             nonce=nonce)
+        blocks.append(make_block(header, [make_coinbase(height)]))
+        prev_hash = double_sha256(header)
+    return blocks
+
+
+def block_hash(raw_block):
+    return double_sha256(raw_block[:80])
+
+
+def frame(raw_block):
+    return BITCOIN_CONSTANT + struct.pack("<I", len(raw_block)) + raw_block
+
+
+def append_data(steps):
+    """Appends data to files after a delay, as bitcoind would"""
+    for delay, path, data in steps:
+        time.sleep(delay)
+        with open(path, "ab") as f:
+            f.write(data)
+
+
+class TestChainTracker(unittest.TestCase):
+    def test_reorg(self):
+        chain = make_chain(4)
+        fork = make_chain(3, block_hash(chain[1]), 2, nonce=1)
+        tracker = ChainTracker()
+
+        self.assertEqual((None, None), tracker.add(block_hash(chain[0]),
+                                                   chain[0][4:36]))
+        self.assertIsNone(tracker.tip)
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        write_leveldb(tmpdir.name, [(b"b" + block_hash(chain[0]),
+                                     encode_block_index(0, chain[0][:80], 1))])
+        tracker = ChainTracker(tmpdir.name)
+        heights = [tracker.add(block_hash(raw), raw[4:36])
+                   for raw in chain[1:] + fork[:2]]
+        self.assertEqual([(1, None), (2, None), (3, None), (2, None),
+                          (3, None)], heights)
+        self.assertEqual(block_hash(chain[3]), tracker.tip)
+
+        height, reorg = tracker.add(block_hash(fork[2]), fork[2][4:36])
+        self.assertEqual(4, height)
+        self.assertEqual(1, reorg.fork_height)
+        self.assertEqual([block_hash(raw) for raw in chain[2:]],
+                         reorg.disconnected)
+        self.assertEqual([block_hash(raw) for raw in fork],
+                         reorg.connected)
+
+    def test_orphans(self):
+        chain = make_chain(4)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        write_leveldb(tmpdir.name, [(b"b" + block_hash(chain[0]),
+                                     encode_block_index(0, chain[0][:80], 1))])
+        tracker = ChainTracker(tmpdir.name)
+        # the children of a block seen before it wait for it
+        self.assertEqual((None, None), tracker.add(block_hash(chain[3]),
+                                                   chain[3][4:36]))
+        self.assertEqual((None, None), tracker.add(block_hash(chain[2]),
+                                                   chain[2][4:36]))
+        self.assertEqual((1, None), tracker.add(block_hash(chain[1]),
+                                                chain[1][4:36]))
+        self.assertEqual(3, tracker.height)
+        self.assertEqual(block_hash(chain[3]), tracker.tip)
+
+
+    def test_bip34(self):
+        chain = make_chain(4, first_height=10)
+        tracker = ChainTracker(bip34_height=11)
+        heights = [tracker.add(block_hash(raw), raw[4:36], Block(raw))[0]
+                   for raw in chain]
+        # the coinbase height of the first block is below bip34_height
+        self.assertEqual([None, 11, 12, 13], heights)
+        self.assertEqual(block_hash(chain[3]), tracker.tip)
+
+    def test_max_blocks(self):
+        chain = make_chain(20)
+        tracker = ChainTracker(max_blocks=5)
+        for raw in chain[1:]:
+            self.assertEqual((None, None), tracker.add(block_hash(raw),
+                                                       raw[4:36]))
+        self.assertEqual(5, len(tracker._blocks))
+        self.assertEqual(5, sum(len(children) for children in
+                                tracker._orphans.values()))
+
+    def test_index_handle(self):
+        chain = make_chain(3)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        write_leveldb(tmpdir.name, [
+            (b"b" + block_hash(raw), encode_block_index(i, raw[:80], 1))
+            for i, raw in enumerate(chain[:2])])
+        tracker = ChainTracker(tmpdir.name)
+        self.assertEqual(1, tracker.add(block_hash(chain[1]),
+                                        chain[1][4:36])[0])
+        db = tracker._db
+        # found blocks do not reopen the index, missing ones do
+        fork = make_chain(1, block_hash(chain[0]), 1, nonce=1)[0]
+        self.assertEqual(1, tracker.add(block_hash(fork), fork[4:36])[0])
+        self.assertIs(db, tracker._db)
+        orphan = make_chain(1, b"\x11" * 32, 5)[0]
+        self.assertIsNone(tracker.add(block_hash(orphan), orphan[4:36])[0])
+        self.assertIsNot(db, tracker._db)
+        tracker.close()
+        self.assertIsNone(tracker._db)
+
+
+class TestFollow(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.chain = make_chain(5)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def blk_file(self, file_no):
+        return os.path.join(self.tmpdir.name, "blk%05d.dat" % file_no)
+
+    def test_is_complete_block(self):
+        raw = self.chain[0]
+        self.assertTrue(is_complete_block(raw))
+        self.assertFalse(is_complete_block(raw[:-1]))
+        self.assertFalse(is_complete_block(raw[:81] + b"\x00" *
+                                           (len(raw) - 81)))
+
+    def test_follow(self):
+        fork = make_chain(2, block_hash(self.chain[3]), 4, nonce=1)
+        write_blk_file(self.blk_file(0), self.chain[:2])
+        index = os.path.join(self.tmpdir.name, "index")
+        write_leveldb(index, [(b"b" + block_hash(self.chain[1]),
+                               encode_block_index(1, self.chain[1][:80], 1))])
+
+        # block 2 is written in two steps, the first file is left with zeros
+        # preallocated, a stale block 4 precedes a longer branch
+        partial = frame(self.chain[2])
+        steps = [(0.2, self.blk_file(0), partial[:100]),
+                 (0.3, self.blk_file(0), partial[100:]),
+                 (0.1, self.blk_file(0), frame(self.chain[3]) +
+                  frame(self.chain[4]) + b"\x00" * 1000),
+                 (0.2, self.blk_file(1), frame(fork[0])),
+                 (0.2, self.blk_file(1), frame(fork[1]))]
+        writer = multiprocessing.Process(target=append_data, args=(steps,))
+        writer.start()
+        try:
+            items = list(self.blockchain.follow(index=index,
+                                                poll_interval=0.05,
+                                                idle_timeout=1))
+        finally:
+            writer.join()
+
+        reorgs = [item for item in items if isinstance(item, Reorg)]
+        blocks = [item for item in items if not isinstance(item, Reorg)]
+        self.assertEqual([block_hash(raw) for raw in self.chain[2:] + fork],
+                         [block.hash_bytes for block in blocks])
+        self.assertEqual([2, 3, 4, 4, 5], [block.height for block in blocks])
+        self.assertEqual(["blk00000.dat"] * 3 + ["blk00001.dat"] * 2,
+                         [block.blk_file for block in blocks])
+        self.assertEqual(8, blocks[3].data_pos)
+        self.assertEqual(1, len(reorgs))
+        self.assertIs(reorgs[0], items[-2])
+        self.assertEqual(3, reorgs[0].fork_height)
+        self.assertEqual([block_hash(self.chain[4])], reorgs[0].disconnected)
+
+    def test_start_after(self):
+        positions = write_blk_file(self.blk_file(0), self.chain[:3])
+        write_blk_file(self.blk_file(1), self.chain[3:])
+
+        blocks = list(self.blockchain.follow(("blk00000.dat", positions[1]),
+                                             poll_interval=0.01,
+                                             idle_timeout=0))
+        self.assertEqual([block_hash(raw) for raw in self.chain[2:]],
+                         [block.hash_bytes for block in blocks])
+        self.assertTrue(all(block.height is None for block in blocks))
+
+        blocks = list(self.blockchain.follow((0, -1), poll_interval=0.01,
+                                             idle_timeout=0))
+        self.assertEqual(5, len(blocks))
+
+    def test_skip_corrupted(self):
+        with open(self.blk_file(0), "wb") as f:
+            f.write(frame(self.chain[0][:81] + b"\x00" * 50))
+            f.write(frame(self.chain[1]))
+        blocks = list(self.blockchain.follow((0, -1), poll_interval=0.01,
+                                             idle_timeout=0, max_retries=2))
+        self.assertEqual([block_hash(self.chain[1])],
+                         [block.hash_bytes for block in blocks])
+
+        # a complete file is not polled again
+        write_blk_file(self.blk_file(1), self.chain[2:3])
+        started = time.monotonic()
+        blocks = list(self.blockchain.follow((0, -1), poll_interval=1,
+                                             idle_timeout=0))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([block_hash(raw) for raw in self.chain[1:3]],
+                         [block.hash_bytes for block in blocks])
+
+    def test_incomplete_tail(self):
+        # the last block of the last file is not skipped while it may
+        # still be written
+        with open(self.blk_file(0), "wb") as f:
+            f.write(frame(self.chain[0]))
+            f.write(frame(self.chain[1])[:100] + b"\x00" * 1000)
+        blocks = []
+        with self.assertRaises(Exception):
+            for block in self.blockchain.follow((0, -1), poll_interval=0.01,
+                                                idle_timeout=0,
+                                                max_retries=2):
+                blocks.append(block)
+        self.assertEqual([block_hash(self.chain[0])],
+                         [block.hash_bytes for block in blocks])
+
+    def test_frame_scanner(self):
+        partial = frame(self.chain[1])
+        with open(self.blk_file(0), "wb") as f:
+            f.write(frame(self.chain[0]) + partial[:100])
+        scanner = _FrameScanner(self.blk_file(0))
+        blocks = list(scanner.read(0))
+        self.assertEqual([8], [data_pos for data_pos, _ in blocks])
+        self.assertEqual(len(frame(self.chain[0])), scanner.pending)
+        self.assertFalse(scanner.has_block_after(scanner.pending))
+
+        # the mapping is kept until the file grows
+        data = scanner._data
+        self.assertEqual([], list(scanner.read(scanner.pending)))
+        self.assertIs(data, scanner._data)
+        with open(self.blk_file(0), "ab") as f:
+            f.write(partial[100:])
+        self.assertEqual([self.chain[1]], [raw for _, raw in
+                                           scanner.read(scanner.pending)])
+        self.assertIsNot(data, scanner._data)
+        self.assertIsNone(scanner.pending)
+        scanner.close()
@@ -0,0 +1,109 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import tempfile
+import unittest
+
+import numpy as np
+from bitcoin.core import CBlockHeader
+
+from blockchain_parser.block import Block
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.header_stats import headers_from_raw, \
+    headers_from_index, headers_from_blocks, get_targets, get_difficulties, \
+    get_block_work, get_chainwork, get_median_time_past, get_hashrates, \
+    get_retarget_windows, RETARGET_INTERVAL, TARGET_TIMESPAN
+from .utils import read_test_data, make_header, write_chain, make_coinbase
+
+BITS = [0x1d00ffff, 0x1b0404cb, 0x170331db, 0x207fffff, 0x1a05db8b]
+
+
+def header_array(times, bits=0x1d00ffff, first_height=0):
+    heights = range(first_height, first_height + len(times))
+    return headers_from_raw([make_header(time=t, bits=bits, nonce=h)
+                             for h, t in zip(heights, times)], heights)
+
+
+class TestHeaderStats(unittest.TestCase):
+    def test_headers_from_raw(self):
+        genesis = Block(read_test_data("genesis_block.txt"))
+        headers = headers_from_raw([genesis.hex, genesis.hex[:80]])
+        self.assertEqual([-1, -1], list(headers["height"]))
+        self.assertEqual(genesis.header.nonce, headers["nonce"][0])
+        self.assertEqual(genesis.header.bits, headers["bits"][1])
+        self.assertEqual(1231006505, headers["time"][0])
+        self.assertEqual(genesis.header.merkle_root_bytes,
+                         bytes(headers["merkle_root"][0]))
+        self.assertEqual(b"\x00" * 32, bytes(headers["prev_hash"][0]))
+
+    def test_headers_from_index_and_blocks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            block_indexes = write_chain(tmpdir, [
+                ([make_coinbase(i)], []) for i in range(3)])
+            blockchain = Blockchain(tmpdir)
+            from_index = headers_from_index(blockchain, block_indexes)
+            from_blocks = headers_from_blocks(
+                blockchain.get_ordered_blocks(block_indexes))
+        self.assertEqual([0, 1, 2], list(from_index["height"]))
+        self.assertEqual(from_index.tobytes(), from_blocks.tobytes())
+
+    def test_difficulty(self):
+        for bits, difficulty in zip(BITS, get_difficulties(BITS)):
+            self.assertAlmostEqual(1, difficulty /
+                                   CBlockHeader.calc_difficulty(bits))
+
+        targets = get_targets(BITS)
+        self.assertEqual(0xffff * 2.0 ** 208, targets[0])
+        self.assertEqual(0x7fffff * 2.0 ** 232, targets[3])
+
+        # bitcoind's chainwork after the genesis block and block 1
+        self.assertAlmostEqual(1, get_block_work(BITS[:1])[0] / 0x100010001)
+        chainwork = get_chainwork([0x1d00ffff, 0x1d00ffff])
+        self.assertAlmostEqual(1, chainwork[1] / 0x200020002)
+
+    def test_median_time_past(self):
+        rng = np.random.RandomState(0)
+        times = 1231006505 + np.cumsum(rng.randint(-3000, 6000, 50))
+        mtp = get_median_time_past(times)
+        for i in range(len(times)):
+            window = sorted(times[max(0, i - 10):i + 1])
+            self.assertEqual(window[len(window) // 2], mtp[i])
+
+    def test_hashrates(self):
+        headers = header_array(1231006505 + 600 * np.arange(200))
+        hashrates = get_hashrates(headers)
+        self.assertTrue(np.isnan(hashrates[:120]).all())
+        # difficulty 1 blocks every 10 minutes
+        self.assertAlmostEqual(1, hashrates[150] / (0x100010001 / 600))
+
+    def test_retarget_windows(self):
+        # blocks twice as fast as expected in the first complete window
+        first_height = RETARGET_INTERVAL - 100
+        times = 1231006505 + np.concatenate([
+            600 * np.arange(100),
+            60000 + 300 * np.arange(RETARGET_INTERVAL),
+            60000 + 300 * RETARGET_INTERVAL + 600 * np.arange(10)])
+        headers = header_array(times, first_height=first_height)
+        windows = get_retarget_windows(headers)
+
+        self.assertEqual(3, len(windows))
+        self.assertEqual([first_height, RETARGET_INTERVAL,
+                          2 * RETARGET_INTERVAL],
+                         list(windows["start_height"]))
+        self.assertEqual(2 * RETARGET_INTERVAL - 1, windows["end_height"][1])
+        self.assertEqual(300 * (RETARGET_INTERVAL - 1),
+                         windows["timespan"][1])
+        self.assertAlmostEqual(TARGET_TIMESPAN / (300 * 2015),
+                               windows["adjustment"][1])
+        self.assertTrue(np.isnan(windows["adjustment"][[0, 2]]).all())
+        self.assertEqual(1, windows["difficulty"][1])
+        self.assertAlmostEqual(1, windows["hashrate"][1] /
+                               (0x100010001 / 300))
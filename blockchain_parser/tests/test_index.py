@@ -1,6 +1,7 @@
 import unittest
 from binascii import a2b_hex
 
+from blockchain_parser.block_header import BlockHeader
 from blockchain_parser.index import DBBlockIndex
 from blockchain_parser.index import DBTransactionIndex
 
@@ -27,10 +28,22 @@ class TestDBIndex(unittest.TestCase):
         self.assertEqual(idx.undo_pos, 13497502)
         self.assertEqual(idx.version, 2)
         self.assertEqual(idx.nonce, 1101799037)
+        self.assertEqual(idx.time, 1417672971)
+        self.assertEqual(idx.bits, 0x181b7b74)
+        self.assertEqual(idx.header, value_hex[-80:])
+        self.assertEqual(idx.hash, BlockHeader(idx.header).hash)
         self.assertEqual(idx.prev_hash, "00000000000000000792a44ad057029301f3e"
                                         "b593a8e50c3805ffae1319275fb")
         self.assertEqual(idx.merkle_root, "e34721a2587695e74caf820006d2e8c1f5f"
                                           "54350b49d97e74b26f87ac66b1cc1")
+        self.assertEqual(idx.prev_hash_bytes, a2b_hex(idx.prev_hash)[::-1])
+        self.assertEqual(idx.merkle_root_bytes,
+                         a2b_hex(idx.merkle_root)[::-1])
+
+        # the hash can also be given in internal byte order
+        idx_bytes = DBBlockIndex(idx.hash_bytes, value_hex)
+        self.assertEqual(idx.hash, idx_bytes.hash)
+        self.assertEqual(a2b_hex(idx.hash)[::-1], idx_bytes.hash_bytes)
 
 
 class TestDBTransactionIndex(unittest.TestCase):
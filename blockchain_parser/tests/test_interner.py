@@ -0,0 +1,144 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import hashlib
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.interner import HashInterner, ScriptInterner, \
+    outpoint_key
+from blockchain_parser.transaction import Transaction
+from .utils import read_test_data
+
+
+def make_keys(n, seed=b""):
+    return [hashlib.sha256(seed + str(i).encode()).digest()
+            for i in range(n)]
+
+
+class TestHashInterner(unittest.TestCase):
+    def test_intern_many(self):
+        interner = HashInterner()
+        a, b, c = make_keys(3)
+        self.assertEqual([0, 1, 0, 2], list(interner.intern_many([a, b, a,
+                                                                  c])))
+        self.assertEqual([2, 0], list(interner.intern_many(c + a)))
+        self.assertEqual(3, len(interner))
+        self.assertEqual(b, interner[1])
+        self.assertEqual([1, -1], list(interner.lookup_many(
+            [b, make_keys(1, b"x")[0]])))
+        self.assertEqual(2, interner.lookup(c))
+        self.assertIsNone(interner.lookup(b"\x00" * 32))
+        self.assertEqual(3, interner.intern(b"\x00" * 32))
+        with self.assertRaises(IndexError):
+            interner[4]
+        with self.assertRaises(Exception):
+            interner.intern_many(b"\x00" * 33)
+
+    def test_grow(self):
+        interner = HashInterner(capacity=16)
+        keys = make_keys(5000)
+        for start in range(0, len(keys), 700):
+            ids = interner.intern_many(keys[start:start + 700])
+            self.assertEqual(list(range(start, start + len(ids))), list(ids))
+        self.assertEqual(list(range(5000)), list(interner.lookup_many(keys)))
+        self.assertEqual(keys[4321], interner[4321])
+
+    def test_persistence(self):
+        keys = make_keys(1000)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "txids")
+            with HashInterner(path, wide=True, capacity=16) as interner:
+                interner.intern_many(keys[:600])
+            with HashInterner(path) as interner:
+                self.assertEqual(600, len(interner))
+                self.assertEqual("uint64", interner.id_dtype.name)
+                self.assertEqual(list(range(1000)),
+                                 list(interner.intern_many(keys)))
+            with HashInterner(path) as interner:
+                self.assertEqual(keys[999], interner[999])
+                self.assertEqual(list(range(1000)),
+                                 list(interner.lookup_many(keys)))
+
+    def test_unclean_exit(self):
+        keys = make_keys(1000)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "txids")
+            interner = HashInterner(path, capacity=256)
+            interner.intern_many(keys[:100])
+            interner.flush()
+            # the table is grown and the keys written to the files, as
+            # the kernel may do, but the interner is not flushed
+            interner.intern_many(keys[100:900])
+            interner._keys.flush()
+            interner._table.flush()
+            del interner
+
+            # a read only interner recovers in memory, leaving the files
+            files = {}
+            for name in os.listdir(path):
+                with open(os.path.join(path, name), "rb") as f:
+                    files[name] = f.read()
+            with HashInterner(path, read_only=True) as interner:
+                self.assertEqual(100, len(interner))
+                self.assertEqual([-1, 99], list(interner.lookup_many(
+                    [keys[500], keys[99]])))
+                self.assertEqual([99],
+                                 list(interner.intern_many(keys[99:100])))
+                with self.assertRaises(Exception):
+                    interner.intern_many(keys[100:101])
+            for name, data in files.items():
+                with open(os.path.join(path, name), "rb") as f:
+                    self.assertEqual(data, f.read())
+            self.assertEqual(sorted(files), sorted(os.listdir(path)))
+
+            with HashInterner(path) as interner:
+                self.assertEqual(100, len(interner))
+                self.assertEqual([-1, 99], list(interner.lookup_many(
+                    [keys[500], keys[99]])))
+                self.assertEqual(list(range(1000)),
+                                 list(interner.intern_many(keys)))
+            self.assertEqual(["keys.dat", "meta.json", "table.0.dat"],
+                             sorted(os.listdir(path)))
+
+            # a table of the wrong size is rebuilt from the keys
+            with open(os.path.join(path, "table.0.dat"), "r+b") as f:
+                f.truncate(16)
+            with HashInterner(path) as interner:
+                self.assertEqual(list(range(1000)),
+                                 list(interner.lookup_many(keys)))
+
+    def test_outpoints(self):
+        interner = HashInterner(key_size=36, capacity=16)
+        txid = make_keys(1)[0]
+        outpoints = [outpoint_key(txid, vout) for vout in range(100)]
+        self.assertEqual(list(range(100)),
+                         list(interner.intern_many(outpoints)))
+        self.assertEqual(42, interner.lookup(outpoint_key(txid, 42)))
+
+    def test_transactions(self):
+        tx = Transaction(read_test_data("size_non_segwit.txt"))
+        interner = HashInterner()
+        interner.intern_many([tx.txid_bytes])
+        ids = interner.intern_many([i.transaction_hash_bytes
+                                    for i in tx.inputs])
+        self.assertEqual([1], list(ids))
+        self.assertEqual(tx.inputs[0].transaction_hash_bytes, interner[1])
+
+
+class TestScriptInterner(unittest.TestCase):
+    def test_intern_many(self):
+        interner = ScriptInterner()
+        scripts = [b"\x51", b"\x52", b"\x51", b""]
+        self.assertEqual([0, 1, 0, 2], list(interner.intern_many(scripts)))
+        self.assertEqual(1, interner.lookup(b"\x52"))
+        self.assertEqual(hashlib.sha256(b"\x51").digest(), interner[0])
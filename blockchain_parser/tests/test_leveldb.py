@@ -0,0 +1,110 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import random
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+from blockchain_parser import leveldb
+from blockchain_parser.leveldb import LevelDB, snappy_decompress
+
+from .utils import encode_leb128, encode_log_file, encode_write_batch
+
+try:
+    import plyvel
+except ImportError:
+    plyvel = None
+
+
+class TestLevelDB(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_snappy(self):
+        compressed = encode_leb128(189) + b"\x0cabcd" + b"\x2e\x04\x00" + \
+            b"\x0cXYZq" + b"\x11\x01" + b"\xf3\x01\x00\x00\x00" + \
+            b"\xf0\x63" + bytes(range(100))
+        expected = b"abcd" * 4 + b"XYZ" + b"q" * 70 + bytes(range(100))
+        with mock.patch.object(leveldb, "snappy", None):
+            self.assertEqual(expected, snappy_decompress(compressed))
+            self.assertEqual(expected, snappy_decompress(
+                memoryview(compressed)))
+            with self.assertRaises(Exception):
+                snappy_decompress(encode_leb128(8) + b"\x11\x05")
+
+    def test_log(self):
+        with open(os.path.join(self.path, "CURRENT"), "w") as f:
+            f.write("MANIFEST-000001\n")
+        with open(os.path.join(self.path, "MANIFEST-000001"), "wb") as f:
+            f.write(encode_log_file([b"\x02" + encode_leb128(3)]))
+        # log 2 predates the log number of the MANIFEST
+        with open(os.path.join(self.path, "000002.log"), "wb") as f:
+            f.write(encode_log_file([
+                encode_write_batch(1, [(b"bx", b"old")])]))
+        with open(os.path.join(self.path, "000003.log"), "wb") as f:
+            # the last record is being written
+            f.write(encode_log_file([
+                encode_write_batch(5, [(b"b1", b"one"), (b"b2", b"two"),
+                                       (b"t1", b"tx")]),
+                encode_write_batch(8, [(b"b1", b"uno")], [b"b2"]),
+            ]) + b"\x00" * 4 + struct.pack("<HB", 100, 1) + b"\x01")
+
+        with LevelDB(self.path) as db:
+            self.assertEqual(b"uno", db.get(b"b1"))
+            self.assertIsNone(db.get(b"b2"))
+            self.assertIsNone(db.get(b"bx"))
+            self.assertEqual(b"-", db.get(b"b3", b"-"))
+            self.assertEqual([(b"b1", b"uno")], db.iterator(prefix=b"b"))
+            self.assertEqual([(b"b1", b"uno"), (b"t1", b"tx")],
+                             db.iterator())
+
+    @unittest.skipIf(plyvel is None, "plyvel is not installed")
+    def test_plyvel(self):
+        rnd = random.Random(1)
+        expected = {}
+        # a small write buffer to spread the keys over several tables
+        db = plyvel.DB(self.path, create_if_missing=True, compression=None,
+                       write_buffer_size=64 * 1024)
+        try:
+            for i in range(10000):
+                key = rnd.choice([b"b", b"t"]) + \
+                    rnd.randbytes(rnd.randint(1, 6))
+                value = b"v" * rnd.randint(0, 200) + rnd.randbytes(4)
+                db.put(key, value)
+                expected[key] = value
+                if i % 5 == 0:
+                    key = rnd.choice(list(expected))
+                    db.delete(key)
+                    del expected[key]
+            db.put(b"t" + b"\x01" * 32, b"txindex")
+            expected[b"t" + b"\x01" * 32] = b"txindex"
+
+            # opened while plyvel holds the lock
+            with LevelDB(self.path) as reader:
+                self.assertGreater(len(reader._tables), 1)
+                self.assertEqual(sorted(expected.items()), reader.iterator())
+                self.assertEqual(
+                    sorted(item for item in expected.items()
+                           if item[0].startswith(b"b")),
+                    reader.iterator(prefix=b"b"))
+                for key, value in expected.items():
+                    self.assertEqual(value, reader.get(key))
+                self.assertIsNone(reader.get(b"a"))
+                self.assertIsNone(reader.get(b"t" + b"\xff" * 40))
+        finally:
+            db.close()
@@ -0,0 +1,124 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.index import DBBlockIndex
+from blockchain_parser.readplan import ReadPlanner, MAX_BLOCK_SIZE
+from blockchain_parser.utils import double_sha256
+from .utils import make_header, make_block, make_coinbase, write_blk_file, \
+    encode_block_index
+
+
+class TestReadPlanner(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+
+        raw_blocks = []
+        prev_hash = b"\x00" * 32
+        for height in range(10):
+            header = make_header(prev_hash, 1231006505 + 600 * height)
+            raw_blocks.append(make_block(header, [make_coinbase(height)]))
+            prev_hash = double_sha256(header)
+        stale = make_block(make_header(prev_hash, nonce=1),
+                           [make_coinbase(10)])
+
+        # blocks saved out of order, as during the initial download
+        layout = [[3, 1, 0, None, 2, 5], [4, 8, 6, 7, 9]]
+        self.block_indexes = [None] * len(raw_blocks)
+        for file_no, heights in enumerate(layout):
+            positions = write_blk_file(
+                os.path.join(self.tmpdir.name, "blk%05d.dat" % file_no),
+                [stale if height is None else raw_blocks[height]
+                 for height in heights])
+            for height, data_pos in zip(heights, positions):
+                if height is not None:
+                    raw_block = raw_blocks[height]
+                    self.block_indexes[height] = DBBlockIndex(
+                        double_sha256(raw_block[:80]), encode_block_index(
+                            height, raw_block[:80], 1, file_no, data_pos))
+        self.raw_blocks = raw_blocks
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_ordered_blocks(self):
+        for window in (1, 3, 100):
+            for max_gap in (0, 1 << 20):
+                planner = ReadPlanner(self.tmpdir.name, window=window,
+                                      max_gap=max_gap)
+                blocks = list(self.blockchain.get_ordered_blocks(
+                    self.block_indexes, planner=planner))
+                self.assertEqual(self.raw_blocks,
+                                 [block.hex for block in blocks])
+                self.assertEqual(list(range(10)),
+                                 [block.height for block in blocks])
+                self.assertEqual(10, planner.stats.blocks)
+                self.assertGreater(planner.stats.bytes_per_read, 0)
+
+        # one read for each file, and one for the end of its last block
+        self.assertEqual(4, planner.stats.reads)
+        self.assertEqual({}, planner._files)
+
+        planner = ReadPlanner(self.tmpdir.name)
+        blocks = list(self.blockchain.get_ordered_blocks(
+            self.block_indexes, start=8, end=2, planner=planner))
+        self.assertEqual(list(range(7, 1, -1)),
+                         [block.height for block in blocks])
+
+    def test_plan(self):
+        planner = ReadPlanner(self.tmpdir.name, max_gap=0)
+        bounds = planner.get_bounds(self.block_indexes)
+
+        def plan(heights):
+            reads = planner.plan([self.block_indexes[height]
+                                  for height in heights], bounds)
+            return [[self.block_indexes.index(blkIdx) for position in
+                     read[3] for blkIdx in self.block_indexes
+                     if (blkIdx.file, blkIdx.data_pos) == position]
+                    for read in reads]
+
+        # sorted by position, blocks 0 and 2 being only separated by a stale
+        # block which is read along
+        self.assertEqual([[3, 1, 0, 2]], plan(range(4)))
+        self.assertEqual([[3], [5], [4], [6, 7]], plan([3, 5, 4, 7, 6]))
+        planner.max_gap = 1 << 20
+        self.assertEqual([[3, 5], [4, 6, 7]], plan([3, 5, 4, 7, 6]))
+
+    def test_get_windows(self):
+        planner = ReadPlanner(self.tmpdir.name, window=3)
+        bounds = planner.get_bounds(self.block_indexes)
+        self.assertEqual([3, 3, 3, 1], [len(window) for window in
+                                        planner.get_windows(
+                                            self.block_indexes, bounds)])
+
+        # bounded by the distance to the next block of the same file, the
+        # last block of a file counting for MAX_BLOCK_SIZE
+        planner.max_bytes = MAX_BLOCK_SIZE
+        windows = planner.get_windows(self.block_indexes, bounds)
+        self.assertEqual(self.block_indexes,
+                         [blkIdx for window in windows for blkIdx in window])
+        for window in windows:
+            sizes = [MAX_BLOCK_SIZE if (b.file, b.data_pos) not in bounds
+                     else bounds[(b.file, b.data_pos)] - b.data_pos
+                     for b in window]
+            self.assertTrue(len(window) == 1 or
+                            sum(sizes) <= planner.max_bytes)
+        self.assertGreater(len(windows), 4)
+
+        planner.max_bytes = 1
+        blocks = list(self.blockchain.get_ordered_blocks(
+            self.block_indexes, planner=planner))
+        self.assertEqual(self.raw_blocks, [block.hex for block in blocks])
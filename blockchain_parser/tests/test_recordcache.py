@@ -0,0 +1,124 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.block import Block
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.recordcache import BlockRecord, RecordCache
+from blockchain_parser.transaction import Transaction
+from .utils import read_test_data, make_header, make_block, make_coinbase, \
+    write_chain, COINBASE
+
+
+class TestBlockRecord(unittest.TestCase):
+    def test_from_block(self):
+        raw_txs = [COINBASE, read_test_data("size_non_segwit.txt"),
+                   read_test_data("segwit.txt"),
+                   read_test_data("bech32_p2wsh.txt")]
+        block = Block(make_block(make_header(), raw_txs), 7)
+        record = BlockRecord.from_bytes(
+            BlockRecord.from_block(block).to_bytes())
+        transactions = block.transactions
+        outputs = [output for tx in transactions for output in tx.outputs]
+        inputs = [input_ for tx in transactions for input_ in tx.inputs]
+
+        self.assertEqual(block.hash, record.hash)
+        self.assertEqual([tx.txid for tx in transactions], record.txids)
+        self.assertEqual([(i.transaction_hash, i.transaction_index)
+                          for i in inputs], record.prevouts)
+        self.assertEqual([o.value for o in outputs], list(record.values))
+        self.assertEqual([o.type for o in outputs], record.output_types)
+        self.assertEqual([[a.address for a in o.addresses] for o in outputs],
+                         record.addresses)
+        self.assertEqual(len(transactions[1].outputs),
+                         len(record.output_range(1)))
+        self.assertEqual(len(transactions[2].inputs),
+                         len(record.input_range(2)))
+        self.assertEqual(len(outputs), record.output_offsets[-1])
+
+    def test_from_bytes(self):
+        block = Block(make_block(make_header(), [COINBASE]))
+        data = BlockRecord.from_block(block).to_bytes()
+        self.assertIsNone(BlockRecord.from_bytes(data[:-1]))
+        self.assertIsNone(BlockRecord.from_bytes(b"\x00" + data[1:]))
+
+
+class TestRecordCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([make_coinbase(i)], []) for i in range(4)])
+        self.cache = RecordCache(os.path.join(self.tmpdir.name, "records"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_iter_records(self):
+        hashes = [blkIdx.hash for blkIdx in self.block_indexes]
+        for _ in range(2):
+            records = list(self.cache.iter_records(
+                self.blockchain.get_unordered_blocks()))
+            self.assertEqual(hashes, [record.hash for record in records])
+        self.assertEqual((4, 4), (self.cache.hits, self.cache.misses))
+        self.assertEqual(4, len(self.cache))
+
+        # records are shared by caches opened on the same directory
+        cache = RecordCache(self.cache.path)
+        self.assertEqual(self.cache.size, cache.size)
+        record = cache.get(hashes[1])
+        self.assertEqual(self.block_indexes[1].hash, record.hash)
+        self.assertIsNone(cache.get("00" * 32))
+
+    def test_ordered_records(self):
+        records = list(self.cache.ordered_records(
+            self.blockchain, self.block_indexes, start=1))
+        self.assertEqual([1, 2, 3], [record.height for record in records])
+
+        # cached blocks are not read
+        os.remove(os.path.join(self.tmpdir.name, "blk00000.dat"))
+        records = list(self.cache.ordered_records(
+            self.blockchain, self.block_indexes, start=1))
+        self.assertEqual([blkIdx.hash for blkIdx in self.block_indexes[1:]],
+                         [record.hash for record in records])
+        self.assertEqual([Transaction(make_coinbase(1)).txid],
+                         records[0].txids)
+
+    def test_evict(self):
+        records = list(self.cache.iter_records(
+            self.blockchain.get_unordered_blocks()))
+        size = os.path.getsize(self.cache._file(records[0].hash))
+        # the first block is the most recently used
+        for i, record in enumerate(records[1:] + records[:1]):
+            os.utime(self.cache._file(record.hash), ns=(i * 10 ** 9,) * 2)
+
+        self.cache.evict(max_size=2 * size / 0.9)
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual(2 * size, self.cache.size)
+        self.assertIsNotNone(self.cache.get(records[0].hash))
+        self.assertIsNotNone(self.cache.get(records[3].hash))
+        self.assertIsNone(self.cache.get(records[1].hash))
+
+        cache = RecordCache(self.cache.path, max_size=size)
+        cache.put(records[1])
+        self.assertLessEqual(cache.size, size)
+
+    def test_put_again(self):
+        records = list(self.cache.iter_records(
+            self.blockchain.get_unordered_blocks()))
+        size = self.cache.size
+        for record in records:
+            self.cache.put(record)
+        self.assertEqual(size, self.cache.size)
+        self.assertEqual(size, RecordCache(self.cache.path).size)
@@ -0,0 +1,119 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import random
+import tempfile
+import unittest
+
+from blockchain_parser.block import Block
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.reorder import ReorderBuffer, get_coinbase_height
+from blockchain_parser.utils import double_sha256
+from .utils import make_header, make_block, make_coinbase, write_blk_file, \
+    make_tx
+
+
+def make_chain(n, prev_hash=b"\x00" * 32, first_height=0, nonce=0):
+    blocks = []
+    for height in range(first_height, first_height + n):
+        header = make_header(prev_hash, 1231006505 + 600 * height,
+                             nonce=nonce)
+        blocks.append(make_block(header, [make_coinbase(height)]))
+        prev_hash = double_sha256(header)
+    return blocks
+
+
+def block_hash(raw_block):
+    return double_sha256(raw_block[:80])
+
+
+class TestReorderBuffer(unittest.TestCase):
+    def test_reorder(self):
+        blocks = make_chain(20)
+        # a stale block at height 5 and a stale branch of two at height 12
+        stale = make_chain(1, block_hash(blocks[4]), 5, nonce=1) + \
+            make_chain(2, block_hash(blocks[11]), 12, nonce=1)
+        added = blocks + stale
+        random.Random(2).shuffle(added)
+
+        reorder_buffer = ReorderBuffer(confirmations=3)
+        released = []
+        for i, raw_block in enumerate(added):
+            reorder_buffer.add(block_hash(raw_block), raw_block[4:36],
+                               raw_block, i)
+            released.extend(reorder_buffer.pop_ready())
+        self.assertLess(len(released), 20)
+        released.extend(reorder_buffer.pop_ready(final=True))
+
+        self.assertEqual([block_hash(b) for b in blocks],
+                         [hash_ for hash_, _, _, _ in released])
+        self.assertEqual(list(range(20)), [h for _, h, _, _ in released])
+        self.assertEqual(0, len(reorder_buffer))
+
+    def test_spill(self):
+        blocks = make_chain(10)
+        reorder_buffer = ReorderBuffer(confirmations=1, max_blocks=2)
+        for i, raw_block in enumerate(reversed(blocks)):
+            reorder_buffer.add(block_hash(raw_block), raw_block[4:36],
+                               raw_block, 9 - i)
+        released = list(reorder_buffer.pop_ready())
+        self.assertEqual(list(range(10)), [r for _, _, _, r in released])
+        # only the first two blocks added were kept in memory
+        self.assertEqual([None] * 8 + blocks[8:],
+                         [raw for _, _, raw, _ in released])
+
+    def test_coinbase_height(self):
+        block = Block(make_chain(1, first_height=300000)[0])
+        self.assertEqual(300000, get_coinbase_height(block))
+        raw = make_block(make_header(), [make_tx(
+            [(b"\x00" * 32, 0xffffffff)], [(0, b"")], b"\x51")])
+        self.assertEqual(1, get_coinbase_height(Block(raw)))
+        raw = make_block(make_header(), [make_tx(
+            [(b"\x00" * 32, 0xffffffff)], [(0, b"")], b"\xac")])
+        self.assertIsNone(get_coinbase_height(Block(raw)))
+
+
+class TestLinkedBlocks(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.blocks = make_chain(30)
+        stale = make_chain(3, block_hash(self.blocks[19]), 20, nonce=1)
+        # blocks are spread over two files, out of order
+        write_blk_file(os.path.join(self.tmpdir.name, "blk00000.dat"),
+                       self.blocks[:10] + self.blocks[12:20] + stale[:2])
+        write_blk_file(os.path.join(self.tmpdir.name, "blk00001.dat"),
+                       self.blocks[20:25] + self.blocks[10:12] + stale[2:] +
+                       self.blocks[25:])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_linked_blocks(self):
+        for max_blocks in (1000, 3):
+            blocks = list(self.blockchain.get_linked_blocks(
+                max_blocks=max_blocks, bip34_height=0))
+            self.assertEqual([block_hash(b) for b in self.blocks],
+                             [b.hash_bytes for b in blocks])
+            self.assertEqual(list(range(30)), [b.height for b in blocks])
+            self.assertEqual("blk00001.dat", blocks[10].blk_file)
+
+    def test_bip34(self):
+        # a genesis block whose coinbase claims height 5
+        raw_block = make_block(make_header(nonce=7), [make_coinbase(5)])
+        path = os.path.join(self.tmpdir.name, "other")
+        os.makedirs(path)
+        write_blk_file(os.path.join(path, "blk00000.dat"), [raw_block])
+        blockchain = Blockchain(path)
+        with self.assertRaises(Exception):
+            list(blockchain.get_linked_blocks(bip34_height=0))
+        self.assertEqual(1, len(list(blockchain.get_linked_blocks())))
@@ -0,0 +1,120 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.filters import BlockFilter
+from blockchain_parser.repack import repack, load_repacked_index, \
+    strip_witnesses, REPACKED_INDEX
+from blockchain_parser.transaction import Transaction
+from .utils import write_chain, make_coinbase, read_test_data
+
+
+class TestRepack(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.segwit_tx = read_test_data("segwit.txt")
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([make_coinbase(i), self.segwit_tx], []) for i in range(3)])
+        self.block_indexes += write_chain(
+            self.tmpdir.name, [([make_coinbase(i)], []) for i in range(3, 6)],
+            file=1, first_height=3,
+            prev_hash=self.block_indexes[-1].hash_bytes, time=1231008305)
+        self.dest = os.path.join(self.tmpdir.name, "repacked")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_repack(self):
+        # the blocks of the second file come first by height
+        block_indexes = self.block_indexes[3:] + self.block_indexes[:3]
+        for height, blkIdx in enumerate(block_indexes):
+            blkIdx.height = height
+
+        repacked = repack(self.blockchain, block_indexes, self.dest,
+                          max_file_size=500)
+        self.assertEqual([blkIdx.hash for blkIdx in block_indexes],
+                         [blkIdx.hash for blkIdx in repacked])
+        self.assertGreater(repacked[-1].file, 0)
+        self.assertTrue(all(blkIdx.undo_pos == -1 for blkIdx in repacked))
+
+        blockchain = Blockchain(self.dest)
+        hashes = [blkIdx.hash for blkIdx in block_indexes]
+        self.assertEqual(hashes, [block.hash for block in
+                                  blockchain.get_unordered_blocks()])
+        self.assertEqual(hashes, [block.hash for block in
+                                  blockchain.get_ordered_blocks(
+                                      load_repacked_index(self.dest))])
+        self.assertEqual(list(range(6)), [block.height for block in
+                                          blockchain.get_ordered_blocks(
+                                              None, cache=os.path.join(
+                                                  self.dest,
+                                                  REPACKED_INDEX))])
+
+    def test_range(self):
+        repacked = repack(self.blockchain, self.block_indexes, self.dest,
+                          start=1, end=4,
+                          block_filter=BlockFilter(predicate=lambda header:
+                                                   header.nonce != 2))
+        self.assertEqual([1, 3, 4], [blkIdx.height for blkIdx in repacked])
+        self.assertEqual([1, 3, 4], [block.height for block in Blockchain(
+            self.dest).get_ordered_blocks(load_repacked_index(self.dest))])
+
+    def test_repack_again(self):
+        repack(self.blockchain, self.block_indexes, self.dest,
+               max_file_size=500)
+        self.assertGreater(len(os.listdir(self.dest)), 2)
+
+        # the files of the larger repack are not left behind
+        repacked = repack(self.blockchain, self.block_indexes, self.dest,
+                          end=1)
+        self.assertEqual(["blk00000.dat", REPACKED_INDEX],
+                         sorted(os.listdir(self.dest)))
+        blocks = list(Blockchain(self.dest).get_unordered_blocks())
+        self.assertEqual([blkIdx.hash for blkIdx in repacked],
+                         [block.hash for block in blocks])
+
+    def test_refused_destination(self):
+        files = sorted(os.listdir(self.tmpdir.name))
+        sizes = [os.path.getsize(os.path.join(self.tmpdir.name, name))
+                 for name in files]
+        with self.assertRaises(Exception):
+            repack(self.blockchain, self.block_indexes, self.blockchain.path)
+
+        # a directory which is not an earlier repack
+        os.makedirs(self.dest)
+        write_chain(self.dest, [([make_coinbase(0)], [])])
+        with self.assertRaises(Exception):
+            repack(self.blockchain, self.block_indexes, self.dest)
+        self.assertEqual(["blk00000.dat", "rev00000.dat"],
+                         sorted(os.listdir(self.dest)))
+
+        self.assertEqual(sorted(files + ["repacked"]),
+                         sorted(os.listdir(self.tmpdir.name)))
+        self.assertEqual(sizes, [os.path.getsize(os.path.join(
+            self.tmpdir.name, name)) for name in files])
+
+    def test_strip_witness(self):
+        repack(self.blockchain, self.block_indexes, self.dest,
+               strip_witness=True)
+        blocks = list(Blockchain(self.dest).get_unordered_blocks())
+        tx = blocks[0].transactions[1]
+        original = Transaction(self.segwit_tx)
+        self.assertTrue(original.is_segwit)
+        self.assertFalse(tx.is_segwit)
+        self.assertEqual(original.txid, tx.txid)
+        self.assertEqual(original.outputs[0].value, tx.outputs[0].value)
+        self.assertEqual(blocks[0].hex, strip_witnesses(blocks[0].hex))
+        self.assertEqual(self.block_indexes[0].hash, blocks[0].hash)
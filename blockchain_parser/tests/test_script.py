@@ -9,9 +9,19 @@
 # modified, propagated, or distributed except according to the terms contained
 # in the LICENSE file.
 
+import os
+import random
 import unittest
 from binascii import a2b_hex
+
+from bitcoin.core.script import CScript
+
+from blockchain_parser.block import Block
 from blockchain_parser.script import Script
+from blockchain_parser.transaction import Transaction
+from .utils import read_test_data
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
 
 
 class TestScript(unittest.TestCase):
@@ -146,3 +156,47 @@ class TestScript(unittest.TestCase):
         self.assertFalse(script.is_unknown())
         self.assertFalse(script.is_return())
         self.assertTrue(script.is_p2tr())
+
+    def test_matches_cscript(self):
+        scripts = [a2b_hex(case) for case in (
+            "", "6a", "40", "00", "4f", "4c", "4c00", "4d0100", "4d010001",
+            "4e0100000001", "4e01000000", "51ba60ff", "6a4c0548656c6c6f",
+            "52210201ffffff51ae",
+        )]
+        for filename in os.listdir(os.path.join(dir_path, "data")):
+            raw = read_test_data(filename)
+            try:
+                if filename == "genesis_block.txt":
+                    transactions = Block(raw).transactions
+                else:
+                    transactions = [Transaction(raw)]
+                for tx in transactions:
+                    scripts += [i.script.hex for i in tx.inputs]
+                    scripts += [o.script.hex for o in tx.outputs]
+            except Exception:
+                continue
+        rng = random.Random(0)
+        scripts += [bytes(rng.randrange(256) for _ in range(rng.randrange(12)))
+                    for _ in range(500)]
+
+        for raw in scripts:
+            script = Script(raw)
+            cscript = CScript(raw)
+            self.assertEqual(cscript.is_valid(), script.is_valid())
+            if not cscript.is_valid():
+                self.assertEqual([], script.operations)
+                self.assertEqual("INVALID_SCRIPT", script.value)
+                continue
+            operations = list(cscript)
+            self.assertEqual(operations, script.operations)
+            self.assertEqual([type(op) for op in operations],
+                             [type(op) for op in script.operations])
+            self.assertEqual(" ".join(
+                op.hex() if isinstance(op, bytes) else str(op)
+                for op in operations), script.value)
+            self.assertEqual(cscript.is_unspendable(), script.is_return())
+            self.assertEqual(cscript.is_p2sh(), script.is_p2sh())
+            self.assertEqual(cscript.is_witness_v0_keyhash(),
+                             script.is_p2wpkh())
+            self.assertEqual(cscript.is_witness_v0_scripthash(),
+                             script.is_p2wsh())
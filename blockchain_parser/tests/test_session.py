@@ -0,0 +1,108 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.session import ScanSession
+from .utils import write_chain, make_coinbase
+
+
+class TestScanSession(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([make_coinbase(i)], []) for i in range(3)])
+        self.block_indexes += write_chain(
+            self.tmpdir.name, [([make_coinbase(i)], []) for i in range(3, 6)],
+            file=1, first_height=3,
+            prev_hash=self.block_indexes[-1].hash_bytes, time=1231008305)
+        self.hashes = [blkIdx.hash for blkIdx in self.block_indexes]
+        self.checkpoint = os.path.join(self.tmpdir.name, "scan.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def scan(self, blocks, n):
+        hashes = []
+        for block in blocks:
+            hashes.append(block.hash)
+            if len(hashes) == n:
+                break
+        return hashes
+
+    def test_unordered(self):
+        session = ScanSession(self.blockchain, self.checkpoint, interval=2)
+        # the third block is not processed when the scan is interrupted
+        self.assertEqual(self.hashes[:3],
+                         self.scan(session.unordered_blocks(), 3))
+        self.assertEqual({"blk_file": "blk00000.dat",
+                          "data_pos": self.block_indexes[1].data_pos},
+                         session.checkpoint)
+
+        session = ScanSession(self.blockchain, self.checkpoint, interval=2)
+        self.assertEqual(self.hashes[2:5],
+                         self.scan(session.unordered_blocks(), 3))
+        self.assertEqual("blk00001.dat", session.checkpoint["blk_file"])
+
+        session = ScanSession(self.blockchain, self.checkpoint)
+        self.assertEqual(self.hashes[4:],
+                         self.scan(session.unordered_blocks(), 10))
+        self.assertEqual([], self.scan(ScanSession(
+            self.blockchain, self.checkpoint).unordered_blocks(), 10))
+
+    def test_ordered(self):
+        session = ScanSession(self.blockchain, self.checkpoint, interval=1)
+        self.assertEqual(self.hashes[:4], self.scan(
+            session.ordered_blocks(self.block_indexes), 4))
+        self.assertEqual({"height": 2, "hash": self.hashes[2]},
+                         session.checkpoint)
+
+        session = ScanSession(self.blockchain, self.checkpoint)
+        self.assertEqual(self.hashes[3:5], self.scan(
+            session.ordered_blocks(self.block_indexes, end=5), 10))
+        self.assertEqual(4, session.checkpoint["height"])
+
+        with self.assertRaises(Exception):
+            ScanSession(self.blockchain, self.checkpoint).unordered_blocks()
+        # the checkpointed block left the main chain
+        with self.assertRaises(Exception):
+            next(ScanSession(self.blockchain, self.checkpoint).ordered_blocks(
+                self.block_indexes[:4]))
+
+    def test_ack(self):
+        session = ScanSession(self.blockchain, self.checkpoint, interval=1,
+                              auto_ack=False)
+        blocks = session.unordered_blocks()
+        total = 0
+        for block in blocks:
+            total += block.n_transactions
+            if block.hash == self.hashes[1]:
+                session.ack(total)
+            if block.hash == self.hashes[2]:
+                break
+        self.assertEqual({"blk_file": "blk00000.dat",
+                          "data_pos": self.block_indexes[1].data_pos},
+                         ScanSession(self.blockchain,
+                                     self.checkpoint).checkpoint)
+
+        session = ScanSession(self.blockchain, self.checkpoint,
+                              auto_ack=False)
+        self.assertEqual(2, session.state)
+        total = session.state
+        for block in session.unordered_blocks():
+            total += block.n_transactions
+        session.ack(total)
+        self.assertEqual(6, ScanSession(self.blockchain,
+                                        self.checkpoint).state)
@@ -0,0 +1,141 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.filters import BlockFilter
+from blockchain_parser.sidecar import SidecarIndex, load_sidecar, \
+    get_sidecar_path
+from blockchain_parser.utils import double_sha256, format_hash
+from .utils import write_chain, write_blk_file, make_block, make_header, \
+    make_coinbase
+
+
+class TestSidecar(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([make_coinbase(i)] * (i + 1), []) for i in range(3)])
+        self.block_indexes += write_chain(
+            self.tmpdir.name, [([make_coinbase(i)], []) for i in range(3, 6)],
+            file=1, prev_hash=self.block_indexes[-1].hash_bytes,
+            time=1231008305)
+        self.blk_file = os.path.join(self.tmpdir.name, "blk00000.dat")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_load(self):
+        entries = load_sidecar(self.blk_file)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name,
+                                                    "blk00000.idx")))
+        self.assertEqual([blkIdx.hash for blkIdx in self.block_indexes[:3]],
+                         [entry.hash for entry in entries])
+        self.assertEqual([blkIdx.data_pos
+                          for blkIdx in self.block_indexes[:3]],
+                         [entry.data_pos for entry in entries])
+        self.assertEqual([1, 2, 3],
+                         [entry.n_transactions for entry in entries])
+        self.assertEqual(entries[0].hash, entries[1].previous_block_hash)
+        self.assertEqual(1231006505 + 600, entries[1].timestamp)
+        self.assertEqual(entries[1].hash, entries[1].header.hash)
+
+        reloaded = load_sidecar(self.blk_file)
+        self.assertEqual([(e.hash, e.data_pos, e.size) for e in entries],
+                         [(e.hash, e.data_pos, e.size) for e in reloaded])
+
+    def test_unordered_blocks(self):
+        blocks = list(self.blockchain.get_unordered_blocks())
+        for _ in range(2):
+            # the first scan writes the sidecars, the second one reads them
+            with_sidecar = list(self.blockchain.get_unordered_blocks(
+                sidecar=True))
+            self.assertEqual([(b.hash, b.blk_file, b.data_pos, b.size)
+                              for b in blocks],
+                             [(b.hash, b.blk_file, b.data_pos, b.size)
+                              for b in with_sidecar])
+
+        block_filter = BlockFilter(start_time=1231006505 + 600,
+                                   end_time=1231008305 + 600)
+        self.assertEqual([block.hash for block in blocks[1:5]],
+                         [block.hash for block in
+                          self.blockchain.get_unordered_blocks(
+                              block_filter, sidecar=True)])
+        self.assertEqual([block.hash for block in blocks[2:]],
+                         [block.hash for block in
+                          self.blockchain.get_unordered_blocks(
+                              start_after=("blk00000.dat", blocks[1].data_pos),
+                              sidecar=True)])
+
+    def test_directory(self):
+        directory = os.path.join(self.tmpdir.name, "sidecars")
+        list(self.blockchain.get_unordered_blocks(sidecar=directory))
+        self.assertEqual(["blk00000.idx", "blk00001.idx"],
+                         sorted(os.listdir(directory)))
+        self.assertEqual(os.path.join(directory, "blk00001.idx"),
+                         get_sidecar_path(os.path.join(
+                             self.tmpdir.name, "blk00001.dat"), directory))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name,
+                                                     "blk00000.idx")))
+
+    def test_append(self):
+        entries = load_sidecar(self.blk_file)
+        header = make_header(entries[-1].hash_bytes, nonce=10)
+        write_blk_file(self.blk_file,
+                       [make_block(header, [make_coinbase(10)])], mode="ab")
+        appended = load_sidecar(self.blk_file)
+        self.assertEqual([entry.hash for entry in entries] +
+                         [format_hash(double_sha256(header))],
+                         [entry.hash for entry in appended])
+
+        # a rewritten file is scanned again
+        rewritten = write_chain(self.tmpdir.name, [([make_coinbase(20)], [])],
+                                time=1231006505 + 3600)
+        self.assertEqual([rewritten[0].hash], [entry.hash for entry in
+                                               load_sidecar(self.blk_file)])
+
+    def test_index(self):
+        index = SidecarIndex(self.tmpdir.name)
+        self.assertEqual(6, len(index))
+        blkIdx = self.block_indexes[4]
+        entry = index.get(blkIdx.hash)
+        self.assertEqual(("blk00001.dat", blkIdx.data_pos),
+                         (entry.blk_file, entry.data_pos))
+        block = index.get_block(blkIdx.hash)
+        self.assertEqual(blkIdx.hash, block.hash)
+        self.assertEqual(blkIdx.data_pos, block.data_pos)
+        self.assertIn(self.block_indexes[0].hash, index)
+        self.assertIsNone(index.get("00" * 32))
+        self.assertIsNone(index.get_block("00" * 32))
+
+        write_chain(self.tmpdir.name, [([make_coinbase(30)], [])], file=2,
+                    time=1231006505 + 7200)
+        index.update()
+        self.assertEqual(7, len(index))
+
+    def test_index_rewritten(self):
+        index = SidecarIndex(self.tmpdir.name)
+        rewritten = write_chain(self.tmpdir.name, [([make_coinbase(20)], [])],
+                                time=1231006505 + 3600)
+        index.update()
+        self.assertEqual(4, len(index))
+        self.assertIn(rewritten[0].hash, index)
+        self.assertNotIn(self.block_indexes[0].hash, index)
+        self.assertIsNone(index.get_block(self.block_indexes[1].hash))
+
+        os.remove(os.path.join(self.tmpdir.name, "blk00001.dat"))
+        index.update()
+        self.assertEqual(1, len(index))
+        self.assertNotIn(self.block_indexes[4].hash, index)
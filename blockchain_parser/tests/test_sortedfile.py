@@ -0,0 +1,76 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import random
+import struct
+import tempfile
+import unittest
+
+from blockchain_parser.sortedfile import SortedRecordFile, \
+    SortedRecordIndex, write_sorted_records, sort_records
+
+
+def make_records(n, seed):
+    rng = random.Random(seed)
+    return [struct.pack(">QI", rng.getrandbits(64), i) for i in range(n)]
+
+
+class TestSortedFile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_find(self):
+        records = make_records(5000, 1)
+        # duplicated keys
+        records.append(records[10][:8] + b"\xff" * 4)
+        path = os.path.join(self.tmpdir.name, "records.dat")
+        write_sorted_records(path, sorted(records), 12, 8, b"meta")
+
+        with SortedRecordFile(path) as f:
+            self.assertEqual(5001, len(f))
+            self.assertEqual(b"meta", f.meta)
+            self.assertEqual(sorted(records), list(f))
+            for record in records[:100]:
+                self.assertIn(record, f.find_all(record[:8]))
+            self.assertEqual(2, len(f.find_all(records[10][:8])))
+            self.assertEqual(records[10], f.find(records[10][:8]))
+            self.assertIsNone(f.find(b"\x00" * 8))
+
+    def test_external_sort(self):
+        records = make_records(1000, 2)
+        self.assertEqual(sorted(records),
+                         list(sort_records(iter(records), 12, max_records=64,
+                                           tmpdir=self.tmpdir.name)))
+
+    def test_segments(self):
+        path = os.path.join(self.tmpdir.name, "index")
+        index = SortedRecordIndex(path, 12, 8, max_segments=3)
+        batches = [make_records(100, seed) for seed in range(5)]
+        for i, batch in enumerate(batches):
+            index.append(sorted(batch), str(i).encode())
+            self.assertLessEqual(len(index.segments), 3)
+        self.assertEqual(b"4", index.meta)
+        self.assertEqual(500, len(index))
+        for batch in batches:
+            self.assertEqual(batch[0], index.find(batch[0][:8]))
+
+        index.compact()
+        self.assertEqual(1, len(index.segments))
+        index.close()
+
+        index = SortedRecordIndex(path, 12, 8)
+        self.assertEqual(b"4", index.meta)
+        self.assertEqual(batches[3][7], index.find(batches[3][7][:8]))
+        index.close()
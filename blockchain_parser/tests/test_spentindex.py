@@ -0,0 +1,80 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.spentindex import SpentIndex
+from .utils import read_test_data, write_chain, COINBASE
+
+NON_SEGWIT_TXID = "65781ea4ab75458b70ab820a3aab14ff65aa11d3e7893a4f45c1ba4f" \
+                  "ce4af0d6"
+NON_SEGWIT_PREVOUT = "61e7490ec2ab3f38f6d4e0421164d695e83824c56a8bc43d6fb9f3" \
+                     "691841dc53"
+SEGWIT_TXID = "d364b6d6ff7c590ecca553a089c1f54002f54b23edfc51dd2aea3396a05f" \
+              "ff51"
+SEGWIT_PREVOUT = "7f9fcb1484850a14299a520d1da0ff5f0ae338f964ad906420cc06ead8" \
+                 "dc1a62"
+
+
+class TestSpentIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([COINBASE], []),
+            ([COINBASE, read_test_data("size_non_segwit.txt")], []),
+            ([COINBASE, read_test_data("size_segwit.txt")], []),
+        ])
+        self.path = os.path.join(self.tmpdir.name, "spentindex")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_update(self):
+        with SpentIndex(self.path) as index:
+            self.assertEqual(-1, index.height)
+            self.assertEqual(1, index.update(self.blockchain,
+                                             self.block_indexes[:2],
+                                             workers=1))
+            self.assertIsNone(index.get(SEGWIT_PREVOUT, 1))
+            self.assertEqual(2, index.update(self.blockchain,
+                                             self.block_indexes, workers=1))
+            self.assertEqual(2, index.update(self.blockchain,
+                                             self.block_indexes, workers=1))
+
+        with SpentIndex(self.path) as index:
+            self.assertEqual(2, index.height)
+            self.assertEqual(2, len(index))
+            spend = index.get(NON_SEGWIT_PREVOUT, 1)
+            self.assertEqual(NON_SEGWIT_PREVOUT, spend.txid)
+            self.assertEqual(1, spend.vout)
+            self.assertEqual(NON_SEGWIT_TXID, spend.spending_txid)
+            self.assertEqual(0, spend.vin)
+            self.assertEqual(1, spend.height)
+            self.assertIsNone(index.get(NON_SEGWIT_PREVOUT, 0))
+
+            index.compact()
+            spend = index.get(SEGWIT_PREVOUT, 1)
+            self.assertEqual(SEGWIT_TXID, spend.spending_txid)
+            self.assertEqual(2, spend.height)
+            self.assertEqual([1], [s.vout
+                                   for s in index.get_spends(SEGWIT_PREVOUT)])
+            self.assertEqual([], index.get_spends(SEGWIT_TXID))
+
+    def test_parallel(self):
+        with SpentIndex(self.path) as index:
+            index.update(self.blockchain, self.block_indexes, workers=2,
+                         chunk_size=1, max_records=1)
+            self.assertEqual(2, len(index))
+            self.assertEqual(2, index.get(SEGWIT_PREVOUT, 1).height)
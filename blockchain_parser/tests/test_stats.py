@@ -0,0 +1,121 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import pickle
+import tempfile
+import unittest
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.index import DBBlockIndex
+from blockchain_parser.stats import get_block_stats, block_subsidy
+from blockchain_parser.undo import BlockUndo
+from blockchain_parser.utils import double_sha256, format_hash
+from .utils import read_test_data, make_header, make_block, write_blk_file, \
+    encode_block_index, encode_block_undo, COINBASE, COINBASE_SCRIPT
+
+
+class TestBlockStats(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = self.tmpdir.name
+
+        header = make_header(time=1500000000)
+        block = make_block(header, [
+            COINBASE,
+            read_test_data("size_non_segwit.txt"),
+            read_test_data("size_segwit.txt"),
+        ])
+        undo = encode_block_undo([
+            [(90, False, 16526810, COINBASE_SCRIPT)],
+            [(12, True, 1905675, COINBASE_SCRIPT)],
+        ])
+        data_pos, = write_blk_file(os.path.join(path, "blk00000.dat"),
+                                   [block])
+        undo_pos, = write_blk_file(os.path.join(path, "rev00000.dat"), [undo])
+        self.block_index = DBBlockIndex(
+            format_hash(double_sha256(header)),
+            encode_block_index(100, header, 3, 0, data_pos, undo_pos))
+        self.blockchain = Blockchain(path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_subsidy(self):
+        self.assertEqual(5000000000, block_subsidy(0))
+        self.assertEqual(312500000, block_subsidy(840000))
+        self.assertEqual(0, block_subsidy(64 * 210000))
+
+    def test_undo(self):
+        p2wpkh = b"\x00\x14" + b"\x11" * 20
+        undo = BlockUndo(encode_block_undo([
+            [(90, False, 16526810, COINBASE_SCRIPT), (0, True, 1, p2wpkh)],
+            [(12, True, 1905675, p2wpkh)],
+        ]))
+        spent = [o for txn in undo.spends for o in txn.outputs]
+        self.assertEqual([(90, False, 16526810, COINBASE_SCRIPT),
+                          (0, True, 1, p2wpkh), (12, True, 1905675, p2wpkh)],
+                         [(o.height, o.is_coinbase, o.amt, o.script)
+                          for o in spent])
+        # spent outputs only keep their own bytes
+        self.assertEqual([(bytes, o.len) for o in spent],
+                         [(type(o._raw_hex), len(o._raw_hex)) for o in spent])
+        self.assertEqual(len(undo._raw_hex), 1 + sum(txn.len
+                                                     for txn in undo.spends))
+
+        block = next(self.blockchain.get_ordered_blocks([self.block_index],
+                                                        undo=True))
+        copy = pickle.loads(pickle.dumps(block))
+        self.assertEqual(16526810, copy.undo.spends[0].outputs[0].amt)
+        self.assertEqual(COINBASE_SCRIPT,
+                         copy.undo.spends[0].outputs[0].script)
+
+    def test_block_stats(self):
+        stats = get_block_stats(self.blockchain, [self.block_index],
+                                workers=1)
+        self.assertEqual(1, len(stats))
+        stats = stats[0]
+        self.assertEqual(100, stats["height"])
+        self.assertEqual(1500000000, stats["time"])
+        self.assertEqual(3, stats["txs"])
+        self.assertEqual(2, stats["ins"])
+        self.assertEqual(4, stats["outs"])
+        self.assertEqual(2, stats["utxo_increase"])
+        self.assertEqual(562, stats["total_size"])
+        self.assertEqual(1585, stats["total_weight"])
+        self.assertEqual(1, stats["swtxs"])
+        self.assertEqual(373, stats["swtotal_size"])
+        self.assertEqual(829, stats["swtotal_weight"])
+        self.assertEqual(189, stats["mintxsize"])
+        self.assertEqual(373, stats["maxtxsize"])
+        self.assertEqual(281, stats["avgtxsize"])
+        self.assertEqual(18432485, stats["total_in"])
+        self.assertEqual(18402485, stats["total_out"])
+        self.assertEqual(5000000000, stats["subsidy"])
+        self.assertEqual(30000, stats["totalfee"])
+        self.assertEqual(10000, stats["minfee"])
+        self.assertEqual(20000, stats["maxfee"])
+        self.assertEqual(15000, stats["avgfee"])
+        self.assertEqual(15000, stats["medianfee"])
+        self.assertEqual(52, stats["minfeerate"])
+        self.assertEqual(96, stats["maxfeerate"])
+        self.assertEqual(75, stats["avgfeerate"])
+        self.assertEqual([52, 52, 96, 96, 96],
+                         list(stats["feerate_percentiles"]))
+        # the segwit marker and witness of the last transaction are 221 bytes
+        self.assertEqual(stats["size"] * 4 - 221 * 3, stats["weight"])
+        self.assertEqual(629, stats["vsize"])
+
+    def test_parallel(self):
+        stats = get_block_stats(self.blockchain, [self.block_index] * 3,
+                                workers=2, chunk_size=1)
+        self.assertEqual([100] * 3, list(stats["height"]))
+        self.assertEqual([30000] * 3, list(stats["totalfee"]))
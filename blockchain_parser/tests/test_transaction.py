@@ -10,6 +10,7 @@
 # in the LICENSE file.
 
 import os
+import pickle
 import unittest
 from binascii import a2b_hex, b2a_hex
 from blockchain_parser.transaction import Transaction
@@ -61,8 +62,12 @@ class TestTransaction(unittest.TestCase):
         self.assertTrue(tx.txid == id)
         h = "1eac09f372a8c13bb7dea6bd66ee71a6bcc469b57b35c1e394ad7eb7c107c507"
         self.assertTrue(tx.hash == h)
+        self.assertEqual(bytes.fromhex(id)[::-1], tx.txid_bytes)
+        self.assertEqual(bytes.fromhex(h)[::-1], tx.hash_bytes)
 
         segwit_input = tx.inputs[0]
+        self.assertEqual(4, segwit_input.witness_count)
+        self.assertIsNone(segwit_input._witnesses)
         self.assertTrue(len(segwit_input.witnesses) == 4)
         self.assertTrue(len(segwit_input.witnesses[0]) == 0)
 
@@ -87,6 +92,25 @@ class TestTransaction(unittest.TestCase):
         self.assertEqual(parsed_2, wit_2)
         self.assertEqual(parsed_3, wit_3)
 
+        # the stack is serialized as 5 CompactSizes followed by its items
+        self.assertEqual(5 + sum(len(w) for w in segwit_input.witnesses),
+                         segwit_input.witness_size)
+        self.assertEqual(tx.size - 4 - tx._offset_before_tx_witnesses,
+                         sum(i.witness_size for i in tx.inputs))
+
+        non_segwit = Transaction(read_test_data("size_non_segwit.txt"))
+        self.assertEqual(0, non_segwit.inputs[0].witness_count)
+        self.assertEqual(0, non_segwit.inputs[0].witness_size)
+        self.assertEqual([], non_segwit.inputs[0].witnesses)
+
+    def test_pickle(self):
+        tx = Transaction(read_test_data("segwit.txt"))
+        tx.inputs[0].witness_count
+        self.assertIsInstance(tx.inputs[0]._witness_data, memoryview)
+        copy = pickle.loads(pickle.dumps(tx))
+        self.assertEqual(tx.txid, copy.txid)
+        self.assertEqual(tx.inputs[0].witnesses, copy.inputs[0].witnesses)
+
     def test_vsize(self):
         segwit_tx = Transaction(read_test_data("size_segwit.txt"))
         non_segwit_tx = Transaction(read_test_data("size_non_segwit.txt"))
@@ -97,6 +121,8 @@ class TestTransaction(unittest.TestCase):
         self.assertNotEqual(segwit_tx.vsize, segwit_tx.size)
         self.assertEqual(segwit_tx.vsize, 208)
         self.assertEqual(segwit_tx.size, 373)
+        self.assertEqual(segwit_tx.weight, 829)
+        self.assertEqual(non_segwit_tx.weight, 4 * 189)
 
     def test_large(self):
         data = read_test_data("large_tx.txt")
@@ -107,6 +133,29 @@ class TestTransaction(unittest.TestCase):
                        "a5fb8ed670fb85f13bdbcf")
         self.assertTrue(tx.size == len(tx.hex))
 
+    def test_lazy(self):
+        data = read_test_data("segwit.txt")
+        eager = Transaction(data)
+        tx = Transaction(data, lazy=True)
+        self.assertIsNone(tx._inputs)
+        self.assertIsNone(tx._outputs)
+        self.assertEqual(eager.txid, tx.txid)
+        self.assertEqual(eager.size, tx.size)
+        self.assertEqual(eager.weight, tx.weight)
+        self.assertEqual(eager.n_inputs, tx.n_inputs)
+        self.assertEqual(eager.n_outputs, tx.n_outputs)
+        self.assertIsNone(tx._inputs)
+
+        self.assertEqual([i.hex for i in eager.inputs],
+                         [i.hex for i in tx.inputs])
+        self.assertEqual([i.witnesses for i in eager.inputs],
+                         [i.witnesses for i in tx.inputs])
+        self.assertEqual([o.value for o in eager.outputs],
+                         [o.value for o in tx.outputs])
+
+        lazy_incomplete = read_test_data("invalid_tx.txt")
+        self.assertRaises(Exception, Transaction, lazy_incomplete, True)
+
     def test_incomplete(self):
         data = read_test_data("invalid_tx.txt")
 
@@ -0,0 +1,99 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.transaction import Transaction
+from blockchain_parser.txgraph import export_tx_graph, TxGraph, \
+    UNKNOWN_FUNDING
+from .utils import write_chain, make_tx, make_coinbase, COINBASE, \
+    COINBASE_SCRIPT
+
+OTHER_SCRIPT = b"\x51"
+
+
+class TestTxGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+
+        coinbase = make_coinbase(0)
+        self.tx1 = make_tx([(Transaction(coinbase).txid_bytes, 0)],
+                           [(3000000000, OTHER_SCRIPT),
+                            (1990000000, COINBASE_SCRIPT)])
+        tx1_txid = Transaction(self.tx1).txid_bytes
+        self.tx2 = make_tx([(tx1_txid, 1), (tx1_txid, 0)],
+                           [(4980000000, OTHER_SCRIPT)])
+        self.tx3 = make_tx([(b"\x42" * 32, 7)], [(1000, OTHER_SCRIPT)])
+        self.block_indexes = write_chain(self.tmpdir.name, [
+            ([coinbase], []),
+            ([make_coinbase(1), self.tx1],
+             [[(0, True, 5000000000, COINBASE_SCRIPT)]]),
+            ([COINBASE], []),
+            ([make_coinbase(3), self.tx2, self.tx3],
+             [[(1, False, 1990000000, COINBASE_SCRIPT),
+               (1, False, 3000000000, OTHER_SCRIPT)],
+              [(1, False, 2000, OTHER_SCRIPT)]]),
+            ([COINBASE], []),
+        ])
+        self.path = os.path.join(self.tmpdir.name, "graph")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_export(self):
+        graph = export_tx_graph(self.blockchain, self.block_indexes,
+                                self.path, chunk_size=1)
+        # the last block duplicates the coinbase of block 2
+        self.assertEqual(7, graph.n_transactions)
+        self.assertEqual(4, graph.n_edges)
+        self.assertEqual([0, 1, 3, 4, 7, 7], list(graph.blocks))
+        self.assertEqual([0, 0, 0, 1, 1, 1, 3, 4], list(graph.indptr))
+
+        tx1 = graph.get_id(Transaction(self.tx1).txid)
+        tx2 = graph.get_id(Transaction(self.tx2).txid)
+        self.assertEqual(2, tx1)
+        self.assertEqual(5, tx2)
+        self.assertEqual(Transaction(self.tx2).txid, graph.get_txid(tx2))
+        self.assertEqual(3, graph.get_height(tx2))
+        self.assertEqual(2, graph.get_height(3))
+        self.assertIsNone(graph.get_id("00" * 32))
+
+        funding, vout, value = graph.get_edges(tx2)
+        self.assertEqual([tx1, tx1], list(funding))
+        self.assertEqual([1, 0], list(vout))
+        self.assertEqual([1990000000, 3000000000], list(value))
+        self.assertEqual([0], list(graph.get_edges(tx1)[0]))
+        self.assertEqual([UNKNOWN_FUNDING], list(graph.get_edges(6)[0]))
+
+        # opening a graph does not write to it
+        graph.close()
+        txids = os.path.join(self.path, "txids")
+        mtimes = dict((name, os.stat(os.path.join(txids, name)).st_mtime_ns)
+                      for name in os.listdir(txids))
+        with TxGraph(self.path) as reopened:
+            self.assertEqual([tx1, tx1], list(reopened.get_edges(tx2)[0]))
+            self.assertEqual(tx2, reopened.get_id(Transaction(self.tx2).txid))
+        self.assertEqual(mtimes, dict(
+            (name, os.stat(os.path.join(txids, name)).st_mtime_ns)
+            for name in os.listdir(txids)))
+
+        with self.assertRaises(Exception):
+            export_tx_graph(self.blockchain, self.block_indexes, self.path)
+
+    def test_end(self):
+        graph = export_tx_graph(self.blockchain, self.block_indexes,
+                                self.path, end=1)
+        self.assertEqual(3, graph.n_transactions)
+        self.assertEqual(1, graph.n_edges)
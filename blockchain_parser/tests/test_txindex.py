@@ -0,0 +1,85 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.transaction import Transaction
+from blockchain_parser.txindex import TxIndex, build_txindex
+from .utils import read_test_data, make_header, make_block, write_blk_file
+
+TRANSACTIONS = [read_test_data(name) for name in (
+    "size_non_segwit.txt", "size_segwit.txt", "bip69_true.txt",
+    "bip69_false.txt", "segwit.txt", "large_tx.txt")]
+
+
+class TestTxIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blocks = os.path.join(self.tmpdir.name, "blocks")
+        os.mkdir(self.blocks)
+        self.index = os.path.join(self.tmpdir.name, "txindex")
+
+        write_blk_file(os.path.join(self.blocks, "blk00000.dat"), [
+            make_block(make_header(nonce=1), TRANSACTIONS[:2]),
+            make_block(make_header(nonce=2), TRANSACTIONS[2:3]),
+        ])
+        write_blk_file(os.path.join(self.blocks, "blk00001.dat"), [
+            make_block(make_header(nonce=3), TRANSACTIONS[3:5]),
+        ])
+        self.blockchain = Blockchain(self.blocks)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def assertIndexed(self, txindex, raw_tx, nonce):
+        txid = Transaction(raw_tx).txid
+        header, tx = self.blockchain.get_transaction(txid, txindex)
+        self.assertEqual(txid, tx.txid)
+        self.assertEqual(raw_tx, tx.hex)
+        self.assertEqual(nonce, header.nonce)
+
+    def test_build_and_update(self):
+        txindex = build_txindex(self.blockchain, self.index, workers=1)
+        self.assertEqual(5, len(txindex))
+        self.assertEqual((1, os.path.getsize(
+            os.path.join(self.blocks, "blk00001.dat"))), txindex.position)
+        for raw_tx, nonce in zip(TRANSACTIONS, (1, 1, 2, 3, 3)):
+            self.assertIndexed(txindex, raw_tx, nonce)
+
+        missing = Transaction(TRANSACTIONS[5]).txid
+        self.assertIsNone(txindex.get(missing))
+        self.assertIsNone(self.blockchain.get_transaction(missing, txindex))
+
+        # blocks appended to the last file are indexed by the next update
+        write_blk_file(os.path.join(self.blocks, "blk00001.dat"),
+                       [make_block(make_header(nonce=4), TRANSACTIONS[5:])],
+                       mode="ab")
+        txindex.close()
+        with TxIndex(self.index) as txindex:
+            self.assertEqual(1, txindex.update(self.blockchain, workers=1))
+
+        txindex = TxIndex(self.index)
+        self.assertEqual(6, len(txindex))
+        self.assertIndexed(txindex, TRANSACTIONS[5], 4)
+        self.assertIndexed(txindex, TRANSACTIONS[0], 1)
+        txindex.compact()
+        self.assertIndexed(txindex, TRANSACTIONS[4], 3)
+        self.assertEqual(0, txindex.update(self.blockchain, workers=1))
+        txindex.close()
+
+    def test_parallel_build(self):
+        txindex = build_txindex(self.blockchain, self.index, workers=2)
+        self.assertEqual(5, len(txindex))
+        self.assertIndexed(txindex, TRANSACTIONS[3], 3)
+        txindex.close()
@@ -26,6 +26,9 @@ class TestUtils(unittest.TestCase):
         data = a2b_hex("deadbeef")
         self.assertEqual(utils.format_hash(data), "efbeadde")
 
+    def test_parse_hash(self):
+        self.assertEqual(utils.parse_hash("efbeadde"), a2b_hex("deadbeef"))
+
     def test_decode_uint32(self):
         uint32_dict = {
             "01000000": 1,
@@ -53,3 +56,24 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(utils.decode_compactsize(case3), (1, 5))
         case4 = a2b_hex("ff0100000000000000")
         self.assertEqual(utils.decode_compactsize(case4), (1, 9))
+
+    def test_varint_round_trip(self):
+        for n in (0, 1, 127, 128, 255, 16511, 16512, 2 ** 32, 2 ** 63):
+            encoded = utils.encode_varint(n)
+            self.assertEqual(utils.decode_varint(encoded), (n, len(encoded)))
+
+    def test_compactsize_round_trip(self):
+        for n in (0, 252, 253, 0xffff, 0x10000, 2 ** 32):
+            encoded = utils.encode_compactsize(n)
+            self.assertEqual(utils.decode_compactsize(encoded),
+                             (n, len(encoded)))
+
+    def test_decode_compact_target(self):
+        self.assertEqual(0xffff << 208, utils.decode_compact_target(0x1d00ffff))
+        self.assertEqual(0x7fffff << 232,
+                         utils.decode_compact_target(0x207fffff))
+        self.assertEqual(0x12, utils.decode_compact_target(0x01123456))
+        self.assertEqual(0, utils.decode_compact_target(0x00000000))
+        # negative and overflowing targets
+        self.assertIsNone(utils.decode_compact_target(0x04923456))
+        self.assertIsNone(utils.decode_compact_target(0xff123456))
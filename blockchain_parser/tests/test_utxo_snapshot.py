@@ -0,0 +1,105 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import struct
+import tempfile
+import unittest
+from binascii import a2b_hex
+
+from blockchain_parser.undo import compress_script, decompress_script
+from blockchain_parser.utxo_snapshot import UTXOCoin, UTXOSnapshotReader, \
+    UTXOSnapshotWriter
+from blockchain_parser.utils import encode_varint, compress_txout_amt
+
+GENESIS_PUBKEY = "04678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0" \
+                 "ea1f61deb649f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b8d" \
+                 "578a4c702b6bf11d5f"
+
+SCRIPTS = [
+    # P2PKH
+    a2b_hex("76a91432ba382cf668657bae15ee0a97fa87f12e1bc89f88ac"),
+    # P2SH
+    a2b_hex("a914e9c3dd0c07aac76179ebc76a6c78d4d67c6c160a87"),
+    # P2PK, compressed and uncompressed keys
+    a2b_hex("2102c0993f639534d348e1dca30566491e6cb11c14afa13ec244c05396a9"
+            "839aeb17ac"),
+    a2b_hex("41" + GENESIS_PUBKEY + "ac"),
+    # P2WPKH
+    a2b_hex("0014a8a3d5b4d2a2e5cd4e4fbd00d1ac5bc1f5c0d06b"),
+    # OP_RETURN and a script long enough to need a multi-byte VarInt
+    a2b_hex("6a0b68656c6c6f20776f726c64"),
+    b"\x6a\x4c\xc8" + b"\xab" * 200,
+]
+
+
+class TestUTXOSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "utxo.dat")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_script_compression(self):
+        for script in SCRIPTS:
+            self.assertEqual(script, decompress_script(compress_script(script)))
+        self.assertEqual(21, len(compress_script(SCRIPTS[0])))
+        self.assertEqual(33, len(compress_script(SCRIPTS[3])))
+
+    def test_round_trip(self):
+        base_hash = "000000000000000000025e8f6fa1b2a3b0fa6e5f3f5c8b9d0c1a2" \
+                    "b3c4d5e6f70"
+        coins = []
+        for i, script in enumerate(SCRIPTS):
+            txid = ("%02x" % i) * 32
+            for vout in (0, 1, 300):
+                coins.append(UTXOCoin(txid, vout, 840000 + i, vout == 0,
+                                      (i + 1) * 10 ** (vout % 9) + vout,
+                                      script))
+
+        with UTXOSnapshotWriter(self.path, base_hash) as writer:
+            for coin in coins:
+                writer.write(coin)
+
+        reader = UTXOSnapshotReader(self.path, chunk_size=64)
+        self.assertEqual(base_hash, reader.base_block_hash)
+        self.assertEqual(len(coins), reader.coins_count)
+        self.assertEqual(b"\xf9\xbe\xb4\xd9", reader.network_magic)
+
+        read = list(reader)
+        self.assertEqual(len(coins), len(read))
+        for expected, coin in zip(coins, read):
+            self.assertEqual(expected.txid, coin.txid)
+            self.assertEqual(expected.vout, coin.vout)
+            self.assertEqual(expected.height, coin.height)
+            self.assertEqual(expected.is_coinbase, coin.is_coinbase)
+            self.assertEqual(expected.value, coin.value)
+            self.assertEqual(expected.script, coin.script)
+
+    def test_legacy_format(self):
+        txid = a2b_hex("ab" * 32)
+        data = b"\x11" * 32 + struct.pack("<Q", 1) + txid + \
+            struct.pack("<I", 7) + encode_varint(2 * 100 + 1) + \
+            encode_varint(compress_txout_amt(5000000000)) + \
+            compress_script(SCRIPTS[0])
+        with open(self.path, "wb") as f:
+            f.write(data)
+
+        reader = UTXOSnapshotReader(self.path)
+        self.assertIsNone(reader.version)
+        coin, = list(reader)
+        self.assertEqual("ab" * 32, coin.txid)
+        self.assertEqual(7, coin.vout)
+        self.assertEqual(100, coin.height)
+        self.assertTrue(coin.is_coinbase)
+        self.assertEqual(5000000000, coin.value)
+        self.assertEqual(SCRIPTS[0], coin.script)
@@ -0,0 +1,126 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.index import DBBlockIndex
+from blockchain_parser.utils import decode_compact_target, double_sha256
+from blockchain_parser.verify import verify_header_chain
+from .utils import make_header, make_block, make_coinbase, write_blk_file, \
+    encode_block_index
+
+TIME = 1231006505
+
+
+def mine_header(prev_hash, time, bits=0x207fffff, nonce=0):
+    target = decode_compact_target(bits)
+    while True:
+        header = make_header(prev_hash, time, bits, nonce)
+        if int.from_bytes(double_sha256(header), "little") <= target:
+            return header
+        nonce += 1
+
+
+def unmined_header(prev_hash, time, bits=0x207fffff):
+    target = decode_compact_target(bits)
+    nonce = 0
+    while True:
+        header = make_header(prev_hash, time, bits, nonce)
+        if int.from_bytes(double_sha256(header), "little") > target:
+            return header
+        nonce += 1
+
+
+class TestVerifyHeaderChain(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.blockchain = Blockchain(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, headers, blk_headers=None):
+        """Writes the blocks of headers into blk00000.dat, with the headers
+        of blk_headers if given, and returns their index entries"""
+        blk_headers = blk_headers or headers
+        positions = write_blk_file(
+            os.path.join(self.tmpdir.name, "blk00000.dat"),
+            [make_block(h, [make_coinbase(i)])
+             for i, h in enumerate(blk_headers)])
+        return [DBBlockIndex(double_sha256(h), encode_block_index(
+                    i, h, 1, 0, positions[i])) for i, h in enumerate(headers)]
+
+    def chain(self, n, times=None):
+        headers = []
+        prev_hash = b"\x00" * 32
+        for i in range(n):
+            time = TIME + 600 * i if times is None else times[i]
+            headers.append(mine_header(prev_hash, time, nonce=i * 1000))
+            prev_hash = double_sha256(headers[-1])
+        return headers
+
+    def verify(self, block_indexes, **kwargs):
+        kwargs.setdefault("workers", 1)
+        return verify_header_chain(self.blockchain, block_indexes, **kwargs)
+
+    def test_valid_chain(self):
+        block_indexes = self.write(self.chain(30))
+        for from_blk in (False, True):
+            report = self.verify(block_indexes, from_blk=from_blk,
+                                 chunk_size=7)
+            self.assertTrue(report.ok, str(report))
+            self.assertEqual(30, report.n_headers)
+
+        report = self.verify(block_indexes, start=20, end=24, workers=2)
+        self.assertTrue(report.ok)
+        self.assertEqual((20, 24, 5), (report.start_height,
+                                       report.end_height, report.n_headers))
+
+        report = self.verify(block_indexes, pow_limit=1 << 200)
+        self.assertEqual({"pow": 30}, report.counts())
+
+    def test_breaks(self):
+        headers = self.chain(20)
+        # block 5 does not meet its target
+        headers[5] = unmined_header(double_sha256(headers[4]), TIME + 3000)
+        # block 12 does not link to block 11
+        headers[12] = mine_header(b"\x42" * 32, TIME + 7200)
+        # block 16 is older than the median time past
+        headers[16] = mine_header(double_sha256(headers[15]), TIME)
+        block_indexes = self.write(headers)
+
+        report = self.verify(block_indexes)
+        self.assertEqual([(5, "pow"), (6, "link"), (12, "link"),
+                          (13, "link"), (16, "time"), (17, "link")],
+                         [(b.height, b.reason) for b in report.breaks])
+        self.assertIn("4242", str(report))
+
+        report = self.verify(block_indexes, start=16, end=16)
+        self.assertEqual([(16, "time")],
+                         [(b.height, b.reason) for b in report.breaks])
+
+    def test_blk_mismatch(self):
+        headers = self.chain(10)
+        blk_headers = list(headers)
+        blk_headers[3] = headers[3][:-1] + b"\xff"
+        block_indexes = self.write(headers, blk_headers)
+        missing = DBBlockIndex(double_sha256(headers[9]),
+                               encode_block_index(9, headers[9], 1))
+        block_indexes[9] = missing
+
+        self.assertTrue(self.verify(block_indexes).ok)
+        report = self.verify(block_indexes, from_blk=True)
+        self.assertEqual([(3, "hash"), (4, "link"), (9, "missing")],
+                         [(b.height, b.reason) for b in report.breaks
+                          if b.reason != "pow"])
@@ -1,9 +1,177 @@
 import os
+import struct
 from binascii import a2b_hex
 
+from blockchain_parser.blockchain import BITCOIN_CONSTANT
+from blockchain_parser.index import DBBlockIndex, BLOCK_HAVE_DATA, \
+    BLOCK_HAVE_UNDO
+from blockchain_parser.undo import compress_script
+from blockchain_parser.utils import encode_varint, encode_compactsize, \
+    compress_txout_amt, double_sha256, format_hash
+
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
+# A coinbase transaction and the P2PKH script its only output pays to
+COINBASE = a2b_hex("01000000010000000000000000000000000000000000000000000000"
+                   "000000000000000000ffffffff4203c8e405fabe6d6d98b0e98e3809"
+                   "941f1fd8cafe7c8236e27b8d1a776b1835aa548bb84fe5b5f3d70100"
+                   "00000000000002650300aaa757eb0000002f736c7573682f00000000"
+                   "01baa98396000000001976a9147c154ed1dc59609e3d26abb2df2ea3"
+                   "d587cd8c4188ac00000000")
+COINBASE_SCRIPT = a2b_hex("76a9147c154ed1dc59609e3d26abb2df2ea3d587cd8c4188ac")
+
 
 def read_test_data(filename):
     with open(os.path.join(dir_path, "data/", filename)) as f:
-        return a2b_hex(f.read().strip())
\ No newline at end of file
+        return a2b_hex(f.read().strip())
+
+
+def make_header(prev_hash=b"\x00" * 32, time=1231006505, bits=0x207fffff,
+                nonce=0, version=1, merkle_root=b"\x00" * 32):
+    """Builds the 80 bytes of a block header, hashes in internal byte order"""
+    return struct.pack("<I", version) + prev_hash + merkle_root + \
+        struct.pack("<III", time, bits, nonce)
+
+
+def make_tx(inputs, outputs, script_sig=b""):
+    """Builds a legacy transaction spending (txid, vout) outpoints, txids in
+    internal byte order, and paying (value, script) outputs"""
+    raw = [struct.pack("<I", 1), encode_compactsize(len(inputs))]
+    for txid, vout in inputs:
+        raw.append(txid + struct.pack("<I", vout) +
+                   encode_compactsize(len(script_sig)) + script_sig +
+                   b"\xff\xff\xff\xff")
+    raw.append(encode_compactsize(len(outputs)))
+    for value, script in outputs:
+        raw.append(struct.pack("<q", value) +
+                   encode_compactsize(len(script)) + script)
+    raw.append(struct.pack("<I", 0))
+    return b"".join(raw)
+
+
+def make_coinbase(height, value=5000000000, script=COINBASE_SCRIPT):
+    """Builds a coinbase transaction, its height making its txid unique"""
+    return make_tx([(b"\x00" * 32, 0xffffffff)], [(value, script)],
+                   b"\x03" + struct.pack("<I", height)[:3])
+
+
+def make_block(header, raw_transactions):
+    return header + encode_compactsize(len(raw_transactions)) + \
+        b"".join(raw_transactions)
+
+
+def write_blk_file(path, raw_blocks, mode="wb"):
+    """Writes blocks (or undo data) framed as in bitcoind's .blk files,
+    returns the position of the data of each of them"""
+    positions = []
+    with open(path, mode) as f:
+        for raw_block in raw_blocks:
+            f.write(BITCOIN_CONSTANT + struct.pack("<I", len(raw_block)))
+            positions.append(f.tell())
+            f.write(raw_block)
+    return positions
+
+
+def encode_block_index(height, header, n_tx, file=-1, data_pos=-1,
+                       undo_pos=-1):
+    """Builds a block index entry as stored by bitcoind in its leveldb"""
+    status = 0
+    if data_pos != -1:
+        status |= BLOCK_HAVE_DATA
+    if undo_pos != -1:
+        status |= BLOCK_HAVE_UNDO
+    fields = [250000, height, status, n_tx]
+    if status:
+        fields.append(file)
+    if data_pos != -1:
+        fields.append(data_pos)
+    if undo_pos != -1:
+        fields.append(undo_pos)
+    return b"".join(encode_varint(x) for x in fields) + header
+
+
+def encode_block_undo(spent_outputs):
+    """Builds the undo data of a block, given for each of its non coinbase
+    transactions the list of (height, is_coinbase, value, script) of the
+    outputs it spends"""
+    data = [encode_compactsize(len(spent_outputs))]
+    for outputs in spent_outputs:
+        data.append(encode_compactsize(len(outputs)))
+        for height, is_coinbase, value, script in outputs:
+            data.append(encode_varint(height * 2 + int(is_coinbase)))
+            if height > 0:
+                data.append(b"\x00")
+            data.append(encode_varint(compress_txout_amt(value)))
+            data.append(compress_script(script))
+    return b"".join(data)
+
+
+def write_chain(path, blocks, file=0, first_height=0,
+                prev_hash=b"\x00" * 32, time=1231006505):
+    """Writes a chain of blocks into blk?????.dat and their undo data into
+    rev?????.dat, blocks being (raw_transactions, spent_outputs) pairs as
+    taken by make_block and encode_block_undo. Returns the DBBlockIndex of
+    the blocks"""
+    headers = []
+    raw_blocks = []
+    undos = []
+    for i, (transactions, spent_outputs) in enumerate(blocks):
+        header = make_header(prev_hash, time + 600 * i, nonce=i)
+        headers.append(header)
+        raw_blocks.append(make_block(header, transactions))
+        undos.append(encode_block_undo(spent_outputs))
+        prev_hash = double_sha256(header)
+
+    data_positions = write_blk_file(
+        os.path.join(path, "blk%05d.dat" % file), raw_blocks)
+    undo_positions = write_blk_file(
+        os.path.join(path, "rev%05d.dat" % file), undos)
+
+    block_indexes = []
+    for i, header in enumerate(headers):
+        undo_pos = undo_positions[i] if blocks[i][1] else -1
+        block_indexes.append(DBBlockIndex(
+            format_hash(double_sha256(header)),
+            encode_block_index(first_height + i, header, len(blocks[i][0]),
+                               file, data_positions[i], undo_pos)))
+    return block_indexes
+
+
+def encode_leb128(n):
+    """Encodes a varint as used by LevelDB"""
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def encode_log_file(records):
+    """Builds a LevelDB log file of FULL records, checksums being left
+    blank as they are not checked"""
+    return b"".join(b"\x00" * 4 + struct.pack("<HB", len(record), 1) +
+                    record for record in records)
+
+
+def encode_write_batch(sequence, puts, deletes=()):
+    """Builds a LevelDB write batch of (key, value) puts and deletions"""
+    batch = struct.pack("<QI", sequence, len(puts) + len(deletes))
+    for key, value in puts:
+        batch += b"\x01" + encode_leb128(len(key)) + key + \
+            encode_leb128(len(value)) + value
+    for key in deletes:
+        batch += b"\x00" + encode_leb128(len(key)) + key
+    return batch
+
+
+def write_leveldb(path, items, log_number=1):
+    """Writes a LevelDB database holding (key, value) items in its log
+    only, without tables"""
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "CURRENT"), "w") as f:
+        f.write("MANIFEST-000000\n")
+    with open(os.path.join(path, "MANIFEST-000000"), "wb") as f:
+        f.write(encode_log_file([b"\x02" + encode_leb128(log_number)]))
+    with open(os.path.join(path, "%06d.log" % log_number), "wb") as f:
+        f.write(encode_log_file([encode_write_batch(1, items)]))
@@ -11,82 +11,141 @@
 
 from math import ceil
 
-from .utils import decode_compactsize, decode_uint32, double_sha256, format_hash
+from .utils import decode_compactsize_from, decode_uint32, double_sha256, \
+    format_hash
 from .input import Input
 from .output import Output
 
+# Hash of the previous transaction referenced by the input of a coinbase
+NULL_HASH = b"\x00" * 32
+
 
 def bip69_sort(data):
     return list(sorted(data, key=lambda t: (t[0], t[1])))
 
 
+def get_transaction_sections(raw_hex, offset=0):
+    """Walks over the transaction starting at offset in raw_hex without
+    decoding it. Returns the offsets of its inputs, of its outputs and of
+    the witness stacks of its inputs (None for non SegWit transactions),
+    each followed by the offset where they end, and the offset of its
+    locktime.
+    """
+    start = offset
+    offset += 4
+
+    # adds basic support for segwit transactions
+    #   - https://bitcoincore.org/en/segwit_wallet_dev/
+    #   - https://en.bitcoin.it/wiki/Protocol_documentation#BlockTransactions
+    is_segwit = raw_hex[offset:offset + 2] == b'\x00\x01'
+    if is_segwit:
+        offset += 2
+
+    n_inputs, varint_size = decode_compactsize_from(raw_hex, offset)
+    offset += varint_size
+    input_offsets = [offset]
+    for i in range(n_inputs):
+        script_length, varint_size = decode_compactsize_from(raw_hex,
+                                                             offset + 36)
+        offset += 36 + varint_size + script_length + 4
+        input_offsets.append(offset)
+
+    n_outputs, varint_size = decode_compactsize_from(raw_hex, offset)
+    offset += varint_size
+    output_offsets = [offset]
+    for i in range(n_outputs):
+        script_length, varint_size = decode_compactsize_from(raw_hex,
+                                                             offset + 8)
+        offset += 8 + varint_size + script_length
+        output_offsets.append(offset)
+
+    witness_offsets = None
+    if is_segwit:
+        witness_offsets = [offset - start]
+        for i in range(n_inputs):
+            n_items, varint_size = decode_compactsize_from(raw_hex, offset)
+            offset += varint_size
+            for j in range(n_items):
+                item_length, varint_size = decode_compactsize_from(raw_hex,
+                                                                   offset)
+                offset += varint_size + item_length
+            witness_offsets.append(offset - start)
+
+    if offset + 4 > len(raw_hex):
+        raise Exception("Incomplete transaction!")
+    return [o - start for o in input_offsets], \
+        [o - start for o in output_offsets], witness_offsets, offset - start
+
+
 class Transaction(object):
-    """Represents a bitcoin transaction"""
+    """Represents a bitcoin transaction.
+
+    If lazy is True, only the offsets of the inputs, outputs and witnesses
+    are read on construction, the Input and Output objects being built on
+    first access.
+    """
 
-    def __init__(self, raw_hex):
+    def __init__(self, raw_hex, lazy=False):
         self._hash = None
+        self._hash_bytes = None
         self._txid = None
-        self.inputs = None
-        self.outputs = None
+        self._txid_bytes = None
+        self._inputs = None
+        self._outputs = None
         self._version = None
         self._locktime = None
-        self._size = None
-        self.n_inputs = 0
-        self.n_outputs = 0
-        self.is_segwit = False
-
-        offset = 4
-
-        # adds basic support for segwit transactions
-        #   - https://bitcoincore.org/en/segwit_wallet_dev/
-        #   - https://en.bitcoin.it/wiki/Protocol_documentation#BlockTransactions
-        if b'\x00\x01' == raw_hex[offset:offset + 2]:
-            self.is_segwit = True
-            offset += 2
-
-        self.n_inputs, varint_size = decode_compactsize(raw_hex[offset:])
-        offset += varint_size
-
-        self.inputs = []
-        for i in range(self.n_inputs):
-            input = Input.from_hex(raw_hex[offset:])
-            offset += input.size
-            self.inputs.append(input)
-
-        self.n_outputs, varint_size = decode_compactsize(raw_hex[offset:])
-        offset += varint_size
-
-        self.outputs = []
-        for i in range(self.n_outputs):
-            output = Output.from_hex(raw_hex[offset:])
-            offset += output.size
-            self.outputs.append(output)
 
+        self._input_offsets, self._output_offsets, self._witness_offsets, \
+            locktime_offset = get_transaction_sections(raw_hex)
+        self.n_inputs = len(self._input_offsets) - 1
+        self.n_outputs = len(self._output_offsets) - 1
+        self.is_segwit = self._witness_offsets is not None
         if self.is_segwit:
-            self._offset_before_tx_witnesses = offset
-            for inp in self.inputs:
-                tx_witnesses_n, varint_size = decode_compactsize(raw_hex[offset:])
-                offset += varint_size
-                for j in range(tx_witnesses_n):
-                    component_length, varint_size = decode_compactsize(
-                        raw_hex[offset:])
-                    offset += varint_size
-                    witness = raw_hex[offset:offset + component_length]
-                    inp.add_witness(witness)
-                    offset += component_length
-
-        self._size = offset + 4
+            self._offset_before_tx_witnesses = self._witness_offsets[0]
+
+        self._size = locktime_offset + 4
         self.hex = raw_hex[:self._size]
 
-        if self._size != len(self.hex):
-            raise Exception("Incomplete transaction!")
+        if not lazy:
+            self.inputs
+            self.outputs
 
     def __repr__(self):
         return "Transaction(%s)" % self.hash
 
     @classmethod
-    def from_hex(cls, hex):
-        return cls(hex)
+    def from_hex(cls, hex, lazy=False):
+        return cls(hex, lazy)
+
+    @property
+    def inputs(self):
+        """Returns the list of the transaction's inputs. Their witness
+        stacks are views of the transaction's data, only split into items
+        when accessed."""
+        if self._inputs is None:
+            offsets = self._input_offsets
+            if self.is_segwit:
+                data = memoryview(self.hex)
+                witnesses = self._witness_offsets
+                self._inputs = [
+                    Input.from_hex(self.hex[offsets[i]:offsets[i + 1]],
+                                   data[witnesses[i]:witnesses[i + 1]])
+                    for i in range(self.n_inputs)]
+            else:
+                self._inputs = [
+                    Input.from_hex(self.hex[offsets[i]:offsets[i + 1]])
+                    for i in range(self.n_inputs)]
+        return self._inputs
+
+    @property
+    def outputs(self):
+        """Returns the list of the transaction's outputs"""
+        if self._outputs is None:
+            offsets = self._output_offsets
+            self._outputs = [
+                Output.from_hex(self.hex[offsets[i]:offsets[i + 1]])
+                for i in range(self.n_outputs)]
+        return self._outputs
 
     @property
     def version(self):
@@ -107,10 +166,17 @@ class Transaction(object):
         """Returns the transaction's id. Equivalent to the hash for non SegWit transactions,
         it differs from it for SegWit ones. """
         if self._hash is None:
-            self._hash = format_hash(double_sha256(self.hex))
+            self._hash = format_hash(self.hash_bytes)
 
         return self._hash
 
+    @property
+    def hash_bytes(self):
+        """Returns the transaction's hash in internal byte order"""
+        if self._hash_bytes is None:
+            self._hash_bytes = double_sha256(self.hex)
+        return self._hash_bytes
+
     @property
     def size(self):
         """Returns the transactions size in bytes including the size of the
@@ -118,10 +184,10 @@ class Transaction(object):
         return self._size
 
     @property
-    def vsize(self):
-        """Returns the transaction size in virtual bytes."""
+    def weight(self):
+        """Returns the transaction weight, as defined by BIP 141."""
         if not self.is_segwit:
-            return self._size
+            return self._size * 4
         else:
             # the witness is the last element in a transaction before the
             # 4 byte locktime and self._offset_before_tx_witnesses is the
@@ -131,16 +197,30 @@ class Transaction(object):
             # size of the transaction without the segwit marker (2 bytes) and
             # the witness
             stripped_size = self._size - (2 + witness_size)
-            weight = stripped_size * 3 + self._size
+            return stripped_size * 3 + self._size
 
+    @property
+    def vsize(self):
+        """Returns the transaction size in virtual bytes."""
+        if not self.is_segwit:
+            return self._size
+        else:
             # vsize is weight / 4 rounded up
-            return ceil(weight / 4)
+            return ceil(self.weight / 4)
 
     @property
     def txid(self):
         """Returns the transaction's id. Equivalent to the hash for non SegWit transactions,
         it differs from it for SegWit ones. """
         if self._txid is None:
+            self._txid = format_hash(self.txid_bytes)
+
+        return self._txid
+
+    @property
+    def txid_bytes(self):
+        """Returns the transaction's id in internal byte order"""
+        if self._txid_bytes is None:
             # segwit transactions have two transaction ids/hashes, txid and wtxid
             # txid is a hash of all of the legacy transaction fields only
             if self.is_segwit:
@@ -149,14 +229,14 @@ class Transaction(object):
                                                                                  -4:]
             else:
                 txid_data = self.hex
-            self._txid = format_hash(double_sha256(txid_data))
+            self._txid_bytes = double_sha256(txid_data)
 
-        return self._txid
+        return self._txid_bytes
 
     def is_coinbase(self):
         """Returns whether the transaction is a coinbase transaction"""
         for input in self.inputs:
-            if input.transaction_hash == "0" * 64:
+            if input.transaction_hash_bytes == NULL_HASH:
                 return True
         return False
 
@@ -182,7 +262,7 @@ class Transaction(object):
             return True
 
         input_keys = [
-            (i.transaction_hash, i.transaction_index)
+            (i.transaction_hash_bytes[::-1], i.transaction_index)
             for i in self.inputs
         ]
 
@@ -0,0 +1,221 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import json
+import os
+import shutil
+from array import array
+
+import numpy as np
+
+from .interner import HashInterner
+from .utils import parse_hash
+
+# Columns of the edges, one edge per transaction input: id of the funding
+# transaction, index of the spent output and its value in satoshis
+EDGE_COLUMNS = (("funding", "I"), ("vout", "I"), ("value", "q"))
+
+# Funding id of the inputs spending transactions which are not part of the
+# graph
+UNKNOWN_FUNDING = 0xffffffff
+
+
+class _ChunkWriter(object):
+    """Buffers the edges and the number of edges of each transaction, and
+    writes them to numbered .npy chunk files"""
+
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunks = 0
+        self._reset()
+
+    def _reset(self):
+        self.degrees = array("I")
+        self.columns = dict((name, array(code))
+                            for name, code in EDGE_COLUMNS)
+
+    def add_transaction(self, edges):
+        self.degrees.append(len(edges))
+        for funding, vout, value in edges:
+            self.columns["funding"].append(funding)
+            self.columns["vout"].append(vout)
+            self.columns["value"].append(value)
+        if len(self.columns["funding"]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.degrees:
+            return
+        arrays = dict(self.columns, degrees=self.degrees)
+        for name, data in arrays.items():
+            np.save(self._chunk_path(name, self.chunks),
+                    np.frombuffer(data, data.typecode))
+        self.chunks += 1
+        self._reset()
+
+    def _chunk_path(self, name, number):
+        return os.path.join(self.path, "%s-%06d.npy" % (name, number))
+
+    def merge(self, path):
+        """Concatenates the chunks into the final arrays, the edge counts
+        being turned into the row offsets of the CSR layout"""
+        self.flush()
+        degrees = [np.load(self._chunk_path("degrees", i), mmap_mode="r")
+                   for i in range(self.chunks)]
+        n_tx = sum(len(d) for d in degrees)
+        n_edges = int(sum(int(d.sum(dtype=np.int64)) for d in degrees))
+
+        indptr = np.lib.format.open_memmap(os.path.join(path, "indptr.npy"),
+                                           "w+", np.int64, (n_tx + 1,))
+        indptr[0] = 0
+        pos = 0
+        for d in degrees:
+            indptr[pos + 1:pos + 1 + len(d)] = \
+                indptr[pos] + np.cumsum(d, dtype=np.int64)
+            pos += len(d)
+        indptr.flush()
+        del indptr
+
+        for name, code in EDGE_COLUMNS:
+            column = np.lib.format.open_memmap(
+                os.path.join(path, "%s.npy" % name), "w+", np.dtype(code),
+                (n_edges,))
+            pos = 0
+            for i in range(self.chunks):
+                chunk = np.load(self._chunk_path(name, i), mmap_mode="r")
+                column[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+            column.flush()
+            del column
+
+
+def export_tx_graph(blockchain, index, path, end=None, cache=None,
+                    chunk_size=1 << 22):
+    """Exports the transaction graph of the main chain, up to the given
+    height, into the directory path and returns it as a TxGraph.
+
+    Transactions get dense ids in chain order, and each input becomes an
+    edge from the spending transaction to the funding one, with the index
+    and value of the spent output read from the undo data. Edges are
+    buffered by chunks of chunk_size, written to disk and merged at the end
+    into CSR arrays: the edges of transaction i are at indptr[i] to
+    indptr[i + 1] in the funding, vout and value arrays.
+    """
+    if os.path.exists(path):
+        raise Exception("Transaction graph directory %s already exists"
+                        % path)
+    os.makedirs(path)
+
+    blockIndexes = blockchain.get_block_indexes(index, cache)
+    if end is not None:
+        blockIndexes = [b for b in blockIndexes if b.height <= end]
+
+    chunks_path = os.path.join(path, "chunks")
+    os.makedirs(chunks_path)
+    writer = _ChunkWriter(chunks_path, chunk_size)
+    block_offsets = [0]
+    with HashInterner(os.path.join(path, "txids")) as txids:
+        for block in blockchain.get_ordered_blocks(blockIndexes, undo=True):
+            transactions = block.transactions
+            if len(transactions) > 1 and block.undo is None:
+                raise Exception("No undo data for block %s" % block.hash)
+
+            count = len(txids)
+            ids = txids.intern_many([tx.txid_bytes for tx in transactions])
+            # the two coinbases duplicating an earlier txid before BIP30
+            # keep the id of the first occurrence and get no row
+            if ids[0] >= count:
+                writer.add_transaction([])
+            for i, tx in enumerate(transactions[1:]):
+                funding = txids.lookup_many([inp.transaction_hash_bytes
+                                             for inp in tx.inputs])
+                funding[funding == -1] = UNKNOWN_FUNDING
+                spent = block.undo.spends[i].outputs
+                writer.add_transaction([
+                    (int(f), inp.transaction_index, s.amt)
+                    for f, inp, s in zip(funding, tx.inputs, spent)])
+            block_offsets.append(len(txids))
+        writer.merge(path)
+    shutil.rmtree(chunks_path)
+
+    np.save(os.path.join(path, "blocks.npy"),
+            np.array(block_offsets, np.int64))
+    first_height = blockIndexes[0].height if blockIndexes else 0
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"first_height": first_height}, f)
+    return TxGraph(path)
+
+
+class TxGraph(object):
+    """Transaction graph written by export_tx_graph, whose arrays are
+    memory mapped read only"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.first_height = json.load(f)["first_height"]
+
+        def load(name):
+            return np.load(os.path.join(path, "%s.npy" % name), mmap_mode="r")
+
+        self.indptr = load("indptr")
+        self.funding = load("funding")
+        self.vout = load("vout")
+        self.value = load("value")
+        self.blocks = load("blocks")
+        self.txids = HashInterner(os.path.join(path, "txids"), read_only=True)
+
+    def __repr__(self):
+        return "TxGraph(transactions=%d, edges=%d)" % (self.n_transactions,
+                                                       self.n_edges)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Releases the mappings of the graph, which are unmapped once the
+        arrays taken from it are no longer used"""
+        self.txids.close()
+        self.indptr = self.funding = self.vout = self.value = \
+            self.blocks = self.txids = None
+
+    @property
+    def n_transactions(self):
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self):
+        return len(self.funding)
+
+    def get_id(self, txid):
+        """Returns the id of the transaction with the given txid, None if
+        it is not part of the graph"""
+        return self.txids.lookup(parse_hash(txid))
+
+    def get_txid(self, tx_id):
+        """Returns the txid of the transaction with the given id"""
+        return self.txids[tx_id][::-1].hex()
+
+    def get_height(self, tx_id):
+        """Returns the height of the block containing a transaction"""
+        return self.first_height + \
+            int(np.searchsorted(self.blocks, tx_id, side="right")) - 1
+
+    def get_edges(self, tx_id):
+        """Returns the (funding tx ids, vouts, values) arrays of the inputs
+        of a transaction"""
+        start, end = self.indptr[tx_id], self.indptr[tx_id + 1]
+        return self.funding[start:end], self.vout[start:end], \
+            self.value[start:end]
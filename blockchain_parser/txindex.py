@@ -0,0 +1,167 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import json
+import os
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from .blockchain import get_files, get_block_positions
+from .block import Block
+from .sortedfile import SortedRecordIndex, write_run, merge_runs
+from .utils import format_hash, parse_hash
+
+# txid (internal byte order), blk file number, position of the block data in
+# the file, offset of the transaction after the block header, size
+_RECORD = struct.Struct("<32sIIII")
+
+
+class TxIndexEntry(object):
+    """Location of a transaction in the .blk files, with the same fields as
+    DBTransactionIndex plus the size of the transaction"""
+
+    def __init__(self, txn_hash, blockfile_no, file_offset, block_offset,
+                 size):
+        self.hash = txn_hash
+        self.blockfile_no = blockfile_no
+        self.file_offset = file_offset
+        self.block_offset = block_offset
+        self.size = size
+
+    def __repr__(self):
+        return "TxIndexEntry(%s, blockfile_no=%d, file_offset=%d, " \
+               "block_offset=%d, size=%d)" \
+               % (self.hash, self.blockfile_no, self.file_offset,
+                  self.block_offset, self.size)
+
+
+def _blk_file_number(blk_file):
+    return int(os.path.basename(blk_file)[3:8])
+
+
+def _scan_blk_file(blk_file, offset, rundir):
+    """Lists the transactions of a .blk file from the given offset on, run
+    by the workers of TxIndex.update. Returns the path of the sorted run of
+    records and the offset following the last block read"""
+    file_no = _blk_file_number(blk_file)
+    records = []
+    end = offset
+    for data_pos, raw_block in get_block_positions(blk_file, offset):
+        # transaction offsets are counted from the end of the header, as
+        # in bitcoind's txindex
+        block = Block(raw_block)
+        offsets = block.transaction_offsets
+        for i, tx in enumerate(block.iter_transactions()):
+            records.append(_RECORD.pack(tx.txid_bytes, file_no, data_pos,
+                                        offsets[i] - 80, tx.size))
+        end = data_pos + len(raw_block)
+
+    run = os.path.join(rundir, "%05d.run" % file_no)
+    write_run(run, records)
+    return run, end
+
+
+class TxIndex(object):
+    """A txid index built from the .blk files, for nodes not running with
+    -txindex. Transactions are stored as fixed-width records sorted by txid
+    in mmap-ed files, and can be passed to Blockchain.get_transaction in
+    place of bitcoind's txindex leveldb.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._index = SortedRecordIndex(path, _RECORD.size, 32)
+
+    def __repr__(self):
+        return "TxIndex(%s, transactions=%d)" % (self.path, len(self))
+
+    def __len__(self):
+        return len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._index.close()
+
+    @property
+    def position(self):
+        """Returns the (blk file number, offset) up to which the .blk files
+        have been indexed"""
+        meta = self._index.meta
+        if not meta:
+            return 0, 0
+        meta = json.loads(meta.decode("ascii"))
+        return meta["file"], meta["offset"]
+
+    def update(self, blockchain, workers=None):
+        """Indexes the transactions of the blocks appended to the .blk files
+        of the blockchain since the last update, scanning the files in
+        parallel. Returns the number of transactions added."""
+        last_file, last_offset = self.position
+        jobs = []
+        for blk_file in get_files(blockchain.path):
+            file_no = _blk_file_number(blk_file)
+            if file_no > last_file:
+                jobs.append((blk_file, 0))
+            elif file_no == last_file:
+                jobs.append((blk_file, last_offset))
+        if not jobs:
+            return 0
+
+        with tempfile.TemporaryDirectory(dir=self.path) as rundir:
+            files = [job[0] for job in jobs]
+            offsets = [job[1] for job in jobs]
+            if workers == 1:
+                results = list(map(_scan_blk_file, files, offsets,
+                                   [rundir] * len(jobs)))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(_scan_blk_file, files,
+                                                offsets, [rundir] * len(jobs)))
+
+            meta = json.dumps({"file": _blk_file_number(files[-1]),
+                               "offset": results[-1][1]})
+            count = sum(os.path.getsize(run) for run, _ in results) \
+                // _RECORD.size
+            if count == 0:
+                return 0
+            self._index.append(merge_runs([run for run, _ in results],
+                                          _RECORD.size),
+                               meta.encode("ascii"))
+        return count
+
+    def compact(self):
+        """Merges the files written by successive updates into one"""
+        self._index.compact()
+
+    def get(self, txid):
+        """Returns the TxIndexEntry of the transaction with the given txid,
+        or None if it is not indexed"""
+        record = self._index.find(parse_hash(txid))
+        if record is None:
+            return None
+        txid_bytes, blockfile_no, file_offset, block_offset, size = \
+            _RECORD.unpack(record)
+        return TxIndexEntry(format_hash(txid_bytes), blockfile_no,
+                            file_offset, block_offset, size)
+
+
+def build_txindex(blockchain, path, workers=None):
+    """Builds or extends the TxIndex stored at path with the transactions
+    of the .blk files of the blockchain"""
+    txindex = TxIndex(path)
+    txindex.update(blockchain, workers=workers)
+    return txindex
@@ -9,50 +9,79 @@
 # modified, propagated, or distributed except according to the terms contained
 # in the LICENSE file.
 
-from .utils import decode_varint, decode_compactsize, decompress_txout_amt
+import struct
 
-def decompress_script(raw_hex):
-    script_type = raw_hex[0]
-    compressed_script = raw_hex[1:]
+from .output import Output
+from .utils import decode_varint, decode_varint_from, decode_compactsize, \
+    decode_compactsize_from, decompress_txout_amt, encode_varint, \
+    encode_compactsize, decompress_pubkey, is_on_curve
+
+# Number of special script types of the script compression scheme, larger
+# type codes encode the size of a script stored as is
+NSPECIALSCRIPTS = 6
 
-    # def decompress_script(compressed_script, script_type):
+
+def decompress_script(raw_hex):
     """ Takes CScript as stored in leveldb and returns it in uncompressed form
     (de)compression scheme is defined in bitcoin/src/compressor.cpp
-    :param compressed_script: raw script bytes hexlified (data in decode_utxo)
-    :type compressed_script: str
-    :param script_type: first byte of script data (out_type in decode_utxo)
-    :type script_type: int
+    :param raw_hex: compressed script bytes, starting with the script type
+    :type raw_hex: bytes
     :return: the decompressed CScript
-    :rtype: str
+    :rtype: bytes
     (this code adapted from https://github.com/sr-gi/bitcoin_tools)
     """
+    script_type, pos = decode_varint(raw_hex)
+    compressed_script = raw_hex[pos:]
 
     if script_type == 0:
-        if len(compressed_script) != 20:
+        if len(compressed_script) < 20:
             raise Exception("Compressed script has wrong size")
-        script = OutputScript.P2PKH(compressed_script, hash160=True)
+        return b"\x76\xa9\x14" + compressed_script[:20] + b"\x88\xac"
 
     elif script_type == 1:
-        if len(compressed_script) != 20:
+        if len(compressed_script) < 20:
             raise Exception("Compressed script has wrong size")
-        script = OutputScript.P2SH(compressed_script)
+        return b"\xa9\x14" + compressed_script[:20] + b"\x87"
 
     elif script_type in [2, 3]:
-        if len(compressed_script) != 33:
+        if len(compressed_script) < 32:
             raise Exception("Compressed script has wrong size")
-        script = OutputScript.P2PK(compressed_script)
+        return b"\x21" + bytes([script_type]) + compressed_script[:32] + \
+            b"\xac"
 
     elif script_type in [4, 5]:
-        if len(compressed_script) != 33:
+        if len(compressed_script) < 32:
             raise Exception("Compressed script has wrong size")
-        prefix = format(script_type - 2, '02')
-        script = OutputScript.P2PK(get_uncompressed_pk(prefix + compressed_script[2:]))
+        public_key = decompress_pubkey(bytes([script_type - 2]) +
+                                       compressed_script[:32])
+        return b"\x41" + public_key + b"\xac"
+
+    size = script_type - NSPECIALSCRIPTS
+    if len(compressed_script) < size:
+        raise Exception("Compressed script has wrong size")
+    return bytes(compressed_script[:size])
+
+
+def compress_script(script):
+    """Compresses a script the way bitcoind does before storing it in the
+    leveldb, the inverse of decompress_script"""
+    if len(script) == 25 and script[:3] == b"\x76\xa9\x14" \
+            and script[23:] == b"\x88\xac":
+        return b"\x00" + script[3:23]
+
+    if len(script) == 23 and script[:2] == b"\xa9\x14" \
+            and script[22:] == b"\x87":
+        return b"\x01" + script[2:22]
 
-    else:
-        assert len(compressed_script) / 2 == script_type - NSPECIALSCRIPTS
-        script = OutputScript.from_hex(compressed_script)
+    if len(script) == 35 and script[0] == 33 and script[34] == 0xac \
+            and script[1] in (2, 3):
+        return script[1:34]
 
-    return script.content
+    if len(script) == 67 and script[0] == 65 and script[66] == 0xac \
+            and is_on_curve(script[1:66]):
+        return bytes([4 | (script[65] & 1)]) + script[2:34]
+
+    return encode_varint(len(script) + NSPECIALSCRIPTS) + bytes(script)
 
 
 class BlockUndo(object):
@@ -61,32 +90,30 @@ class BlockUndo(object):
     in the undo rev*.dat files
     """
     def __init__(self, raw_hex):
+        # spent outputs are decoded at offsets of the raw data, and only
+        # keep a copy of their own bytes
+        raw_hex = bytes(raw_hex)
         self._raw_hex = raw_hex
         self.spends = []
         num_txs, pos = decode_compactsize(raw_hex)
-        # print("found %d" % num_txs + " transactions")
         for i in range(num_txs):
-            # print("calling SpentOutput with raw_hex %s", raw_hex)
-            txn = SpentTransaction(raw_hex=raw_hex[pos:])
+            txn = SpentTransaction(raw_hex, pos)
             self.spends.append(txn)
-            # print("found transaction #%d length %d hex: " % (i, txn.len), raw_hex[pos:pos+txn.len].hex())
             pos += txn.len
 
 
 class SpentTransaction(object):
     """Represents the script portion of a spent Transaction output"""
-    def __init__(self, raw_hex=None):
-        self._raw_hex = raw_hex
+    def __init__(self, raw_hex=None, offset=0):
         self.outputs = []
-        # print("decoding compactsize for hex: ",  raw_hex.hex())
-        self.output_len, pos = decode_compactsize(raw_hex)
-        # print("found %d" % self.output_len + " outputs")
+        self.output_len, pos = decode_compactsize_from(raw_hex, offset)
+        pos += offset
         for i in range(self.output_len):
-            output = SpentOutput(raw_hex=raw_hex[pos:])
+            output = SpentOutput(raw_hex, pos)
             self.outputs.append(output)
-            # print("found output #%d length %d hex: " % (i, output.len), raw_hex[pos:pos+output.len].hex())
             pos += output.len
-        self.len = pos
+        self.len = pos - offset
+        self._raw_hex = raw_hex[offset:pos]
 
     @classmethod
     def from_hex(cls, hex_):
@@ -96,16 +123,12 @@ class SpentTransaction(object):
 class SpentOutput(object):
     """Represents a spent Transaction output"""
 
-    def __init__(self, raw_hex=None):
-        # print("decoding output: ", raw_hex.hex())
-        self._raw_hex = raw_hex
-        pos = 0
-        # self.version = raw_hex[pos]
-        # pos += 1
+    def __init__(self, raw_hex=None, offset=0):
+        self._output = None
+        pos = offset
 
         # decode height code
-        height_code, height_code_len = decode_varint(raw_hex[pos:])
-        # print("found height code : ", height_code, height_code_len)
+        height_code, height_code_len = decode_varint_from(raw_hex, pos)
         if height_code % 2 == 1:
             self.is_coinbase = True
             height_code -= 1
@@ -113,20 +136,23 @@ class SpentOutput(object):
             self.is_coinbase = False
         self.height = height_code // 2
 
-        # print("found height: ", self.height)
-
         # skip byte reserved only for backwards compatibility, should always be 0x00
-        pos += height_code_len + 1
+        # it is only present for outputs created after the genesis block
+        pos += height_code_len
+        if self.height > 0:
+            pos += 1
 
         # decode compressed txout amount
-        compressed_amt, compressed_amt_len = decode_varint(raw_hex[pos:])
+        compressed_amt, compressed_amt_len = decode_varint_from(raw_hex, pos)
         self.amt = decompress_txout_amt(compressed_amt)
         pos += compressed_amt_len
 
         # get script
-        script_hex, script_pub_key_compressed_len = SpentScriptPubKey.extract_from_hex(raw_hex[pos:])
+        script_hex, script_pub_key_compressed_len = \
+            SpentScriptPubKey.extract_from_hex(raw_hex, pos)
         self.script_pub_key_compressed = SpentScriptPubKey(script_hex)
-        self.len = pos + self.script_pub_key_compressed.len
+        self.len = pos - offset + self.script_pub_key_compressed.len
+        self._raw_hex = raw_hex[offset:offset + self.len]
 
     @classmethod
     def from_hex(cls, hex_):
@@ -135,16 +161,25 @@ class SpentOutput(object):
     
     @property
     def script(self):
-        if not self.script:
-            self.script = decompress_script(self.script_pub_key_compressed)
-        return self.script
+        """Returns the decompressed scriptPubKey of the spent output"""
+        return self.script_pub_key_compressed.script
 
+    @property
+    def output(self):
+        """Returns the spent output as an Output, giving access to its
+        addresses"""
+        if self._output is None:
+            script = self.script
+            self._output = Output(struct.pack("<Q", self.amt) +
+                                  encode_compactsize(len(script)) + script)
+        return self._output
 
 
 class SpentScriptPubKey(object):
     """Represents the script portion of a spent Transaction output"""
     def __init__(self, raw_hex=None):
         self._raw_hex = raw_hex
+        self._script = None
         self.len = len(raw_hex)
         # self.script_hex = raw_hex[1:]
 
@@ -153,28 +188,25 @@ class SpentScriptPubKey(object):
         return cls(hex_)
 
     @classmethod
-    def extract_from_hex(cls, raw_hex):
-        """
-        docstring
+    def extract_from_hex(cls, raw_hex, offset=0):
+        """Returns the compressed script found at offset in raw_hex and the
+        size of the script, or of its compressed form for special scripts
         """
-        if raw_hex[0] in (0x00, 0x01):
-            return (raw_hex[:21], 21)
-        elif raw_hex[0] in (0x02, 0x03):
-            return (raw_hex[:33], 33)
-        elif raw_hex[0] in (0x04, 0x05):
-            # print("found strange script type: ", raw_hex[0])
-            return (raw_hex[:33], 33)
+        script_type = raw_hex[offset]
+        if script_type in (0x00, 0x01):
+            return (raw_hex[offset:offset + 21], 21)
+        elif script_type in (0x02, 0x03, 0x04, 0x05):
+            return (raw_hex[offset:offset + 33], 33)
         else:
-            # print("found strange script type: ", raw_hex[0])
-            # print("decoding compactsize for raw hex: ", raw_hex.hex())
-            script_len_code, script_len_code_len = decode_varint(raw_hex)
-            # print("script_len_code, script_len_code_len: (%s, %s)" % (script_len_code, script_len_code_len))
-            real_script_len = script_len_code - 6
-            # print("real_script_len: %d" % real_script_len)
-            return (raw_hex[:script_len_code_len+real_script_len], real_script_len)
+            script_len_code, script_len_code_len = \
+                decode_varint_from(raw_hex, offset)
+            real_script_len = script_len_code - NSPECIALSCRIPTS
+            end = offset + script_len_code_len + real_script_len
+            return (raw_hex[offset:end], real_script_len)
 
     @property
     def script(self):
-        if not self.script:
-            self.script = decompress_script(self._raw_hex)
-        return self.script
+        """Returns the decompressed scriptPubKey"""
+        if self._script is None:
+            self._script = decompress_script(self._raw_hex)
+        return self._script
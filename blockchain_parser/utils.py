@@ -9,8 +9,10 @@
 # modified, propagated, or distributed except according to the terms contained
 # in the LICENSE file.
 
+import calendar
 import hashlib
 import struct
+from datetime import datetime
 
 from ripemd import ripemd160
 
@@ -27,10 +29,30 @@ def double_sha256(data):
     return hashlib.sha256(hashlib.sha256(data).digest()).digest()
 
 
+def script_hash(script):
+    """Returns the key under which a scriptPubKey is indexed, its sha256"""
+    return hashlib.sha256(script).digest()
+
+
 def format_hash(hash_):
+    """Formats a hash in internal byte order as the usual reversed hex
+    string"""
     return hash_[::-1].hex()
 
 
+def parse_hash(hash_):
+    """Inverse of format_hash, returns the hash in internal byte order"""
+    return bytes.fromhex(hash_)[::-1]
+
+
+def to_timestamp(time):
+    """Returns the UNIX timestamp of a UTC datetime, other values being
+    returned as is"""
+    if isinstance(time, datetime):
+        return calendar.timegm(time.utctimetuple())
+    return time
+
+
 def decode_uint32(data):
     assert(len(data) == 4)
     return struct.unpack("<I", data)[0]
@@ -41,6 +63,22 @@ def decode_uint64(data):
     return struct.unpack("<Q", data)[0]
 
 
+def decode_compact_target(bits):
+    """Decodes the target encoded in the compact bits of a block header as
+    bitcoind does, returns None for negative or overflowing encodings"""
+    size = bits >> 24
+    word = bits & 0x007fffff
+    if size <= 3:
+        target = word >> 8 * (3 - size)
+    else:
+        target = word << 8 * (size - 3)
+    if word != 0 and (bits & 0x00800000 or size > 34 or
+                      (word > 0xff and size > 33) or
+                      (word > 0xffff and size > 32)):
+        return None
+    return target
+
+
 def decode_compactsize(data):
     assert(len(data) > 0)
     size = int(data[0])
@@ -63,6 +101,19 @@ def decode_compactsize(data):
     return struct.unpack(format_, data[1:size+1])[0], size + 1
 
 
+def decode_compactsize_from(data, offset):
+    """Decodes the CompactSize found at offset in data without copying the
+    data, returns the value and the size of its encoding"""
+    size = data[offset]
+    if size < 253:
+        return size, 1
+    if size == 253:
+        return struct.unpack_from("<H", data, offset + 1)[0], 3
+    if size == 254:
+        return struct.unpack_from("<I", data, offset + 1)[0], 5
+    return struct.unpack_from("<Q", data, offset + 1)[0], 9
+
+
 def decode_varint(raw_hex):
     """
     Reads the weird format of VarInt present in src/serialize.h of bitcoin core
@@ -85,6 +136,44 @@ def decode_varint(raw_hex):
         n += 1
 
 
+def decode_varint_from(data, offset):
+    """Decodes the VarInt found at offset in data without copying the data,
+    returns the value and the size of its encoding"""
+    n = 0
+    pos = offset
+    while True:
+        byte = data[pos]
+        pos += 1
+        n = (n << 7) | (byte & 0x7f)
+        if byte & 0x80 == 0:
+            return n, pos - offset
+        n += 1
+
+
+def encode_varint(n):
+    """
+    Encodes an integer using the VarInt format of src/serialize.h of bitcoin
+    core, this is the inverse of decode_varint.
+    """
+    tmp = [n & 0x7f]
+    while n > 0x7f:
+        n = (n >> 7) - 1
+        tmp.append((n & 0x7f) | 0x80)
+    return bytes(reversed(tmp))
+
+
+def encode_compactsize(n):
+    """Encodes an integer as a CompactSize, the inverse of
+    decode_compactsize"""
+    if n < 253:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+
 def decompress_txout_amt(amount_compressed_int):
     # (this function stolen from https://github.com/sr-gi/bitcoin_tools and modified to remove bug)
     # No need to do any work if it's zero.
@@ -145,3 +234,29 @@ def compress_txout_amt(n):
         return 1 + (n * 9 + d - 1) * 10 + e
     else:
         return 1 + (n - 1) * 10 + 9
+
+
+# Field prime of the secp256k1 curve
+SECP256K1_P = 2 ** 256 - 2 ** 32 - 977
+
+
+def decompress_pubkey(compressed):
+    """Given a 33 bytes compressed public key, returns the corresponding
+    65 bytes uncompressed public key"""
+    assert(len(compressed) == 33 and compressed[0] in (2, 3))
+    x = int.from_bytes(compressed[1:], "big")
+    y = pow((pow(x, 3, SECP256K1_P) + 7) % SECP256K1_P,
+            (SECP256K1_P + 1) // 4, SECP256K1_P)
+    if y % 2 != compressed[0] % 2:
+        y = SECP256K1_P - y
+    return b"\x04" + compressed[1:] + y.to_bytes(32, "big")
+
+
+def is_on_curve(public_key):
+    """Returns whether a 65 bytes uncompressed public key is a point of the
+    secp256k1 curve"""
+    if len(public_key) != 65 or public_key[0] != 4:
+        return False
+    x = int.from_bytes(public_key[1:33], "big")
+    y = int.from_bytes(public_key[33:], "big")
+    return (y * y - x * x * x - 7) % SECP256K1_P == 0
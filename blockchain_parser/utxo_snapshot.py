@@ -0,0 +1,218 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import struct
+
+from .utils import decode_varint, decode_compactsize, decompress_txout_amt, \
+    compress_txout_amt, encode_varint, encode_compactsize, format_hash, \
+    parse_hash
+from .undo import decompress_script, compress_script, NSPECIALSCRIPTS
+
+# Magic bytes starting the snapshots written by bitcoind >= 28.0
+SNAPSHOT_MAGIC_BYTES = b"utxo\xff"
+SNAPSHOT_VERSION = 2
+
+# Network magic of the main network, written in the snapshot metadata
+MAINNET_MAGIC = b"\xf9\xbe\xb4\xd9"
+
+# A coin never takes more than this many bytes before its script data
+# (vout + height code + amount + script size or compressed script)
+_MAX_COIN_HEADER_SIZE = 9 + 5 + 10 + 33
+
+
+class UTXOCoin(object):
+    """Represents an unspent transaction output as stored in a UTXO snapshot
+    created by the dumptxoutset RPC call of bitcoind"""
+
+    def __init__(self, txid, vout, height, is_coinbase, value, script):
+        self.txid = txid
+        self.vout = vout
+        self.height = height
+        self.is_coinbase = is_coinbase
+        self.value = value
+        self.script = script
+
+    def __repr__(self):
+        return "UTXOCoin(%s:%d, satoshis=%d)" % (self.txid, self.vout,
+                                                 self.value)
+
+
+class _StreamBuffer(object):
+    """Reads a file by chunks while letting the caller decode the data
+    in place, so only a bounded window of the file is held in memory"""
+
+    def __init__(self, f, chunk_size):
+        self._f = f
+        self._chunk_size = chunk_size
+        self.data = b""
+        self.pos = 0
+
+    def ensure(self, n):
+        """Makes at least n bytes available after pos, unless the end of
+        the file is reached first. Returns the number of bytes available"""
+        available = len(self.data) - self.pos
+        if available < n:
+            self.data = self.data[self.pos:] + \
+                self._f.read(max(n - available, self._chunk_size))
+            self.pos = 0
+            available = len(self.data)
+        return available
+
+    def read(self, n):
+        if self.ensure(n) < n:
+            raise Exception("Truncated UTXO snapshot")
+        self.pos += n
+        return self.data[self.pos - n:self.pos]
+
+
+class UTXOSnapshotReader(object):
+    """Streams the coins contained in a UTXO snapshot file created by the
+    dumptxoutset RPC call of bitcoind. Both the current format (with its
+    magic bytes and coins grouped by txid) and the format written before
+    bitcoind 28.0 are supported.
+    """
+
+    def __init__(self, path, chunk_size=1 << 20):
+        self.path = path
+        self._chunk_size = chunk_size
+        self.version = None
+        self.network_magic = None
+        with open(path, "rb") as f:
+            self._read_metadata(_StreamBuffer(f, 128))
+
+    def _read_metadata(self, stream):
+        stream.ensure(len(SNAPSHOT_MAGIC_BYTES))
+        if stream.data.startswith(SNAPSHOT_MAGIC_BYTES):
+            stream.read(len(SNAPSHOT_MAGIC_BYTES))
+            self.version, = struct.unpack("<H", stream.read(2))
+            if self.version != SNAPSHOT_VERSION:
+                raise Exception("Unsupported UTXO snapshot version %d"
+                                % self.version)
+            self.network_magic = stream.read(4)
+        self.base_block_hash = format_hash(stream.read(32))
+        self.coins_count, = struct.unpack("<Q", stream.read(8))
+        self._data_start = stream.pos
+
+    def __repr__(self):
+        return "UTXOSnapshotReader(%s, coins=%d)" % (self.base_block_hash,
+                                                     self.coins_count)
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            f.seek(self._data_start)
+            stream = _StreamBuffer(f, self._chunk_size)
+            if self.version is None:
+                for coin in self._iter_legacy_coins(stream):
+                    yield coin
+            else:
+                for coin in self._iter_coins(stream):
+                    yield coin
+
+    def _iter_coins(self, stream):
+        read = 0
+        while read < self.coins_count:
+            txid = format_hash(stream.read(32))
+            stream.ensure(9)
+            n_coins, i = decode_compactsize(
+                stream.data[stream.pos:stream.pos + 9])
+            stream.pos += i
+            for _ in range(n_coins):
+                stream.ensure(_MAX_COIN_HEADER_SIZE)
+                vout, i = decode_compactsize(
+                    stream.data[stream.pos:stream.pos + 9])
+                stream.pos += i
+                yield _read_coin(stream, txid, vout)
+            read += n_coins
+
+    def _iter_legacy_coins(self, stream):
+        for _ in range(self.coins_count):
+            txid = format_hash(stream.read(32))
+            vout, = struct.unpack("<I", stream.read(4))
+            yield _read_coin(stream, txid, vout)
+
+
+def _read_coin(stream, txid, vout):
+    """Decodes a Coin serialized as in bitcoin/src/coins.h"""
+    stream.ensure(_MAX_COIN_HEADER_SIZE)
+    code, i = decode_varint(stream.data[stream.pos:stream.pos + 10])
+    stream.pos += i
+    compressed_amt, i = decode_varint(stream.data[stream.pos:stream.pos + 10])
+    stream.pos += i
+
+    script_type, i = decode_varint(stream.data[stream.pos:stream.pos + 10])
+    if script_type in (0, 1):
+        size = i + 20
+    elif script_type < NSPECIALSCRIPTS:
+        size = i + 32
+    else:
+        size = i + script_type - NSPECIALSCRIPTS
+    script = decompress_script(stream.read(size))
+
+    return UTXOCoin(txid, vout, code >> 1, bool(code & 1),
+                    decompress_txout_amt(compressed_amt), script)
+
+
+class UTXOSnapshotWriter(object):
+    """Writes coins into a UTXO snapshot file in the format produced by the
+    dumptxoutset RPC call of bitcoind, so it can be loaded using the
+    loadtxoutset RPC call or read by UTXOSnapshotReader.
+
+    Coins sharing the same txid must be written consecutively.
+    """
+
+    def __init__(self, path, base_block_hash, network_magic=MAINNET_MAGIC):
+        self.path = path
+        self.coins_count = 0
+        self._f = open(path, "wb")
+        self._txid = None
+        self._coins = []
+
+        self._f.write(SNAPSHOT_MAGIC_BYTES)
+        self._f.write(struct.pack("<H", SNAPSHOT_VERSION))
+        self._f.write(network_magic)
+        self._f.write(parse_hash(base_block_hash))
+        self._count_pos = self._f.tell()
+        self._f.write(struct.pack("<Q", 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, coin):
+        """Adds a UTXOCoin to the snapshot"""
+        if coin.txid != self._txid:
+            self._flush()
+            self._txid = coin.txid
+        self._coins.append(coin)
+
+    def _flush(self):
+        if not self._coins:
+            return
+        data = [parse_hash(self._txid), encode_compactsize(len(self._coins))]
+        for coin in self._coins:
+            data.append(encode_compactsize(coin.vout))
+            data.append(encode_varint(coin.height * 2 + int(coin.is_coinbase)))
+            data.append(encode_varint(compress_txout_amt(coin.value)))
+            data.append(compress_script(coin.script))
+        self._f.write(b"".join(data))
+        self.coins_count += len(self._coins)
+        self._coins = []
+
+    def close(self):
+        """Writes the pending coins and the final coins count"""
+        if self._f.closed:
+            return
+        self._flush()
+        self._f.seek(self._count_pos)
+        self._f.write(struct.pack("<Q", self.coins_count))
+        self._f.close()
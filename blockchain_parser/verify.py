@@ -0,0 +1,241 @@
+# Copyright (C) 2015-2016 The bitcoin-blockchain-parser developers
+#
+# This file is part of bitcoin-blockchain-parser.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of bitcoin-blockchain-parser, including this file, may be copied,
+# modified, propagated, or distributed except according to the terms contained
+# in the LICENSE file.
+
+import bisect
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from .utils import decode_compact_target, double_sha256, format_hash
+
+# Number of blocks whose timestamps give the median time past
+MEDIAN_TIME_SPAN = 11
+
+
+class ChainBreak(object):
+    """A header failing one of the checks of verify_header_chain, reason
+    being one of:
+       - "missing": the block was not saved in the .blk files
+       - "hash": the header does not hash to the hash of its index entry
+       - "pow": the hash of the header is above its target, or its bits
+         are invalid
+       - "link": the previous block hash is not the hash of the header
+         preceding it
+       - "time": the timestamp is not above the median time past of the
+         preceding headers
+    """
+
+    def __init__(self, height, hash_, reason, detail=""):
+        self.height = height
+        self.hash = hash_
+        self.reason = reason
+        self.detail = detail
+
+    def __repr__(self):
+        return "ChainBreak(height=%d, reason=%s)" % (self.height, self.reason)
+
+    def __str__(self):
+        return "height %d %s %s: %s" % (self.height, self.hash, self.reason,
+                                        self.detail)
+
+
+class VerificationReport(object):
+    """Result of verify_header_chain: the range of heights verified, the
+    number of headers checked and the list of ChainBreak found"""
+
+    def __init__(self, start_height, end_height, n_headers, breaks):
+        self.start_height = start_height
+        self.end_height = end_height
+        self.n_headers = n_headers
+        self.breaks = breaks
+
+    def __repr__(self):
+        return "VerificationReport(heights=%s-%s, headers=%d, breaks=%d)" \
+               % (self.start_height, self.end_height, self.n_headers,
+                  len(self.breaks))
+
+    def __str__(self):
+        lines = ["%d headers from height %s to %s: %d breaks"
+                 % (self.n_headers, self.start_height, self.end_height,
+                    len(self.breaks))]
+        lines.extend("  %s" % chain_break for chain_break in self.breaks)
+        return "\n".join(lines)
+
+    @property
+    def ok(self):
+        return not self.breaks
+
+    def counts(self):
+        """Returns the number of breaks by reason"""
+        counts = {}
+        for chain_break in self.breaks:
+            counts[chain_break.reason] = counts.get(chain_break.reason, 0) + 1
+        return counts
+
+
+def _read_headers(path, positions):
+    """Reads the headers of blocks from the .blk files given their
+    (file, data position) tuples, returns them joined along with the list
+    of the indexes of the blocks not saved, whose headers are zeroed"""
+    headers = bytearray(80 * len(positions))
+    missing = []
+    f = None
+    current_file = None
+    try:
+        for file_no, data_pos, i in sorted((file_no, data_pos, i) for i, (
+                file_no, data_pos) in enumerate(positions)):
+            if file_no == -1 or data_pos == -1:
+                missing.append(i)
+                continue
+            if file_no != current_file:
+                if f is not None:
+                    f.close()
+                f = open(os.path.join(path, "blk%05d.dat" % file_no), "rb")
+                current_file = file_no
+            f.seek(data_pos)
+            header = f.read(80)
+            if len(header) == 80:
+                headers[80 * i:80 * i + 80] = header
+            else:
+                missing.append(i)
+    finally:
+        if f is not None:
+            f.close()
+    return bytes(headers), sorted(missing)
+
+
+def _check_headers(path, headers, positions, pow_limit):
+    """Hashes the headers of a range of blocks and checks their proof of
+    work, run by the workers of verify_header_chain. Headers are given
+    joined, or read from the .blk files at the given positions. Returns
+    the joined headers and hashes, the indexes of the blocks not saved and
+    a dict of the proof of work errors by index."""
+    missing = []
+    if headers is None:
+        headers, missing = _read_headers(path, positions)
+    skipped = set(missing)
+
+    hashes = []
+    errors = {}
+    for i in range(len(headers) // 80):
+        if i in skipped:
+            hashes.append(b"\x00" * 32)
+            continue
+        header = headers[80 * i:80 * i + 80]
+        hash_ = double_sha256(header)
+        hashes.append(hash_)
+        bits = struct.unpack_from("<I", header, 72)[0]
+        target = decode_compact_target(bits)
+        if target is None or target == 0:
+            errors[i] = "invalid bits %08x" % bits
+        elif pow_limit is not None and target > pow_limit:
+            errors[i] = "target of bits %08x above the limit" % bits
+        elif int.from_bytes(hash_, "little") > target:
+            errors[i] = "hash above the target of bits %08x" % bits
+    return headers, b"".join(hashes), missing, errors
+
+
+def verify_header_chain(blockchain, index, start=0, end=None, cache=None,
+                        from_blk=False, workers=None, chunk_size=20160,
+                        pow_limit=None):
+    """Verifies the headers of the blocks of the main chain from height
+    start to end (inclusive), as listed by the leveldb index present at
+    path index: their hash matches the index, their proof of work is valid,
+    each links to the previous one and its timestamp is above the median
+    time past of the 11 previous blocks. Returns a VerificationReport.
+
+    Headers are those kept in the index, or if from_blk is True those read
+    from the .blk files at the positions given by the index. They are read
+    and hashed by chunks of chunk_size in a pool of workers processes
+    (in this process if workers is 1). pow_limit is the highest valid
+    target, which depends on the network, no limit being checked if it is
+    None.
+    """
+    blockIndexes = blockchain.get_block_indexes(index, cache)
+    heights = [blkIdx.height for blkIdx in blockIndexes]
+    first = bisect.bisect_left(heights, start)
+    last = len(heights) if end is None else bisect.bisect_right(heights, end)
+    # the preceding headers are read to check the first ones of the range
+    context = min(first, MEDIAN_TIME_SPAN)
+    blockIndexes = blockIndexes[first - context:last]
+
+    # workers are only sent the headers or their positions
+    chunks = [blockIndexes[i:i + chunk_size]
+              for i in range(0, len(blockIndexes), chunk_size)]
+    if from_blk:
+        headers = [None] * len(chunks)
+        positions = [[(blkIdx.file, blkIdx.data_pos) for blkIdx in chunk]
+                     for chunk in chunks]
+    else:
+        headers = [b"".join(blkIdx.header for blkIdx in chunk)
+                   for chunk in chunks]
+        positions = [None] * len(chunks)
+    args = ([blockchain.path] * len(chunks), headers, positions,
+            [pow_limit] * len(chunks))
+    if workers == 1:
+        results = list(map(_check_headers, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_check_headers, *args))
+
+    breaks = []
+    prev_hash = None
+    times = []
+    i = 0
+    for chunk, (headers, hashes, missing, errors) in zip(chunks, results):
+        missing = set(missing)
+        for j, blkIdx in enumerate(chunk):
+            checked = i >= context
+            i += 1
+            if j in missing:
+                if checked:
+                    breaks.append(ChainBreak(blkIdx.height, blkIdx.hash,
+                                             "missing", "block not saved"))
+                prev_hash = None
+                times = []
+                continue
+
+            header = headers[80 * j:80 * j + 80]
+            hash_ = hashes[32 * j:32 * j + 32]
+            pow_error = errors.get(j)
+            time = struct.unpack_from("<I", header, 68)[0]
+            if checked:
+                if hash_ != blkIdx.hash_bytes:
+                    breaks.append(ChainBreak(
+                        blkIdx.height, blkIdx.hash, "hash",
+                        "header hashes to %s" % format_hash(hash_)))
+                if pow_error is not None:
+                    breaks.append(ChainBreak(blkIdx.height, blkIdx.hash,
+                                             "pow", pow_error))
+                if prev_hash is not None and header[4:36] != prev_hash:
+                    breaks.append(ChainBreak(
+                        blkIdx.height, blkIdx.hash, "link",
+                        "previous block hash %s instead of %s"
+                        % (format_hash(header[4:36]), format_hash(prev_hash))))
+                if times:
+                    window = sorted(times)
+                    median_time_past = window[len(window) // 2]
+                    if time <= median_time_past:
+                        breaks.append(ChainBreak(
+                            blkIdx.height, blkIdx.hash, "time",
+                            "timestamp %d not above the median time past %d"
+                            % (time, median_time_past)))
+
+            prev_hash = hash_
+            times.append(time)
+            if len(times) > MEDIAN_TIME_SPAN:
+                del times[0]
+
+    if not blockIndexes[context:]:
+        return VerificationReport(start, end, 0, breaks)
+    return VerificationReport(blockIndexes[context].height,
+                              blockIndexes[-1].height,
+                              len(blockIndexes) - context, breaks)
@@ -0,0 +1,14 @@
+import sys
+sys.path.append('..')
+from blockchain_parser.blockchain import Blockchain
+from blockchain_parser.repack import repack
+
+# Rewrites the main chain found in the .blk files of the directory given as
+# first argument into the directory given as second argument, in height
+# order and without witnesses, up to the height given as third argument
+blockchain = Blockchain(sys.argv[1])
+end = int(sys.argv[3]) if len(sys.argv) > 3 else None
+repacked = repack(blockchain, sys.argv[1] + '/index', sys.argv[2], end=end,
+                  strip_witness=True)
+print("repacked %d blocks into %d files" % (len(repacked),
+                                            repacked[-1].file + 1))
@@ -22,7 +22,10 @@ setup(
     ],
     install_requires=[
         'python-bitcoinlib==0.11.0',
-        'plyvel==1.5.1',
         'ripemd-hash==1.0.1'
-    ]
+    ],
+    extras_require={
+        'numpy': ['numpy>=1.21'],
+        'snappy': ['python-snappy'],
+    }
 )